@@ -0,0 +1,291 @@
+"""
+Live per-room activity counters, maintained at ingestion.
+
+note_fix() runs on every recorded fix and touches only the cache, through
+small per-room and per-member keys; no key grows with the room. It bumps a
+per-minute counter and a pending-total counter (atomic incr). Active
+members are counted per minute: the first fix of a member in a minute
+(a cache.add marker) moves the member from the bucket of its previous
+minute to the current one, so the last ACTIVE_WINDOW_MINUTES buckets sum
+to the distinct members seen in them. The bounding box is one key, read on
+every fix and rewritten only when a fix falls outside it, under a cache.add
+lock so concurrent expansions do not overwrite each other. last_update is
+rewritten when it is LAST_UPDATE_REFRESH_SECONDS stale. room_stats() reads
+everything back with one get_many.
+
+A room's first fix since the last flush also registers the room: it takes
+the next slot of a cache sequence and stores its id there. flush() runs
+periodically (`manage.py flush_room_activity`) and visits only the rooms
+registered since the previous flush. It adds their pending counts to
+RoomActivity and copies the current numbers there, so stats survive a
+cache restart. The pending counter is decremented by what was flushed, not
+reset, so fixes counted during a flush are not lost.
+
+Every process must see the same counters, so the default cache has to be
+shared (api/checks.py fails a per-process one outside DEBUG). flush()
+runs in its own process and refuses to read a per-process cache at all.
+"""
+import logging
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models import F
+from django.utils import timezone
+
+from .checks import process_local_cache
+from .models import Room, RoomActivity
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_WINDOW_MINUTES = 5
+RATE_WINDOW_MINUTES = 5
+LAST_UPDATE_REFRESH_SECONDS = 5
+MINUTE_KEY_TTL = (max(RATE_WINDOW_MINUTES, ACTIVE_WINDOW_MINUTES) + 2) * 60
+BBOX_LOCK_SECONDS = 5
+BBOX_LOCK_ATTEMPTS = 20
+# Registrations outlive any sensible flush interval; an expired one is
+# renewed by the room's next fix
+DIRTY_TTL = 24 * 3600
+DIRTY_SEQ_KEY = "room-activity:dirty:seq"
+DIRTY_CURSOR_KEY = "room-activity:dirty:flushed"
+
+
+def _minute_key(room_id, minute):
+    return f"room-activity:{room_id}:minute:{minute}"
+
+
+def _pending_key(room_id):
+    return f"room-activity:{room_id}:pending"
+
+
+def _bbox_key(room_id):
+    return f"room-activity:{room_id}:bbox"
+
+
+def _bbox_lock_key(room_id):
+    return f"room-activity:{room_id}:bbox:lock"
+
+
+def _last_update_key(room_id):
+    return f"room-activity:{room_id}:last-update"
+
+
+def _active_key(room_id, minute):
+    """Members whose latest counted minute is `minute`."""
+    return f"room-activity:{room_id}:active:{minute}"
+
+
+def _active_keys(room_id, minute):
+    """The buckets of the active window ending with `minute`."""
+    return [_active_key(room_id, m) for m in range(minute - ACTIVE_WINDOW_MINUTES + 1, minute + 1)]
+
+
+def _seen_key(room_id, user_id, minute):
+    return f"room-activity:{room_id}:seen:{user_id}:{minute}"
+
+
+def _member_key(room_id, user_id):
+    """The minute a member was last counted in."""
+    return f"room-activity:{room_id}:member:{user_id}"
+
+
+def _dirty_key(room_id):
+    return f"room-activity:{room_id}:dirty"
+
+
+def _slot_key(slot):
+    return f"room-activity:dirty:{slot}"
+
+
+def _incr(key, timeout):
+    """Atomically add 1 to key, creating it; returns the new value."""
+    if cache.add(key, 1, timeout=timeout):
+        return 1
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # Expired between add and incr
+        cache.set(key, 1, timeout=timeout)
+        return 1
+
+
+def _count_member(room_id, user_id, minute):
+    if not cache.add(_seen_key(room_id, user_id, minute), 1, timeout=MINUTE_KEY_TTL):
+        return
+    # First fix of this member in this minute: move it to this minute's bucket
+    previous = cache.get(_member_key(room_id, user_id))
+    cache.set(_member_key(room_id, user_id), minute, timeout=MINUTE_KEY_TTL)
+    _incr(_active_key(room_id, minute), MINUTE_KEY_TTL)
+    if previous is not None and previous != minute:
+        try:
+            cache.decr(_active_key(room_id, previous))
+        except ValueError:
+            # The old bucket expired with the window
+            pass
+
+
+def _grow_bbox(room_id, lat, lng):
+    lock = _bbox_lock_key(room_id)
+    for _ in range(BBOX_LOCK_ATTEMPTS):
+        if cache.add(lock, 1, timeout=BBOX_LOCK_SECONDS):
+            try:
+                bbox = _union(cache.get(_bbox_key(room_id)), [lat, lng, lat, lng])
+                cache.set(_bbox_key(room_id), bbox, timeout=None)
+            finally:
+                cache.delete(lock)
+            return
+        time.sleep(0.005)
+    # A later fix outside the box retries
+    logger.warning("room %s bounding box busy, fix not added to it", room_id)
+
+
+def _register(room_id):
+    if cache.add(_dirty_key(room_id), 1, timeout=DIRTY_TTL):
+        slot = _incr(DIRTY_SEQ_KEY, None)
+        cache.set(_slot_key(slot), room_id, timeout=DIRTY_TTL)
+
+
+def note_fix(room_id, user_id, lat, lng, now=None):
+    """Account one fix. Never raises: ingestion must not fail on the cache."""
+    now = time.time() if now is None else now
+    minute = int(now // 60)
+    try:
+        _incr(_minute_key(room_id, minute), MINUTE_KEY_TTL)
+        _incr(_pending_key(room_id), None)
+        _register(room_id)
+        _count_member(room_id, user_id, minute)
+
+        got = cache.get_many([_bbox_key(room_id), _last_update_key(room_id)])
+        bbox = got.get(_bbox_key(room_id))
+        if bbox is None or not (bbox[0] <= lat <= bbox[2] and bbox[1] <= lng <= bbox[3]):
+            _grow_bbox(room_id, lat, lng)
+        if now - got.get(_last_update_key(room_id), 0) >= LAST_UPDATE_REFRESH_SECONDS:
+            # A plain timestamp: racing writers store near-identical values
+            cache.set(_last_update_key(room_id), now, timeout=None)
+    except Exception:
+        logger.warning("room activity counters unavailable", exc_info=True)
+
+
+def _union(a, b):
+    """Union of two [min_lat, min_lng, max_lat, max_lng] boxes, either may be None."""
+    if a is None or b is None:
+        return a or b
+    return [min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])]
+
+
+def _flushed_bbox(activity):
+    if activity is None or activity.min_lat is None:
+        return None
+    return [activity.min_lat, activity.min_lng, activity.max_lat, activity.max_lng]
+
+
+def _dt(ts):
+    return datetime.fromtimestamp(ts, tz=dt_timezone.utc) if ts else None
+
+
+def room_stats(room, now=None):
+    """
+    Live panel numbers for room (a Room with select_related("activity")
+    saves the one query this may need). Falls back to the last flush when
+    the cache has no state for the room.
+    """
+    now = time.time() if now is None else now
+    minute = int(now // 60)
+    minute_keys = [_minute_key(room.id, m) for m in range(minute - RATE_WINDOW_MINUTES, minute)]
+    active_keys = _active_keys(room.id, minute)
+    bbox_key, last_update_key, pending_key = _bbox_key(room.id), _last_update_key(room.id), _pending_key(room.id)
+    got = cache.get_many([bbox_key, last_update_key, pending_key, *minute_keys, *active_keys])
+    flushed = getattr(room, "activity", None)
+
+    points_total = (flushed.points_total if flushed else 0) + got.get(pending_key, 0)
+    counts = [got.get(k, 0) for k in minute_keys]
+    stats = {
+        "room_id": room.id,
+        "points_total": points_total,
+        "points_last_minute": counts[-1],
+        "points_per_minute_5m": round(sum(counts) / RATE_WINDOW_MINUTES, 2),
+        "source": "live",
+    }
+    if bbox_key in got:
+        bbox = _union(got[bbox_key], _flushed_bbox(flushed))
+        active = sum(got.get(k, 0) for k in active_keys)
+        last_update = _dt(got.get(last_update_key))
+    elif flushed:
+        bbox = _flushed_bbox(flushed)
+        active = flushed.active_members
+        last_update = flushed.last_update
+        stats["source"] = "flushed"
+    else:
+        bbox, active, last_update = None, 0, None
+    stats.update(
+        active_members_5m=active,
+        bbox=None if bbox is None else dict(zip(("min_lat", "min_lng", "max_lat", "max_lng"), bbox)),
+        last_update=last_update,
+    )
+    return stats
+
+
+def _registered_rooms():
+    """Room ids registered since the last flush, and the sequence read."""
+    got = cache.get_many([DIRTY_SEQ_KEY, DIRTY_CURSOR_KEY])
+    seq, cursor = got.get(DIRTY_SEQ_KEY, 0), got.get(DIRTY_CURSOR_KEY, 0)
+    if cursor > seq:
+        # The sequence was lost with the cache and restarted
+        cursor = 0
+    slots = [_slot_key(slot) for slot in range(cursor + 1, seq + 1)]
+    room_ids = set(cache.get_many(slots).values()) if slots else set()
+    return room_ids, seq, slots
+
+
+def flush(now=None, in_process=False):
+    """
+    Copy the live counters of the rooms registered since the last flush
+    into RoomActivity. in_process allows a per-process cache, for callers
+    in the process that counted. Returns the number of rooms flushed.
+    """
+    now = time.time() if now is None else now
+    if not in_process and process_local_cache():
+        # The counters are in the web workers' memory, not in this process
+        raise ImproperlyConfigured("flushing room activity needs a cache shared with the web workers")
+    room_ids, seq, slots = _registered_rooms()
+    if room_ids:
+        # Rooms deleted since their fixes have nothing to flush into
+        room_ids = Room.objects.filter(pk__in=room_ids).values_list("pk", flat=True)
+
+    minute = int(now // 60)
+    flushed = 0
+    for room_id in room_ids:
+        # Unregister before reading: a fix from now on registers the room again
+        cache.delete(_dirty_key(room_id))
+        pending = cache.get(_pending_key(room_id), 0)
+        if pending:
+            # decr, not delete: fixes counted meanwhile stay pending
+            try:
+                cache.decr(_pending_key(room_id), pending)
+            except ValueError:
+                pass
+        active_keys = _active_keys(room_id, minute)
+        bbox_key, last_update_key = _bbox_key(room_id), _last_update_key(room_id)
+        last_minute_key = _minute_key(room_id, minute - 1)
+        got = cache.get_many([bbox_key, last_update_key, last_minute_key, *active_keys])
+
+        activity, _ = RoomActivity.objects.get_or_create(room_id=room_id)
+        updates = {"points_total": F("points_total") + pending, "points_last_minute": got.get(last_minute_key, 0)}
+        if bbox_key in got:
+            min_lat, min_lng, max_lat, max_lng = _union(got[bbox_key], _flushed_bbox(activity))
+            updates.update(
+                min_lat=min_lat,
+                min_lng=min_lng,
+                max_lat=max_lat,
+                max_lng=max_lng,
+                active_members=sum(got.get(k, 0) for k in active_keys),
+                last_update=_dt(got.get(last_update_key)),
+            )
+        RoomActivity.objects.filter(pk=activity.pk).update(flushed_at=timezone.now(), **updates)
+        flushed += 1
+    if slots:
+        cache.set(DIRTY_CURSOR_KEY, seq, timeout=None)
+        cache.delete_many(slots)
+    return flushed
@@ -1,8 +1,174 @@
-from django.contrib import admin
-from .models import Room, Membership, Movement, GeoFence, MeetingPoint
+from django.conf import settings
+from django.contrib import admin, messages
+from django.contrib.admin import helpers
+from django.contrib.admin.utils import model_ngettext
+from django.core.paginator import Paginator
+from django.db import connections
+from django.template.response import TemplateResponse
+from django.utils.functional import cached_property
+
+from .models import (
+    Room, Membership, Movement, CompactMovement, GeoFence, MeetingPoint, TrafficProfile, TrafficProfileState, Job,
+    Trip, Stop, RoomTravelStats, SegmentationState, SegmentationCheckpoint, RoomActivity,
+    MovementArchive,
+)
+
+
+def estimated_rows(model, using="default"):
+    """The planner's row estimate for model's table, or None where there is none (only PostgreSQL has one)."""
+    connection = connections[using]
+    if connection.vendor != "postgresql":
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass", [model._meta.db_table])
+        row = cursor.fetchone()
+    # -1 (or 0) until the table is first analyzed
+    return row[0] if row and row[0] > 0 else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Changelist paginator that never runs COUNT(*) over a whole big table.
+    Unfiltered lists use the table's row estimate once it reaches
+    ADMIN_ESTIMATE_MIN_ROWS; everything else counts at most ADMIN_COUNT_LIMIT
+    rows, so a broad filter pages through the first ADMIN_COUNT_LIMIT.
+    """
+
+    @cached_property
+    def count(self):
+        qs = self.object_list
+        if not qs.query.where:
+            estimate = estimated_rows(qs.model, qs.db)
+            if estimate is not None and estimate >= settings.ADMIN_ESTIMATE_MIN_ROWS:
+                return estimate
+        return qs.order_by()[: settings.ADMIN_COUNT_LIMIT].count()
+
+
+def delete_in_batches(queryset, batch_size=None):
+    """Delete queryset's rows ADMIN_DELETE_BATCH_SIZE primary keys per statement. Returns rows deleted."""
+    batch_size = batch_size or settings.ADMIN_DELETE_BATCH_SIZE
+    manager = queryset.model._base_manager.using(queryset.db)
+    pks = queryset.order_by().values_list("pk", flat=True)
+    deleted = 0
+    while True:
+        batch = list(pks[:batch_size])
+        if not batch:
+            return deleted
+        manager.filter(pk__in=batch).delete()
+        deleted += len(batch)
+
+
+class BatchedDeleteAdmin(admin.ModelAdmin):
+    """
+    ModelAdmin for big tables. Changelists use EstimatedCountPaginator and
+    skip the unfiltered total. Deletes run in bounded batches: rows of
+    batched_relations (related names of big child tables) go first, then
+    the objects themselves.
+
+    The stock delete_selected action is replaced. Its confirmation page
+    collects every related row and renders an input per selected row,
+    which cannot work once "select all" covers millions. The confirmation
+    here shows counts only, and the delete is logged as one admin message
+    rather than one LogEntry per row.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_per_page = 100
+    batched_relations = ()
+    actions = ["delete_selected"]
+
+    def _delete_children(self, queryset):
+        for name in self.batched_relations:
+            related = self.model._meta.get_field(name)
+            children = related.related_model._base_manager.using(queryset.db)
+            delete_in_batches(children.filter(**{f"{related.field.name}__in": queryset.values("pk")}))
+
+    def delete_queryset(self, request, queryset):
+        self._delete_children(queryset)
+        return delete_in_batches(queryset)
+
+    def delete_model(self, request, obj):
+        self._delete_children(self.model._base_manager.using(obj._state.db).filter(pk=obj.pk))
+        obj.delete()
+
+    def get_deleted_objects(self, objs, request):
+        # Counts only: the stock version loads every related row
+        count = len(objs) if isinstance(objs, list) else objs.count()
+        opts = self.model._meta
+        perms_needed = set() if self.has_delete_permission(request) else {opts.verbose_name}
+        return [f"{count} {model_ngettext(opts, count)}"], {opts.verbose_name_plural: count}, perms_needed, []
+
+    @admin.action(permissions=["delete"], description="Delete selected %(verbose_name_plural)s")
+    def delete_selected(self, request, queryset):
+        if request.POST.get("post"):
+            deleted = self.delete_queryset(request, queryset)
+            self.message_user(
+                request, f"Deleted {deleted} {model_ngettext(self.opts, deleted)} in batches.", messages.SUCCESS
+            )
+            return None
+        count = queryset.count()
+        context = {
+            **self.admin_site.each_context(request),
+            "title": "Are you sure?",
+            "subtitle": None,
+            "objects_name": str(model_ngettext(self.opts, count)),
+            "model_count": [(self.opts.verbose_name_plural, count)],
+            "deletable_objects": [],
+            "select_across": request.POST.get("select_across") == "1",
+            "selected": request.POST.getlist(helpers.ACTION_CHECKBOX_NAME),
+            "batched_relations": self.batched_relations,
+            "batch_size": settings.ADMIN_DELETE_BATCH_SIZE,
+            "opts": self.opts,
+            "action_checkbox_name": helpers.ACTION_CHECKBOX_NAME,
+            "media": self.media,
+        }
+        request.current_app = self.admin_site.name
+        return TemplateResponse(request, "admin/api/batched_delete_confirmation.html", context)
+
+
+@admin.register(Room)
+class RoomAdmin(BatchedDeleteAdmin):
+    list_display = ("id", "name", "creator", "created_at")
+    list_select_related = ("creator",)
+    raw_id_fields = ("creator",)
+    search_fields = ("=id", "name")
+    batched_relations = ("movements", "compact_movements")
+
+
+@admin.register(Membership)
+class MembershipAdmin(BatchedDeleteAdmin):
+    list_display = ("id", "user", "room", "joined_at")
+    list_select_related = ("user", "room")
+    raw_id_fields = ("user", "room")
+    search_fields = ("=user__username", "=room__id")
+
+
+@admin.register(Movement)
+class MovementAdmin(BatchedDeleteAdmin):
+    list_display = ("id", "user", "room", "latitude", "longitude", "created_at")
+    list_select_related = ("user", "room")
+    raw_id_fields = ("user", "room")
+    search_fields = ("=user__username", "=room__id")
+    date_hierarchy = "created_at"
+
+
+@admin.register(CompactMovement)
+class CompactMovementAdmin(BatchedDeleteAdmin):
+    list_display = ("id", "user", "room", "latitude", "longitude", "created_at")
+    list_select_related = ("user", "room")
+    raw_id_fields = ("user", "room")
+    search_fields = ("=user__username", "=room__id")
+
 
-admin.site.register(Room)
-admin.site.register(Membership)
-admin.site.register(Movement)
 admin.site.register(GeoFence)
 admin.site.register(MeetingPoint)
+admin.site.register(TrafficProfile)
+admin.site.register(TrafficProfileState)
+admin.site.register(Job)
+admin.site.register(Trip)
+admin.site.register(Stop)
+admin.site.register(RoomTravelStats)
+admin.site.register(SegmentationState)
+admin.site.register(SegmentationCheckpoint)
+admin.site.register(RoomActivity)
+admin.site.register(MovementArchive)
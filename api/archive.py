@@ -0,0 +1,302 @@
+"""
+Columnar archive for cold movement history.
+
+archive_movements() moves each room's fixes for every UTC day older than
+MOVEMENT_ARCHIVE_AFTER_DAYS out of the movement table. They go to
+MOVEMENT_ARCHIVE_DIR/room-<id>/<YYYY-MM-DD>/ (<YYYY-MM-DD>.<n>/ for
+generation n > 0) as one .npy file per column, sorted by time:
+
+- ts: int64 microseconds since the Unix epoch
+- user: int64
+- lat, lng: float64
+
+MOVEMENT_ARCHIVE_DIR has no default: archiving refuses to run until it is
+set, and reading an archived day without it raises. Every process that
+serves or computes from movement history -- web workers and the job
+worker alike -- must see the same directory, or archived days silently
+drop out of its answers.
+
+One MovementArchive row per room-day is the index. It holds the row count
+and the bounding box, so readers open only the files a query can touch.
+
+Readers memory-map the files of the generation the index row names and
+use its first `rows` rows. Files are never rewritten once indexed: late
+fixes for an archived day (e.g. after a storage migration) are merged into
+a new generation directory, and the index row switches to it in the
+transaction that deletes the source rows. A crash before that commit
+leaves the indexed generation and the source rows as they were, and the
+rerun writes the new generation again. prune_superseded() removes old
+generations at the end of a run.
+
+points() feeds predict_traffic's live scan for windows that reach back
+past yesterday. cell_hour_counts() lets the profile builder fold archived
+days. latest_positions() supplies members' last fixes to
+movement_store.latest_positions() when those fixes have been archived.
+"""
+import os
+import shutil
+from array import array
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.utils import timezone
+
+from . import movement_store
+from .models import Membership, MovementArchive, Room
+
+COLUMNS = ("ts", "user", "lat", "lng")
+UNIX_EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+US_PER_HOUR = 3600 * 10**6
+
+
+def _to_us(dt):
+    return (dt - UNIX_EPOCH) // timedelta(microseconds=1)
+
+
+def _from_us(us):
+    return UNIX_EPOCH + timedelta(microseconds=us)
+
+
+def _day_start(day):
+    return datetime.combine(day, time.min, tzinfo=dt_timezone.utc)
+
+
+def archive_root():
+    if not settings.MOVEMENT_ARCHIVE_DIR:
+        raise ImproperlyConfigured("MOVEMENT_ARCHIVE_DIR must be set to a directory every service can read")
+    return Path(settings.MOVEMENT_ARCHIVE_DIR)
+
+
+def day_dir(room_id, day, generation=0):
+    name = day.isoformat() if not generation else f"{day.isoformat()}.{generation}"
+    return archive_root() / f"room-{room_id}" / name
+
+
+def hot_horizon(now=None):
+    """Midnight UTC before which archive_movements() moves fixes out of the database."""
+    now = timezone.now() if now is None else now
+    today = now.astimezone(dt_timezone.utc).date()
+    return _day_start(today - timedelta(days=max(1, settings.MOVEMENT_ARCHIVE_AFTER_DAYS)))
+
+
+def load(archive):
+    """Memory-mapped columns of an archived room-day, {column: array}."""
+    directory = day_dir(archive.room_id, archive.day, archive.generation)
+    return {c: np.load(directory / f"{c}.npy", mmap_mode="r")[: archive.rows] for c in COLUMNS}
+
+
+def _write(directory, columns):
+    # directory is not indexed yet (a new day or generation, or what a crashed
+    # run left of one), so no reader sees it; fsync before the index names it
+    directory.mkdir(parents=True, exist_ok=True)
+    for c in COLUMNS:
+        with open(directory / f"{c}.npy", "wb") as f:
+            np.save(f, columns[c])
+            f.flush()
+            os.fsync(f.fileno())
+
+
+def archive_day(room_id, day):
+    """Move room_id's fixes of one UTC day into its archive. Returns the rows moved."""
+    start = _day_start(day)
+    filters = {"room_id": room_id, "created_at__gte": start, "created_at__lt": start + timedelta(days=1)}
+    ts, user, lat, lng = array("q"), array("q"), array("d"), array("d")
+    last_pk = None
+    for la, ln, created_at, user_id, pk in movement_store.points(
+        filters, extra=("user_id", "pk"), order_by=("created_at", "pk")
+    ):
+        ts.append(_to_us(created_at))
+        user.append(user_id)
+        lat.append(la)
+        lng.append(ln)
+        last_pk = pk if last_pk is None else max(last_pk, pk)
+    if last_pk is None:
+        return 0
+
+    columns = {
+        "ts": np.frombuffer(ts, dtype=np.int64),
+        "user": np.frombuffer(user, dtype=np.int64),
+        "lat": np.frombuffer(lat, dtype=np.float64),
+        "lng": np.frombuffer(lng, dtype=np.float64),
+    }
+    existing = MovementArchive.objects.filter(room_id=room_id, day=day).first()
+    generation = 0
+    if existing is not None:
+        # Late fixes for an archived day: merge into the next generation
+        old = load(existing)
+        columns = {c: np.concatenate([old[c], columns[c]]) for c in COLUMNS}
+        order = np.argsort(columns["ts"], kind="stable")
+        columns = {c: columns[c][order] for c in COLUMNS}
+        generation = existing.generation + 1
+    _write(day_dir(room_id, day, generation), columns)
+
+    index = {
+        "generation": generation,
+        "rows": len(columns["ts"]),
+        "min_lat": float(columns["lat"].min()),
+        "max_lat": float(columns["lat"].max()),
+        "min_lng": float(columns["lng"].min()),
+        "max_lng": float(columns["lng"].max()),
+    }
+    with transaction.atomic():
+        if existing is None:
+            MovementArchive.objects.create(room_id=room_id, day=day, **index)
+        elif not MovementArchive.objects.filter(pk=existing.pk, generation=existing.generation).update(
+            archived_at=timezone.now(), **index
+        ):
+            raise RuntimeError(f"archive of room {room_id} for {day} changed while merging into it")
+        movement_store.filter_movements(pk__lte=last_pk, **filters).delete()
+    return len(ts)
+
+
+def prune_orphans():
+    """Delete archive directories of rooms that no longer exist. Returns how many."""
+    root = archive_root()
+    if not root.is_dir():
+        return 0
+    room_ids = set(Room.objects.values_list("id", flat=True))
+    pruned = 0
+    for directory in root.glob("room-*"):
+        if directory.is_dir() and directory.name[len("room-"):] not in room_ids:
+            shutil.rmtree(directory)
+            pruned += 1
+    return pruned
+
+
+def prune_superseded():
+    """Delete archive directories of generations older than the indexed one. Returns how many."""
+    root = archive_root()
+    current = {
+        (f"room-{room_id}", day.isoformat()): generation
+        for room_id, day, generation in MovementArchive.objects.filter(generation__gt=0).values_list(
+            "room_id", "day", "generation"
+        )
+    }
+    if not current:
+        return 0
+    pruned = 0
+    for directory in root.glob("room-*/*"):
+        day, _, generation = directory.name.partition(".")
+        # Only older generations: a newer one may be a merge in progress
+        if int(generation or 0) < current.get((directory.parent.name, day), 0):
+            shutil.rmtree(directory)
+            pruned += 1
+    return pruned
+
+
+def archive_movements(now=None, max_days=None):
+    """
+    Archive every day before hot_horizon(now), oldest first.
+    Returns {"days", "rooms", "rows", "pruned", "superseded"}. Raises ImproperlyConfigured
+    if MOVEMENT_ARCHIVE_DIR is not set.
+    """
+    archive_root()
+    horizon = hot_horizon(now)
+    report = {"days": 0, "rooms": 0, "rows": 0}
+    previous = None
+    while max_days is None or report["days"] < max_days:
+        first = movement_store.first_created_at()
+        if first is None or first >= horizon:
+            break
+        day = first.astimezone(dt_timezone.utc).date()
+        if day == previous:
+            raise RuntimeError(f"fixes of {day} are still stored after archiving it")
+        start = _day_start(day)
+        room_ids = (
+            movement_store.filter_movements(created_at__gte=start, created_at__lt=start + timedelta(days=1))
+            .values_list("room_id", flat=True)
+            .distinct()
+        )
+        for room_id in sorted(set(room_ids)):
+            report["rows"] += archive_day(room_id, day)
+            report["rooms"] += 1
+        report["days"] += 1
+        previous = day
+    report["pruned"] = prune_orphans()
+    report["superseded"] = prune_superseded()
+    return report
+
+
+def _archives(start, end, room_id=None, room_ids=None):
+    qs = MovementArchive.objects.filter(day__gte=start.astimezone(dt_timezone.utc).date())
+    if end is not None:
+        qs = qs.filter(day__lte=end.astimezone(dt_timezone.utc).date())
+    if room_id is not None:
+        qs = qs.filter(room_id=room_id)
+    elif room_ids is not None:
+        qs = qs.filter(room_id__in=list(room_ids))
+    return qs
+
+
+def points(start, bbox, end=None, room_id=None, room_ids=None):
+    """
+    (latitude, longitude, created_at) of archived fixes with start <=
+    created_at (< end) inside bbox (lat_min, lat_max, lng_min, lng_max),
+    like movement_store.points().
+    """
+    lat_min, lat_max, lng_min, lng_max = bbox
+    archives = _archives(start, end, room_id, room_ids).filter(
+        min_lat__lte=lat_max, max_lat__gte=lat_min, min_lng__lte=lng_max, max_lng__gte=lng_min
+    )
+    lo = _to_us(start)
+    hi = None if end is None else _to_us(end)
+    for archive in archives.order_by("day", "room_id"):
+        cols = load(archive)
+        i = int(np.searchsorted(cols["ts"], lo, side="left"))
+        j = len(cols["ts"]) if hi is None else int(np.searchsorted(cols["ts"], hi, side="left"))
+        lat, lng = cols["lat"][i:j], cols["lng"][i:j]
+        mask = (lat >= lat_min) & (lat <= lat_max) & (lng >= lng_min) & (lng <= lng_max)
+        for us, la, ln in zip(cols["ts"][i:j][mask].tolist(), lat[mask].tolist(), lng[mask].tolist()):
+            yield la, ln, _from_us(us)
+
+
+def cell_hour_counts(start, end, cell_deg):
+    """Archived counterpart of movement_store.cell_hour_counts() (start at midnight UTC)."""
+    for archive in _archives(start, end - timedelta(microseconds=1)):
+        cols = load(archive)
+        lo, hi = np.searchsorted(cols["ts"], [_to_us(start), _to_us(end)], side="left")
+        if lo == hi:
+            continue
+        keys = np.column_stack(
+            (
+                np.floor(cols["lng"][lo:hi] / cell_deg).astype(np.int64),
+                np.floor(cols["lat"][lo:hi] / cell_deg).astype(np.int64),
+                (cols["ts"][lo:hi] - _to_us(start)) // US_PER_HOUR,
+            )
+        )
+        cells, counts = np.unique(keys, axis=0, return_counts=True)
+        for (cx, cy, hour), n in zip(cells.tolist(), counts.tolist()):
+            yield {"room_id": archive.room_id, "cx": cx, "cy": cy, "hour": hour, "n": n}
+
+
+def latest_positions(room_id, at=None, known=()):
+    """
+    Last archived fix at or before at (default: any) of each member of
+    room_id not in known, as {user_id: (latitude, longitude, created_at)}.
+    Reads archived days newest first and stops once every member is placed.
+    """
+    archives = MovementArchive.objects.filter(room_id=room_id).order_by("-day")
+    if at is not None:
+        archives = archives.filter(day__lte=at.astimezone(dt_timezone.utc).date())
+    archives = list(archives)
+    if not archives:
+        return {}
+    wanted = set(Membership.objects.filter(room_id=room_id).values_list("user_id", flat=True)) - set(known)
+    found = {}
+    for archive in archives:
+        if not wanted:
+            break
+        cols = load(archive)
+        n = len(cols["ts"]) if at is None else int(np.searchsorted(cols["ts"], _to_us(at), side="right"))
+        # First index of each user in the reversed day = its last fix up to n
+        users, from_end = np.unique(cols["user"][:n][::-1], return_index=True)
+        for user_id, i in zip(users.tolist(), from_end.tolist()):
+            if user_id in wanted:
+                j = n - 1 - i
+                found[user_id] = (float(cols["lat"][j]), float(cols["lng"][j]), _from_us(int(cols["ts"][j])))
+                wanted.discard(user_id)
+    return found
@@ -0,0 +1,42 @@
+"""
+System checks for deployment settings the API relies on.
+
+Ingest throttling (api/throttling.py) and the live room activity counters
+(api/activity.py) keep their state in the default cache. With a
+per-process backend every gunicorn worker, the job worker and the flush
+command each see their own copy: limits multiply by the worker count and
+counters never reach the flush. Outside development (REQUIRE_SHARED_CACHE)
+such a backend is an error, so `migrate` and the management commands
+refuse to start on it.
+"""
+from django.conf import settings
+from django.core.cache import caches
+from django.core.checks import Error, register
+
+PROCESS_LOCAL_BACKENDS = (
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+)
+
+
+def process_local_cache(alias="default"):
+    """True if the cache alias keeps its data inside this process."""
+    return settings.CACHES[alias]["BACKEND"] in PROCESS_LOCAL_BACKENDS
+
+
+@register()
+def shared_cache_check(app_configs, **kwargs):
+    if not settings.REQUIRE_SHARED_CACHE or not process_local_cache():
+        return []
+    return [
+        Error(
+            f"The default cache ({settings.CACHES['default']['BACKEND']}) is local to each process.",
+            hint=(
+                "Set DJANGO_CACHE_BACKEND and DJANGO_CACHE_LOCATION to a cache shared by all workers "
+                "(e.g. django.core.cache.backends.redis.RedisCache), or REQUIRE_SHARED_CACHE=False "
+                "for a single-process setup."
+            ),
+            obj="CACHES",
+            id="api.E001",
+        )
+    ]
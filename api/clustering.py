@@ -0,0 +1,149 @@
+"""
+Member clustering by map zoom level.
+
+ZoomGrid keeps, for every zoom from 0 to CLUSTER_MAX_ZOOM, the occupied
+cells of a Web Mercator grid whose cells are CLUSTER_CELL_PX screen pixels
+wide at that zoom. Each cell holds its member count, the coordinate sums for
+the centroid, and its members. A cell at zoom z splits exactly into four at
+z + 1, so the levels form a quadtree. A member moving costs one cell update
+per level, and a query reads a single level.
+
+A query answers for one zoom and viewport. Cells with more than
+CLUSTER_POINT_THRESHOLD members come back as clusters (count and centroid).
+Smaller cells come back as their individual members. If the viewport covers
+more than CLUSTER_MAX_CELLS cells at the requested zoom, coarser levels are
+used until it does not. The payload therefore stays bounded however many
+members the room has.
+"""
+import math
+
+from django.conf import settings
+
+MAX_MERCATOR_LAT = 85.05112878
+TILE_PX = 256
+
+
+def mercator(lat, lng):
+    """(x, y) in [0, 1) Web Mercator units, y growing southwards."""
+    lat = max(-MAX_MERCATOR_LAT, min(MAX_MERCATOR_LAT, lat))
+    s = math.sin(math.radians(lat))
+    x = (lng + 180.0) / 360.0
+    y = 0.5 - math.log((1 + s) / (1 - s)) / (4 * math.pi)
+    return min(max(x, 0.0), 1 - 1e-12), min(max(y, 0.0), 1 - 1e-12)
+
+
+class ZoomGrid:
+    def __init__(self, max_zoom=None, cell_px=None):
+        self.max_zoom = settings.CLUSTER_MAX_ZOOM if max_zoom is None else max_zoom
+        cell_px = settings.CLUSTER_CELL_PX if cell_px is None else cell_px
+        # Cells per side at zoom 0; doubles with every zoom level
+        self.base = max(1, TILE_PX // cell_px)
+        self.levels = [{} for _ in range(self.max_zoom + 1)]  # (cx, cy) -> [count, sum_lat, sum_lng, {user_id}]
+        self.positions = {}  # user_id -> (lat, lng, finest cell)
+
+    def __len__(self):
+        return len(self.positions)
+
+    def _finest(self, lat, lng):
+        n = self.base << self.max_zoom
+        x, y = mercator(lat, lng)
+        return int(x * n), int(y * n)
+
+    def _add(self, user_id, lat, lng, finest):
+        cx, cy = finest
+        for level in reversed(self.levels):
+            cell = level.get((cx, cy))
+            if cell is None:
+                level[(cx, cy)] = [1, lat, lng, {user_id}]
+            else:
+                cell[0] += 1
+                cell[1] += lat
+                cell[2] += lng
+                cell[3].add(user_id)
+            cx >>= 1
+            cy >>= 1
+
+    def _remove(self, user_id, lat, lng, finest):
+        cx, cy = finest
+        for level in reversed(self.levels):
+            cell = level[(cx, cy)]
+            if cell[0] == 1:
+                del level[(cx, cy)]
+            else:
+                cell[0] -= 1
+                cell[1] -= lat
+                cell[2] -= lng
+                cell[3].discard(user_id)
+            cx >>= 1
+            cy >>= 1
+
+    def move(self, user_id, lat, lng):
+        finest = self._finest(lat, lng)
+        old = self.positions.get(user_id)
+        if old is not None:
+            old_lat, old_lng, old_finest = old
+            if old_finest == finest:
+                # Same cell at every level: only the centroid sums change
+                cx, cy = finest
+                for level in reversed(self.levels):
+                    cell = level[(cx, cy)]
+                    cell[1] += lat - old_lat
+                    cell[2] += lng - old_lng
+                    cx >>= 1
+                    cy >>= 1
+                self.positions[user_id] = (lat, lng, finest)
+                return
+            self._remove(user_id, old_lat, old_lng, old_finest)
+        self._add(user_id, lat, lng, finest)
+        self.positions[user_id] = (lat, lng, finest)
+
+    def remove(self, user_id):
+        old = self.positions.pop(user_id, None)
+        if old is not None:
+            self._remove(user_id, *old)
+
+    def _cell_range(self, zoom, bbox):
+        """Inclusive (x0, y0, x1, y1) cell range of bbox at zoom."""
+        n = self.base << zoom
+        min_lat, min_lng, max_lat, max_lng = bbox
+        x0, y1 = mercator(min_lat, min_lng)
+        x1, y0 = mercator(max_lat, max_lng)
+        return int(x0 * n), int(y0 * n), int(x1 * n), int(y1 * n)
+
+    def query(self, zoom, bbox=None):
+        """
+        Clusters and single members in bbox ((min_lat, min_lng, max_lat,
+        max_lng), default: all members) at zoom. Returns (zoom used,
+        [(count, lat, lng)], [user_id]).
+        """
+        zoom = max(0, min(int(zoom), self.max_zoom))
+        if bbox is None:
+            if not self.positions:
+                return zoom, [], []
+            occupied = self.levels[zoom].keys()
+            xs, ys = [cx for cx, _ in occupied], [cy for _, cy in occupied]
+            x0, y0, x1, y1 = min(xs), min(ys), max(xs), max(ys)
+        else:
+            x0, y0, x1, y1 = self._cell_range(zoom, bbox)
+        while (x1 - x0 + 1) * (y1 - y0 + 1) > settings.CLUSTER_MAX_CELLS and zoom > 0:
+            zoom -= 1
+            x0, y0, x1, y1 = x0 >> 1, y0 >> 1, x1 >> 1, y1 >> 1
+        span = (x1 - x0 + 1) * (y1 - y0 + 1)
+        level = self.levels[zoom]
+        if span < len(level):
+            cells = (
+                level[(cx, cy)]
+                for cx in range(x0, x1 + 1)
+                for cy in range(y0, y1 + 1)
+                if (cx, cy) in level
+            )
+        else:
+            cells = (c for (cx, cy), c in level.items() if x0 <= cx <= x1 and y0 <= cy <= y1)
+
+        clusters, singles = [], []
+        for count, sum_lat, sum_lng, members in cells:
+            if count > settings.CLUSTER_POINT_THRESHOLD:
+                clusters.append((count, sum_lat / count, sum_lng / count))
+            else:
+                singles.extend(members)
+        return zoom, clusters, singles
@@ -0,0 +1,101 @@
+"""
+Plain-dict serialization for the hot read endpoints.
+
+Each helper fetches only the columns its payload needs with values() (the
+nested user rides along as a join instead of a second query) and builds the
+same dicts RoomSerializer, GeoFenceSerializer and MeetingPointSerializer
+produce, key order and datetime format included, without DRF's per-field
+machinery. The ModelSerializers stay the reference for writes and for the
+less frequent endpoints.
+"""
+from django.utils import timezone
+
+from .models import GeoFence, Membership, MeetingPoint, Room
+
+USER_FIELDS = ("id", "username", "email", "first_name")
+
+
+def _datetime(value):
+    # Same as DRF's DateTimeField with the default ISO 8601 format
+    if value is None:
+        return None
+    value = value.astimezone(timezone.get_current_timezone()).isoformat()
+    if value.endswith("+00:00"):
+        value = value[:-6] + "Z"
+    return value
+
+
+def _user_columns(prefix):
+    return tuple(f"{prefix}__{f}" for f in USER_FIELDS)
+
+
+def _user(row, prefix):
+    return {f: row[f"{prefix}__{f}"] for f in USER_FIELDS}
+
+
+def _room_columns(prefix=""):
+    return tuple(f"{prefix}{f}" for f in ("id", "name", "created_at")) + _user_columns(f"{prefix}creator")
+
+
+def _room(row, prefix=""):
+    return {
+        "id": row[f"{prefix}id"],
+        "name": row[f"{prefix}name"],
+        "creator": _user(row, f"{prefix}creator"),
+        "created_at": _datetime(row[f"{prefix}created_at"]),
+    }
+
+
+GEOFENCE_COLUMNS = ("room_id", "center_lat", "center_lng", "radius_m", "created_at") + _user_columns("created_by")
+MEETING_COLUMNS = (
+    ("id", "room_id", "place_name", "lat", "lng", "reach_by", "active", "created_at") + _user_columns("created_by")
+)
+
+
+def _geofence(row):
+    return {
+        "room": row["room_id"],
+        "center_lat": row["center_lat"],
+        "center_lng": row["center_lng"],
+        "radius_m": row["radius_m"],
+        "created_by": _user(row, "created_by"),
+        "created_at": _datetime(row["created_at"]),
+    }
+
+
+def _meeting(row):
+    return {
+        "id": row["id"],
+        "room": row["room_id"],
+        "place_name": row["place_name"],
+        "lat": row["lat"],
+        "lng": row["lng"],
+        "reach_by": _datetime(row["reach_by"]),
+        "created_by": _user(row, "created_by"),
+        "active": row["active"],
+        "created_at": _datetime(row["created_at"]),
+    }
+
+
+def room_data(room_id):
+    """RoomSerializer output for room_id, or None if there is no such room."""
+    row = Room.objects.filter(id=room_id).values(*_room_columns()).first()
+    return None if row is None else _room(row)
+
+
+def user_rooms_data(user):
+    """RoomSerializer output for every room user belongs to, in membership order."""
+    rows = Membership.objects.filter(user=user).order_by("pk").values(*_room_columns("room__"))
+    return [_room(row, "room__") for row in rows]
+
+
+def geofence_data(room_id):
+    """GeoFenceSerializer output for the room's fence, or None."""
+    row = GeoFence.objects.filter(room_id=room_id).values(*GEOFENCE_COLUMNS).first()
+    return None if row is None else _geofence(row)
+
+
+def active_meeting_data(room_id):
+    """MeetingPointSerializer output for the room's newest active meeting, or None."""
+    row = MeetingPoint.objects.filter(room_id=room_id, active=True).values(*MEETING_COLUMNS).first()
+    return None if row is None else _meeting(row)
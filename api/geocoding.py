@@ -0,0 +1,320 @@
+"""
+Caching proxy for place search and place details (Nominatim API).
+
+The map's search box used to call the public geocoder from every browser,
+one request per keystroke pause. Lookups now come through here.
+
+- Queries are normalised: Unicode NFKC, case-folded, whitespace collapsed.
+  "Big  Ben" and "big ben" therefore share one entry.
+- Upstream is always asked for GEOCODER_FETCH_LIMIT results. A request for
+  fewer is served from the front of the cached list. The suggestion list
+  and the lookup for the same text on Enter (limit 1) thus cost one
+  upstream call.
+- There are two cache tiers. The first is a per-process LRU with a TTL.
+  Behind it sits a SQLite file at GEOCODER_CACHE_PATH that all workers
+  share and that survives restarts. The file keeps at most
+  GEOCODER_DISK_ENTRIES entries and drops the least recently used first.
+- Identical lookups in flight are coalesced. Threads of one process wait
+  for the first thread's answer. Across processes, a claim row in the
+  SQLite file elects one worker to fetch, and the others poll for its
+  entry.
+
+GEOCODER_URL is the upstream (point tests at a local stub). An empty
+GEOCODER_CACHE_PATH keeps the cache in memory only.
+"""
+import itertools
+import json
+import logging
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+OSM_TYPES = ("N", "W", "R")  # node, way, relation
+# An unusable cache file (unwritable directory, locked or corrupt database)
+# costs the cache, never the answer
+DB_ERRORS = (sqlite3.Error, OSError)
+CLAIM_POLL_SECONDS = 0.05
+PRUNE_EVERY_WRITES = 100
+
+_session = None
+_session_lock = threading.Lock()
+_memory = OrderedDict()  # key -> (expires, value)
+_memory_lock = threading.Lock()
+_flights = {}  # key -> _Flight
+_flights_lock = threading.Lock()
+_local = threading.local()  # per-thread SQLite connection
+_writes = itertools.count(1)
+
+
+class GeocoderUnavailable(Exception):
+    pass
+
+
+class GeocoderNotFound(Exception):
+    pass
+
+
+def get_session():
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                # The upstream's usage policy requires an identifying User-Agent
+                session.headers["User-Agent"] = settings.GEOCODER_USER_AGENT
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=settings.GEOCODER_HTTP_POOL_SIZE, max_retries=0)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+    return _session
+
+
+def normalize_query(query):
+    return " ".join(unicodedata.normalize("NFKC", query).casefold().split())
+
+
+def _fetch(path, params):
+    try:
+        response = get_session().get(
+            settings.GEOCODER_URL.rstrip("/") + path,
+            params=params,
+            timeout=(settings.GEOCODER_CONNECT_TIMEOUT, settings.GEOCODER_READ_TIMEOUT),
+        )
+        if response.status_code == 404:
+            raise GeocoderNotFound()
+        if response.status_code != 200:
+            raise GeocoderUnavailable()
+        return response.json()
+    except requests.RequestException:
+        raise GeocoderUnavailable()
+    except ValueError:
+        # Non-JSON body from upstream
+        raise GeocoderUnavailable()
+
+
+# --- memory tier ---
+
+def _memory_get(key, now):
+    with _memory_lock:
+        entry = _memory.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= now:
+            del _memory[key]
+            return None
+        _memory.move_to_end(key)
+        return entry[1]
+
+
+def _memory_put(key, value, expires):
+    with _memory_lock:
+        _memory[key] = (expires, value)
+        _memory.move_to_end(key)
+        while len(_memory) > settings.GEOCODER_MEMORY_ENTRIES:
+            _memory.popitem(last=False)
+
+
+# --- disk tier ---
+
+def _db():
+    """This thread's connection to the shared cache file, or None when the disk tier is off."""
+    path = settings.GEOCODER_CACHE_PATH
+    if not path:
+        return None
+    conn = getattr(_local, "conn", None)
+    if conn is not None and _local.path == path:
+        return conn
+    if conn is not None:
+        conn.close()
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(path, timeout=5, isolation_level=None)
+    # WAL: readers in other workers are not blocked while one of them writes
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS entries "
+        "(key TEXT PRIMARY KEY, body TEXT NOT NULL, expires REAL NOT NULL, used REAL NOT NULL)"
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS entries_used ON entries (used)")
+    conn.execute("CREATE TABLE IF NOT EXISTS claims (key TEXT PRIMARY KEY, claimed REAL NOT NULL)")
+    _local.conn, _local.path = conn, path
+    return conn
+
+
+def _disk_get(db, key, now):
+    row = db.execute("SELECT body, expires FROM entries WHERE key = ? AND expires > ?", (key, now)).fetchone()
+    if row is None:
+        return None
+    db.execute("UPDATE entries SET used = ? WHERE key = ?", (now, key))
+    return json.loads(row[0]), row[1]
+
+
+def _disk_put(db, key, value, expires, now):
+    db.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)", (key, json.dumps(value), expires, now))
+    if next(_writes) % PRUNE_EVERY_WRITES == 0:
+        prune(db, now)
+
+
+def prune(db=None, now=None):
+    """Drop expired entries, then the least recently used beyond GEOCODER_DISK_ENTRIES."""
+    db = db or _db()
+    if db is None:
+        return
+    db.execute("DELETE FROM entries WHERE expires <= ?", (time.time() if now is None else now,))
+    db.execute(
+        "DELETE FROM entries WHERE key IN (SELECT key FROM entries ORDER BY used DESC LIMIT -1 OFFSET ?)",
+        (settings.GEOCODER_DISK_ENTRIES,),
+    )
+
+
+def _claim(db, key, now):
+    """Become the worker that fetches key. False while another worker holds a live claim."""
+    if db.execute("INSERT OR IGNORE INTO claims VALUES (?, ?)", (key, now)).rowcount == 1:
+        return True
+    # A claim older than any fetch can take was left by a worker that died mid-fetch
+    stale = now - settings.GEOCODER_CONNECT_TIMEOUT - settings.GEOCODER_READ_TIMEOUT - 1
+    return db.execute("UPDATE claims SET claimed = ? WHERE key = ? AND claimed < ?", (now, key, stale)).rowcount == 1
+
+
+def _release(db, key):
+    try:
+        db.execute("DELETE FROM claims WHERE key = ?", (key,))
+    except DB_ERRORS:
+        # Left to go stale; the next caller takes it over
+        pass
+
+
+def _load(key, fetch):
+    """(value, expires) from the disk tier, fetching under a cross-worker claim on a miss."""
+    ttl = settings.GEOCODER_CACHE_SECONDS
+    try:
+        db = _db()
+    except DB_ERRORS:
+        logger.warning("geocoder cache file unavailable; fetching uncached", exc_info=True)
+        db = None
+    if db is None:
+        return fetch(), time.time() + ttl
+
+    deadline = time.monotonic() + settings.GEOCODER_COALESCE_TIMEOUT
+    while True:
+        now = time.time()
+        claimed = False
+        try:
+            hit = _disk_get(db, key, now)
+            claimed = hit is None and _claim(db, key, now)
+            if claimed:
+                # The fetching worker may have stored its entry and released
+                # its claim between our miss and our claim
+                hit = _disk_get(db, key, now)
+        except DB_ERRORS:
+            logger.warning("geocoder cache file unavailable; fetching uncached", exc_info=True)
+            if claimed:
+                _release(db, key)
+            return fetch(), now + ttl
+        if hit is not None:
+            if claimed:
+                _release(db, key)
+            return hit
+        if claimed:
+            try:
+                value = fetch()
+                expires = time.time() + ttl
+                try:
+                    _disk_put(db, key, value, expires, now)
+                except DB_ERRORS:
+                    logger.warning("geocoder cache file unavailable; answer not persisted", exc_info=True)
+                return value, expires
+            finally:
+                _release(db, key)
+        if time.monotonic() > deadline:
+            raise GeocoderUnavailable()
+        time.sleep(CLAIM_POLL_SECONDS)
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+def _cached(key, fetch):
+    value = _memory_get(key, time.time())
+    if value is not None:
+        return value
+    with _flights_lock:
+        flight = _flights.get(key)
+        leader = flight is None
+        if leader:
+            flight = _flights[key] = _Flight()
+    if not leader:
+        if not flight.done.wait(settings.GEOCODER_COALESCE_TIMEOUT):
+            raise GeocoderUnavailable()
+        if flight.error is not None:
+            raise flight.error
+        return flight.value
+    try:
+        flight.value, expires = _load(key, fetch)
+        _memory_put(key, flight.value, expires)
+        return flight.value
+    except Exception as e:
+        # Followers re-raise whatever stopped the leader
+        flight.error = e
+        raise
+    finally:
+        with _flights_lock:
+            del _flights[key]
+        flight.done.set()
+
+
+def search(query, limit, near=None):
+    """
+    Up to limit (at most GEOCODER_FETCH_LIMIT) places matching query, in the
+    upstream's format=json shape with address details and extra tags. near,
+    a (lat, lng), biases results towards a box around it. The box is snapped
+    to a GEOCODER_BIAS_GRID_DEG grid so that nearby callers share an entry.
+    Raises GeocoderUnavailable if the upstream cannot be reached.
+    """
+    q = normalize_query(query)
+    params = {
+        "q": q,
+        "format": "json",
+        "addressdetails": 1,
+        "extratags": 1,
+        "limit": settings.GEOCODER_FETCH_LIMIT,
+        "accept-language": settings.GEOCODER_LANGUAGE,
+    }
+    key = f"search:{q}"
+    if near is not None:
+        grid = settings.GEOCODER_BIAS_GRID_DEG
+        # In whole grid steps, so float noise cannot split one box into two keys
+        cy, cx = round(near[0] / grid), round(near[1] / grid)
+        params["viewbox"] = f"{(cx - 1) * grid:.4f},{(cy - 1) * grid:.4f},{(cx + 1) * grid:.4f},{(cy + 1) * grid:.4f}"
+        params["bounded"] = 0
+        key += "@" + params["viewbox"]
+    return _cached(key, lambda: _fetch("/search", params))[:limit]
+
+
+def details(osm_type, osm_id):
+    """
+    Details of one OSM object (osm_type N, W or R) with its geometry as
+    GeoJSON. Raises GeocoderNotFound for unknown objects and
+    GeocoderUnavailable if the upstream cannot be reached.
+    """
+    params = {
+        "osmtype": osm_type,
+        "osmid": osm_id,
+        "format": "json",
+        "polygon_geojson": 1,
+        "accept-language": settings.GEOCODER_LANGUAGE,
+    }
+    return _cached(f"details:{osm_type}{osm_id}", lambda: _fetch("/details", params))
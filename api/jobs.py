@@ -0,0 +1,182 @@
+"""
+Database-backed job queue for heavy analytics requests.
+
+Endpoints enqueue a Job and return its id; the run_jobs management command
+claims queued jobs, runs the registered handler and stores the result until
+JOBS_RESULT_TTL_SECONDS after completion. Claims are a conditional UPDATE,
+so several workers can share the table without a broker or row locks.
+Running jobs whose heartbeat is older than JOBS_LEASE_SECONDS are assumed
+lost with their worker and are requeued (or failed after JOBS_MAX_ATTEMPTS).
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+HANDLERS = {}
+
+
+class JobError(Exception):
+    """Raised by a handler to fail a job with a user-facing message."""
+
+
+def register(kind):
+    def decorator(func):
+        HANDLERS[kind] = func
+        return func
+    return decorator
+
+
+def enqueue(kind, params, user=None):
+    if kind not in HANDLERS:
+        raise ValueError(f"unknown job kind {kind}")
+    return Job.objects.create(kind=kind, params=params, created_by=user)
+
+
+def claim_next(worker):
+    """
+    Atomically move the oldest queued job to running, or return None.
+
+    JOBS_MAX_RUNNING is a soft bound: the running count is read before the
+    claiming UPDATE, so workers claiming at the same moment can each see
+    room for one more job and briefly exceed it by up to one job per worker.
+    """
+    if Job.objects.filter(status=Job.RUNNING).count() >= settings.JOBS_MAX_RUNNING:
+        return None
+    candidates = Job.objects.filter(status=Job.QUEUED).order_by("created_at").values_list("id", flat=True)[:10]
+    for job_id in candidates:
+        now = timezone.now()
+        claimed = Job.objects.filter(id=job_id, status=Job.QUEUED).update(
+            status=Job.RUNNING,
+            worker=worker,
+            claimed_at=now,
+            heartbeat_at=now,
+            attempts=F("attempts") + 1,
+        )
+        if claimed:
+            return Job.objects.get(id=job_id)
+    return None
+
+
+def heartbeat(job_ids, worker):
+    if job_ids:
+        Job.objects.filter(id__in=job_ids, status=Job.RUNNING, worker=worker).update(heartbeat_at=timezone.now())
+
+
+def run(job):
+    """Run a claimed job and record its outcome."""
+    try:
+        handler = HANDLERS[job.kind]
+        result = handler(job.params)
+    except JobError as e:
+        fields = {"status": Job.FAILED, "error": str(e)}
+    except Exception as e:
+        logger.exception("job %s (%s) crashed", job.id, job.kind)
+        fields = {"status": Job.FAILED, "error": f"internal error: {e.__class__.__name__}"}
+    else:
+        fields = {"status": Job.DONE, "result": result}
+    # Handlers may redact secrets from their params in place
+    fields["params"] = job.params
+    finished = timezone.now()
+    fields.update(finished_at=finished, expires_at=finished + timedelta(seconds=settings.JOBS_RESULT_TTL_SECONDS))
+    # Only the worker still holding the claim may finish the job
+    Job.objects.filter(id=job.id, status=Job.RUNNING, worker=job.worker).update(**fields)
+
+
+def recover_stale():
+    """Requeue running jobs whose worker stopped heartbeating."""
+    cutoff = timezone.now() - timedelta(seconds=settings.JOBS_LEASE_SECONDS)
+    stale = Job.objects.filter(status=Job.RUNNING, heartbeat_at__lt=cutoff)
+    finished = timezone.now()
+    failed = stale.filter(attempts__gte=settings.JOBS_MAX_ATTEMPTS).update(
+        status=Job.FAILED,
+        error="worker lost",
+        finished_at=finished,
+        expires_at=finished + timedelta(seconds=settings.JOBS_RESULT_TTL_SECONDS),
+    )
+    requeued = stale.update(status=Job.QUEUED, worker="", claimed_at=None, heartbeat_at=None)
+    return requeued, failed
+
+
+def purge_expired():
+    deleted, _ = Job.objects.filter(expires_at__lt=timezone.now()).delete()
+    return deleted
+
+
+# ------------------------------
+# Handlers
+# ------------------------------
+@register("traffic.predict")
+def _traffic_predict(params):
+    from .views import run_traffic_prediction
+
+    data, status_code = run_traffic_prediction(params)
+    if status_code != 200:
+        raise JobError(data.get("error", "prediction failed"))
+    return data
+
+
+@register("traffic.build_profiles")
+def _traffic_build_profiles(params):
+    from .profiles import ProfileConfigError, build_profiles
+
+    try:
+        folded = build_profiles(rebuild=bool(params.get("rebuild")), max_days=params.get("max_days"))
+    except ProfileConfigError as e:
+        raise JobError(str(e))
+    return {"folded_days": folded}
+
+
+@register("movements.segment")
+def _movements_segment(params):
+    from .segmentation import SegmentationConfigError, run_segmentation
+
+    try:
+        return run_segmentation(rebuild=bool(params.get("rebuild")))
+    except SegmentationConfigError as e:
+        raise JobError(str(e))
+
+
+@register("movements.archive")
+def _movements_archive(params):
+    from django.core.exceptions import ImproperlyConfigured
+
+    from .archive import archive_movements
+
+    try:
+        return archive_movements(max_days=params.get("max_days"))
+    except ImproperlyConfigured as e:
+        raise JobError(str(e))
+
+
+@register("rooms.flush_activity")
+def _rooms_flush_activity(params):
+    from django.core.exceptions import ImproperlyConfigured
+
+    from .activity import flush
+
+    try:
+        return {"rooms": flush()}
+    except ImproperlyConfigured as e:
+        raise JobError(str(e))
+
+
+@register("rooms.provision")
+def _rooms_provision(params):
+    from .models import Room
+    from .provisioning import provision
+
+    # Drop plaintext passwords from the stored job once it has run
+    users = params.pop("users", [])
+    params["received"] = len(users)
+    try:
+        room = Room.objects.get(id=params.get("room_id"))
+    except Room.DoesNotExist:
+        raise JobError("room not found")
+    return provision(room, users, dry_run=bool(params.get("dry_run")))
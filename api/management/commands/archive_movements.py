@@ -0,0 +1,37 @@
+import time
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+
+from api.archive import archive_movements, hot_horizon
+
+
+class Command(BaseCommand):
+    help = (
+        "Move fixes of days older than MOVEMENT_ARCHIVE_AFTER_DAYS out of the database "
+        "into per-room, per-day columnar files under MOVEMENT_ARCHIVE_DIR."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--max-days", type=int, default=None, help="Archive at most this many days per run.")
+        parser.add_argument(
+            "--every",
+            type=int,
+            default=0,
+            help="Keep running and archive newly cold days every N seconds.",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            try:
+                report = archive_movements(max_days=options["max_days"])
+            except ImproperlyConfigured as e:
+                raise CommandError(str(e))
+            self.stdout.write(
+                f"Archived {report['rows']} fix(es) from {report['days']} day(s), {report['rooms']} room-day(s) "
+                f"before {hot_horizon():%Y-%m-%d}; pruned {report['pruned']} deleted room(s) "
+                f"and {report['superseded']} superseded day version(s)"
+            )
+            if not options["every"]:
+                return
+            time.sleep(options["every"])
@@ -0,0 +1,67 @@
+import statistics
+import time
+import uuid
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework_simplejwt.tokens import AccessToken
+
+from api.models import Room
+from api.startup import cold_start
+
+
+class Command(BaseCommand):
+    help = (
+        "Time from process start to the first bootstrap_room response, over "
+        "several fresh processes. Exits non-zero when the median exceeds the budget."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--runs", type=int, default=5)
+        parser.add_argument(
+            "--budget-ms",
+            type=float,
+            default=None,
+            help="Fail above this median (default: COLD_START_BUDGET_MS).",
+        )
+        parser.add_argument("--room-id", default=None, help="Use this room instead of a temporary one.")
+
+    def handle(self, *args, **options):
+        budget_ms = options["budget_ms"] or settings.COLD_START_BUDGET_MS
+        temporary = None
+        if options["room_id"]:
+            try:
+                room = Room.objects.get(id=options["room_id"])
+            except Room.DoesNotExist:
+                raise CommandError("room not found")
+        else:
+            temporary = User.objects.create_user(username=f"__coldstart_{uuid.uuid4().hex[:8]}__")
+            room = Room.objects.create(name="cold start benchmark", creator=temporary)
+
+        totals, setups, firsts = [], [], []
+        try:
+            token = str(AccessToken.for_user(room.creator))
+            for _ in range(options["runs"]):
+                started = time.perf_counter()
+                try:
+                    run = cold_start(room.id, token)
+                except RuntimeError as e:
+                    raise CommandError(str(e))
+                totals.append((time.perf_counter() - started) * 1000)
+                if not run["status"].startswith("200"):
+                    raise CommandError(f"bootstrap_room answered {run['status']}")
+                setups.append(run["setup_ms"])
+                firsts.append(run["first_response_ms"])
+        finally:
+            if temporary:
+                temporary.delete()
+
+        median = statistics.median(totals)
+        self.stdout.write(
+            f"runs={len(totals)} median={median:.0f} ms (min {min(totals):.0f}, max {max(totals):.0f}); "
+            f"median app setup {statistics.median(setups):.0f} ms, first request {statistics.median(firsts):.0f} ms"
+        )
+        if median > budget_ms:
+            raise CommandError(f"cold start median {median:.0f} ms exceeds budget {budget_ms:.0f} ms")
+        self.stdout.write(self.style.SUCCESS(f"within budget ({budget_ms:.0f} ms)"))
@@ -0,0 +1,97 @@
+import math
+import random
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.nearby import RoomIndex
+from api.traffic import METERS_PER_DEG_LAT
+
+
+def _percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+class Command(BaseCommand):
+    help = (
+        "Time k-nearest, radius and zoom-cluster queries on an in-memory nearby "
+        "index of synthetic members, checking results against a brute-force scan. "
+        "Exits non-zero when the p99 query time exceeds the budget."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--members", type=int, default=10000)
+        parser.add_argument("--spread-m", type=float, default=2000, help="Members are placed in a square this wide.")
+        parser.add_argument("--queries", type=int, default=2000)
+        parser.add_argument("--k", type=int, default=10)
+        parser.add_argument("--radius-m", type=float, default=100)
+        parser.add_argument("--zoom", type=int, default=15, help="Zoom of the cluster queries.")
+        parser.add_argument("--budget-ms", type=float, default=1.0, help="Fail above this p99 query time.")
+        parser.add_argument("--seed", type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        lat0, lng0 = 51.5, -0.12
+        half_lat = options["spread_m"] / 2 / METERS_PER_DEG_LAT
+        half_lng = half_lat / math.cos(math.radians(lat0))
+
+        def point():
+            return lat0 + rng.uniform(-half_lat, half_lat), lng0 + rng.uniform(-half_lng, half_lng)
+
+        index = RoomIndex(room_id=0, cell_m=settings.NEARBY_CELL_M)
+        now = time.time()
+        started = time.perf_counter()
+        for user_id in range(options["members"]):
+            index.update(user_id, *point(), now)
+        load_ms = (time.perf_counter() - started) * 1000
+
+        # Half the members move once more, as the incremental sync would apply
+        index.clusters(0)
+        started = time.perf_counter()
+        moves = options["members"] // 2
+        for user_id in rng.sample(range(options["members"]), moves):
+            index.update(user_id, *point(), now + 1)
+        update_us = (time.perf_counter() - started) / max(moves, 1) * 1e6
+
+        queries = [point() for _ in range(options["queries"])]
+        timings = {"nearest": [], "within": [], "clusters": []}
+        for lat, lng in queries:
+            started = time.perf_counter()
+            index.nearest(lat, lng, options["k"])
+            timings["nearest"].append((time.perf_counter() - started) * 1000)
+            started = time.perf_counter()
+            index.within(lat, lng, options["radius_m"])
+            timings["within"].append((time.perf_counter() - started) * 1000)
+            # A phone-sized viewport around the point
+            half = 0.004 * 2 ** (15 - options["zoom"])
+            started = time.perf_counter()
+            index.clusters(options["zoom"], (lat - half, lng - half, lat + half, lng + half))
+            timings["clusters"].append((time.perf_counter() - started) * 1000)
+
+        for lat, lng in queries[:20]:
+            x, y = index._project(lat, lng)
+            brute = sorted((math.hypot(m[0] - x, m[1] - y), u) for u, m in index.members.items())
+            if [u for _, u in index.nearest(lat, lng, options["k"])] != [u for _, u in brute[: options["k"]]]:
+                raise CommandError("nearest() disagrees with a brute-force scan")
+            if [u for _, u in index.within(lat, lng, options["radius_m"])] != [
+                u for d, u in brute if d <= options["radius_m"]
+            ]:
+                raise CommandError("within() disagrees with a brute-force scan")
+
+        self.stdout.write(
+            f"members={len(index)} cells={len(index.cells)} load={load_ms:.0f} ms "
+            f"update={update_us:.1f} us/fix (clusters included)"
+        )
+        worst = 0.0
+        for name, values in timings.items():
+            p99 = _percentile(values, 0.99)
+            worst = max(worst, p99)
+            self.stdout.write(
+                f"{name:8} p50={statistics.median(values):.3f} ms p99={p99:.3f} ms max={max(values):.3f} ms"
+            )
+        if worst > options["budget_ms"]:
+            raise CommandError(f"p99 query time {worst:.3f} ms exceeds budget {options['budget_ms']:.3f} ms")
+        self.stdout.write(self.style.SUCCESS(f"within budget ({options['budget_ms']:.3f} ms)"))
@@ -0,0 +1,136 @@
+import json
+import random
+import time
+import uuid
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from api.fast_serializers import active_meeting_data, geofence_data, room_data, user_rooms_data
+from api.models import GeoFence, MeetingPoint, Membership, Room
+from api.renderers import FastJSONRenderer, orjson
+from api.serializers import GeoFenceSerializer, MeetingPointSerializer, RoomSerializer
+
+
+def _cpu_us(fn, iterations):
+    started = time.process_time()
+    for _ in range(iterations):
+        fn()
+    return (time.process_time() - started) / iterations * 1e6
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare per-call CPU time of the DRF serializers and the values()-based "
+        "read paths of the hot endpoints (checking the output is identical), and "
+        "of the stock and orjson JSON renderers."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=300)
+        parser.add_argument("--rooms", type=int, default=20, help="Rooms the benchmark user belongs to.")
+        parser.add_argument("--nodes", type=int, default=500, help="Path nodes in the predict_traffic payload.")
+
+    def handle(self, *args, **options):
+        user = User.objects.create_user(
+            username=f"__serialization_{uuid.uuid4().hex[:8]}__", email="bench@example.com", first_name="Bench"
+        )
+        try:
+            rooms = [Room.objects.create(name=f"bench {i}", creator=user) for i in range(options["rooms"])]
+            Membership.objects.bulk_create([Membership(user=user, room=r) for r in rooms])
+            room = rooms[0]
+            GeoFence.objects.create(room=room, center_lat=51.5, center_lng=-0.12, radius_m=300, created_by=user)
+            MeetingPoint.objects.create(
+                room=room, place_name="Gate A", lat=51.501, lng=-0.121, reach_by=timezone.now(), created_by=user
+            )
+            self._compare_serializers(user, room, options["iterations"])
+            self._compare_renderers(options["nodes"], options["iterations"])
+        finally:
+            user.delete()
+
+    def _compare_serializers(self, user, room, iterations):
+        def legacy_bootstrap():
+            r = Room.objects.get(id=room.id)
+            data = {"ok": True, "room": RoomSerializer(r).data}
+            fence = getattr(r, "geofence", None)
+            if fence:
+                data["geofence"] = GeoFenceSerializer(fence).data
+            meeting = r.meetings.filter(active=True).first()
+            if meeting:
+                data["meeting"] = MeetingPointSerializer(meeting).data
+            return data
+
+        def fast_bootstrap():
+            data = {"ok": True, "room": room_data(room.id)}
+            data["geofence"] = geofence_data(room.id)
+            data["meeting"] = active_meeting_data(room.id)
+            return data
+
+        cases = [
+            ("bootstrap_room", legacy_bootstrap, fast_bootstrap),
+            (
+                "list_rooms",
+                lambda: [RoomSerializer(m.room).data for m in Membership.objects.filter(user=user).select_related("room")],
+                lambda: user_rooms_data(user),
+            ),
+            (
+                "get_geofence",
+                lambda: GeoFenceSerializer(Room.objects.get(id=room.id).geofence).data,
+                lambda: geofence_data(room.id),
+            ),
+            (
+                "get_meeting_point",
+                lambda: MeetingPointSerializer(Room.objects.get(id=room.id).meetings.filter(active=True).first()).data,
+                lambda: active_meeting_data(room.id),
+            ),
+        ]
+        self.stdout.write(f"{'endpoint':<18} {'drf us':>9} {'fast us':>9} {'cut':>6} {'queries':>9}")
+        for name, legacy, fast in cases:
+            # Identical output, key order included
+            if json.dumps(legacy(), cls=JSONRenderer.encoder_class) != json.dumps(fast(), cls=JSONRenderer.encoder_class):
+                raise CommandError(f"{name}: fast output differs from the serializer output")
+            queries = []
+            for fn in (legacy, fast):
+                with override_settings(DEBUG=True):
+                    connection.queries_log.clear()
+                    fn()
+                    queries.append(len(connection.queries))
+            legacy_us, fast_us = _cpu_us(legacy, iterations), _cpu_us(fast, iterations)
+            self.stdout.write(
+                f"{name:<18} {legacy_us:>9.0f} {fast_us:>9.0f} {1 - fast_us / legacy_us:>6.0%} {queries[0]:>4}->{queries[1]:<4}"
+            )
+
+    def _compare_renderers(self, nodes, iterations):
+        rnd = random.Random(1)
+        payload = {
+            "scope": "global",
+            "mode": "live",
+            "window_minutes": 60,
+            "routes": [
+                {
+                    "index": i,
+                    "overall_index": rnd.random() * 100,
+                    "node_indices": [rnd.random() * 100 for _ in range(nodes)],
+                }
+                for i in range(3)
+            ],
+            "ranking": [2, 0, 1],
+            "generated_at": timezone.now(),
+        }
+        stock = JSONRenderer()
+        fast = FastJSONRenderer()
+        with override_settings(FAST_JSON_RENDERER=True):
+            if json.loads(stock.render(payload)) != json.loads(fast.render(payload)):
+                raise CommandError("FastJSONRenderer output differs")
+            stock_us, fast_us = _cpu_us(lambda: stock.render(payload), iterations), _cpu_us(
+                lambda: fast.render(payload), iterations
+            )
+        note = "" if orjson else " (orjson not installed: same encoder)"
+        self.stdout.write(
+            f"render predict_traffic ({nodes} nodes x 3 routes): stock {stock_us:.0f} us, "
+            f"fast {fast_us:.0f} us, cut {1 - fast_us / stock_us:.0%}{note}"
+        )
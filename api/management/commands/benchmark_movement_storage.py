@@ -0,0 +1,108 @@
+import random
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from api import movement_store
+from api.models import CompactMovement, Movement, Room
+
+
+def _sizes(model):
+    """(table bytes, index bytes) or (None, None) if the backend can't tell."""
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            cursor.execute("SELECT pg_relation_size(%s), pg_indexes_size(%s)", [table, table])
+            return cursor.fetchone()
+        if connection.vendor == "sqlite":
+            try:
+                cursor.execute("SELECT name, SUM(pgsize) FROM dbstat GROUP BY name")
+            except Exception:
+                return None, None
+            sizes = dict(cursor.fetchall())
+            cursor.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = %s", [table])
+            indexes = [row[0] for row in cursor.fetchall()]
+            return sizes.get(table, 0), sum(sizes.get(name, 0) for name in indexes)
+    return None, None
+
+
+def _mb(n):
+    return "n/a" if n is None else f"{n / 1e6:.1f} MB"
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare table size, index size and scan speed of the float and compact "
+        "movement storage on synthetic rows (e.g. --rows 10000000)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=1_000_000)
+        parser.add_argument("--batch-size", type=int, default=50_000)
+        parser.add_argument("--keep", action="store_true", help="Keep the benchmark room and its rows.")
+
+    def handle(self, *args, **options):
+        user, _ = User.objects.get_or_create(username="__storage_bench__")
+        room = Room.objects.create(name="storage benchmark", creator=user)
+        results = []
+        try:
+            for storage, model in (("float", Movement), ("compact", CompactMovement)):
+                results.append((storage, *self._bench(storage, model, user, room, options)))
+        finally:
+            if not options["keep"]:
+                room.delete()
+                user.delete()
+
+        self.stdout.write(f"{'storage':<8} {'rows':>10} {'table':>10} {'indexes':>10} {'insert/s':>10} {'scan/s':>10}")
+        for storage, rows, table, indexes, insert_rate, scan_rate in results:
+            self.stdout.write(
+                f"{storage:<8} {rows:>10} {_mb(table):>10} {_mb(indexes):>10} {insert_rate:>10.0f} {scan_rate:>10.0f}"
+            )
+
+    def _bench(self, storage, model, user, room, options):
+        rng = random.Random(42)
+        table_before, index_before = _sizes(model)
+        now_ts = int(movement_store.encode_ts(timezone.now()))
+        lat, lng = 23.0225, 72.5714
+        started = time.monotonic()
+        remaining = options["rows"]
+        while remaining > 0:
+            n = min(remaining, options["batch_size"])
+            objs = []
+            for _ in range(n):
+                lat += rng.uniform(-1e-4, 1e-4)
+                lng += rng.uniform(-1e-4, 1e-4)
+                if model is Movement:
+                    objs.append(Movement(user=user, room=room, latitude=lat, longitude=lng))
+                else:
+                    objs.append(
+                        CompactMovement(
+                            user=user,
+                            room=room,
+                            lat_e7=movement_store.encode_coord(lat),
+                            lng_e7=movement_store.encode_coord(lng),
+                            ts=now_ts,
+                        )
+                    )
+            with transaction.atomic():
+                model.objects.bulk_create(objs, batch_size=5000)
+            remaining -= n
+        insert_rate = options["rows"] / max(time.monotonic() - started, 1e-9)
+
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute(f"ANALYZE {model._meta.db_table}")
+        table_after, index_after = _sizes(model)
+
+        with override_settings(MOVEMENT_STORAGE=storage):
+            started = time.monotonic()
+            scanned = sum(1 for _ in movement_store.points({"room_id": room.id}))
+            scan_rate = scanned / max(time.monotonic() - started, 1e-9)
+
+        table = None if table_before is None else table_after - table_before
+        indexes = None if index_before is None else index_after - index_before
+        return options["rows"], table, indexes, insert_rate, scan_rate
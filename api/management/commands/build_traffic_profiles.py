@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.profiles import ProfileConfigError, build_profiles
+
+
+class Command(BaseCommand):
+    help = "Fold closed days of Movement history into hour-of-week traffic profiles."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rebuild", action="store_true", help="Drop existing profiles and start over.")
+        parser.add_argument("--max-days", type=int, default=None, help="Fold at most this many days per run.")
+        parser.add_argument(
+            "--every",
+            type=int,
+            default=0,
+            help="Keep running and check for newly closed days every N seconds.",
+        )
+
+    def handle(self, *args, **options):
+        rebuild = options["rebuild"]
+        while True:
+            try:
+                folded = build_profiles(rebuild=rebuild, max_days=options["max_days"])
+            except ProfileConfigError as e:
+                raise CommandError(f"{e} (run with --rebuild)")
+            rebuild = False
+            self.stdout.write(f"Folded {folded} day(s) into traffic profiles")
+            if not options["every"]:
+                return
+            time.sleep(options["every"])
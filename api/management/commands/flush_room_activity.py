@@ -0,0 +1,29 @@
+import time
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+
+from api.activity import flush
+
+
+class Command(BaseCommand):
+    help = "Write the live per-room activity counters from the cache to RoomActivity."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--every",
+            type=int,
+            default=0,
+            help="Keep running and flush every N seconds.",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            try:
+                rooms = flush()
+            except ImproperlyConfigured as e:
+                raise CommandError(str(e))
+            self.stdout.write(f"Flushed activity of {rooms} room(s)")
+            if not options["every"]:
+                return
+            time.sleep(options["every"])
@@ -0,0 +1,93 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from api.models import COORD_SCALE, CompactMovement, Movement
+from api.movement_store import decode_ts, encode_coord, encode_ts
+
+
+# Rows are copied oldest first and get fresh pks, so pks in the target keep
+# growing with time as first_pk_since, scan.window_pk_range and the
+# segmentation checkpoint assume. That only holds while nothing else writes
+# to the target: a batch older than the target's newest fix is refused.
+_NEWER_IN_TARGET = (
+    "the target table has fixes newer than the rows left to move; appending them would break the "
+    "pk/time order. Stop ingestion and move everything before switching MOVEMENT_STORAGE."
+)
+
+
+def _move_to_compact(batch_size):
+    rows = list(
+        Movement.objects.order_by("created_at", "pk").values_list(
+            "pk", "user_id", "room_id", "latitude", "longitude", "created_at"
+        )[:batch_size]
+    )
+    if not rows:
+        return 0
+    newest = CompactMovement.objects.order_by("-ts").values_list("ts", flat=True).first()
+    if newest is not None and newest > int(encode_ts(rows[0][5])):
+        raise CommandError(_NEWER_IN_TARGET)
+    CompactMovement.objects.bulk_create(
+        [
+            CompactMovement(
+                user_id=user_id,
+                room_id=room_id,
+                lat_e7=encode_coord(lat),
+                lng_e7=encode_coord(lng),
+                ts=int(encode_ts(created_at)),
+            )
+            for _, user_id, room_id, lat, lng, created_at in rows
+        ]
+    )
+    Movement.objects.filter(pk__in=[row[0] for row in rows]).delete()
+    return len(rows)
+
+
+def _move_to_float(batch_size):
+    rows = list(
+        CompactMovement.objects.order_by("ts", "pk").values_list("pk", "user_id", "room_id", "lat_e7", "lng_e7", "ts")[
+            :batch_size
+        ]
+    )
+    if not rows:
+        return 0
+    newest = Movement.objects.order_by("-created_at").values_list("created_at", flat=True).first()
+    if newest is not None and newest > decode_ts(rows[0][5]):
+        raise CommandError(_NEWER_IN_TARGET)
+    created = Movement.objects.bulk_create(
+        [
+            Movement(user_id=user_id, room_id=room_id, latitude=lat_e7 / COORD_SCALE, longitude=lng_e7 / COORD_SCALE)
+            for _, user_id, room_id, lat_e7, lng_e7, _ in rows
+        ]
+    )
+    # created_at is auto_now_add, so bulk_create stamped "now"; restore it
+    if created and created[0].pk is None:
+        raise CommandError("this database does not return ids from bulk_create")
+    for movement, row in zip(created, rows):
+        movement.created_at = decode_ts(row[5])
+    Movement.objects.bulk_update(created, ["created_at"], batch_size=1000)
+    CompactMovement.objects.filter(pk__in=[row[0] for row in rows]).delete()
+    return len(rows)
+
+
+class Command(BaseCommand):
+    help = (
+        "Move stored GPS fixes between the float (Movement) and compact (CompactMovement) "
+        "tables, oldest first. Each batch is moved in one transaction, so the command can be stopped "
+        "and rerun. Stop ingestion first, run it until done, then switch MOVEMENT_STORAGE."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--to", choices=["compact", "float"], required=True)
+        parser.add_argument("--batch-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        move = _move_to_compact if options["to"] == "compact" else _move_to_float
+        moved = 0
+        while True:
+            with transaction.atomic():
+                n = move(options["batch_size"])
+            if not n:
+                break
+            moved += n
+            self.stdout.write(f"moved {moved} row(s)")
+        self.stdout.write(f"Done: {moved} row(s) moved to {options['to']} storage")
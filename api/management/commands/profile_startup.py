@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api.startup import import_profile
+
+
+class Command(BaseCommand):
+    help = "Report import time per module (or package) for a fresh Django start, slowest first."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--limit", type=int, default=25)
+        parser.add_argument(
+            "--sort",
+            choices=("cumulative", "self"),
+            default="cumulative",
+            help="cumulative includes the module's own imports.",
+        )
+        parser.add_argument("--packages", action="store_true", help="Sum self time per top-level package.")
+
+    def handle(self, *args, **options):
+        try:
+            rows = import_profile()
+        except RuntimeError as e:
+            raise CommandError(str(e))
+        total_us = sum(r[1] for r in rows)
+
+        if options["packages"]:
+            per_package = {}
+            for name, self_us, _, _ in rows:
+                package = name.split(".")[0]
+                per_package[package] = per_package.get(package, 0) + self_us
+            self.stdout.write(f"{'self ms':>9}  package")
+            for package, self_us in sorted(per_package.items(), key=lambda kv: -kv[1])[:options["limit"]]:
+                self.stdout.write(f"{self_us / 1000:>9.1f}  {package}")
+        else:
+            key = 2 if options["sort"] == "cumulative" else 1
+            self.stdout.write(f"{'cum ms':>9} {'self ms':>9}  module")
+            for name, self_us, cumulative_us, _ in sorted(rows, key=lambda r: -r[key])[:options["limit"]]:
+                self.stdout.write(f"{cumulative_us / 1000:>9.1f} {self_us / 1000:>9.1f}  {name}")
+        self.stdout.write(f"{len(rows)} modules, {total_us / 1000:.1f} ms importing in total")
@@ -0,0 +1,52 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.models import Room
+from api.provisioning import parse_users, provision
+
+
+class Command(BaseCommand):
+    help = "Create attendee accounts from a CSV or JSON file and add them to a room."
+
+    def add_arguments(self, parser):
+        parser.add_argument("room_id")
+        parser.add_argument("path", help="CSV with a header row (username,email,password,first_name) or JSON list.")
+        parser.add_argument("--format", choices=["csv", "json"], default=None, help="Defaults to the file extension.")
+        parser.add_argument("--chunk-size", type=int, default=1000)
+        parser.add_argument("--workers", type=int, default=None, help="Password hashing processes (default: PROVISION_HASH_WORKERS).")
+        parser.add_argument("--dry-run", action="store_true", help="Validate only.")
+
+    def handle(self, *args, **options):
+        try:
+            room = Room.objects.get(id=options["room_id"])
+        except Room.DoesNotExist:
+            raise CommandError("room not found")
+        path = Path(options["path"])
+        fmt = options["format"] or ("json" if path.suffix.lower() == ".json" else "csv")
+        try:
+            users = parse_users(path.read_bytes(), fmt)
+        except (OSError, ValueError, UnicodeDecodeError) as e:
+            raise CommandError(f"could not read users: {e}")
+
+        report = provision(
+            room,
+            users,
+            chunk_size=options["chunk_size"],
+            workers=options["workers"],
+            dry_run=options["dry_run"],
+        )
+        for error in report["errors"][:50]:
+            self.stderr.write(f"row {error['row']}: {error['errors']}")
+        if len(report["errors"]) > 50:
+            self.stderr.write(f"... {len(report['errors']) - 50} more invalid rows")
+        self.stdout.write(
+            f"{report['received']} rows, {report['valid']} valid, {report['created']} created "
+            f"in {report['seconds']}s"
+        )
+        if report["created"]:
+            self.stdout.write(
+                f"throughput {report['users_per_second']} users/s "
+                f"(validate {report['validate_seconds']}s, hash {report['hash_seconds']}s, "
+                f"insert {report['insert_seconds']}s)"
+            )
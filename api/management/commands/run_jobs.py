@@ -0,0 +1,65 @@
+import os
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+
+from api import jobs
+
+
+def _run_in_thread(job):
+    try:
+        jobs.run(job)
+    finally:
+        connection.close()
+
+
+class Command(BaseCommand):
+    help = "Run queued background jobs (traffic predictions, profile builds)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=settings.JOBS_WORKER_CONCURRENCY,
+            help="Jobs this worker runs at once.",
+        )
+        parser.add_argument("--poll", type=float, default=1.0, help="Seconds between queue polls when idle.")
+        parser.add_argument("--once", action="store_true", help="Exit once the queue is drained.")
+
+    def handle(self, *args, **options):
+        worker = f"{socket.gethostname()}:{os.getpid()}"
+        concurrency = max(1, options["concurrency"])
+        in_flight = {}  # job id -> future
+        last_housekeeping = 0.0
+        self.stdout.write(f"Job worker {worker} started (concurrency {concurrency})")
+
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            while True:
+                close_old_connections()
+                for job_id, future in list(in_flight.items()):
+                    if future.done():
+                        del in_flight[job_id]
+                jobs.heartbeat(list(in_flight), worker)
+
+                if time.monotonic() - last_housekeeping > 60:
+                    requeued, failed = jobs.recover_stale()
+                    purged = jobs.purge_expired()
+                    if requeued or failed or purged:
+                        self.stdout.write(f"Recovered {requeued}, failed {failed}, purged {purged} job(s)")
+                    last_housekeeping = time.monotonic()
+
+                claimed = None
+                if len(in_flight) < concurrency:
+                    claimed = jobs.claim_next(worker)
+                    if claimed:
+                        self.stdout.write(f"Running job {claimed.id} ({claimed.kind})")
+                        in_flight[claimed.id] = pool.submit(_run_in_thread, claimed)
+
+                if options["once"] and not claimed and not in_flight:
+                    return
+                if not claimed:
+                    time.sleep(options["poll"])
@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.segmentation import SegmentationConfigError, run_segmentation
+
+
+class Command(BaseCommand):
+    help = "Split newly stored fixes into trips and stops and update room travel totals."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=5000, help="Fixes read per transaction (by pk range).")
+        parser.add_argument("--rebuild", action="store_true", help="Drop trips, stops and totals and start over.")
+        parser.add_argument(
+            "--every",
+            type=int,
+            default=0,
+            help="Keep running and segment new fixes every N seconds.",
+        )
+
+    def handle(self, *args, **options):
+        rebuild = options["rebuild"]
+        while True:
+            try:
+                report = run_segmentation(batch_size=options["batch_size"], rebuild=rebuild)
+            except SegmentationConfigError as e:
+                raise CommandError(f"{e} (run with --rebuild)")
+            rebuild = False
+            self.stdout.write(
+                f"Segmented {report['fixes']} fix(es): {report['trips']} trip(s), {report['stops']} stop(s) closed"
+            )
+            if not options["every"]:
+                return
+            time.sleep(options["every"])
@@ -0,0 +1,168 @@
+"""
+Meeting-point suggestions from members' latest positions.
+
+Positions come from the per-room live index (api/nearby.py), never from
+Movement. They are projected to metres on a plane around their mean
+latitude, which is accurate to well under a metre over the few kilometres
+a field team spans.
+
+- objective "total": the geometric median, which minimises the sum of
+  distances. Weiszfeld iterations, each one vectorised over all members.
+- objective "max": the centre of the minimum enclosing circle, which
+  minimises the largest distance. The exact circle is solved on a small
+  core set, namely the extreme members in MINIMAX_DIRECTIONS directions.
+  Any member left outside is added and the circle re-solved, which
+  usually takes one or two rounds.
+
+With candidates, the candidate with the best objective is suggested and
+the unconstrained optimum is reported next to it.
+"""
+import math
+import random
+
+import numpy as np
+
+from .traffic import METERS_PER_DEG_LAT
+
+OBJECTIVES = ("total", "max")
+WEISZFELD_MAX_ITERATIONS = 500
+WEISZFELD_TOLERANCE_M = 0.05
+MINIMAX_DIRECTIONS = 32
+
+
+class Plane:
+    """Equirectangular projection to metres around a reference latitude."""
+
+    def __init__(self, lat0):
+        self.ky = METERS_PER_DEG_LAT
+        self.kx = METERS_PER_DEG_LAT * math.cos(math.radians(lat0))
+
+    def to_xy(self, lats, lngs):
+        return np.column_stack((np.asarray(lngs, dtype=float) * self.kx, np.asarray(lats, dtype=float) * self.ky))
+
+    def to_latlng(self, point):
+        return float(point[1] / self.ky), float(point[0] / self.kx)
+
+
+def _distances(xy, point):
+    return np.hypot(xy[:, 0] - point[0], xy[:, 1] - point[1])
+
+
+def geometric_median(xy, tol=WEISZFELD_TOLERANCE_M, max_iterations=WEISZFELD_MAX_ITERATIONS):
+    """Weiszfeld's algorithm from the centroid. Returns (point, iterations)."""
+    point = xy.mean(axis=0)
+    for iteration in range(1, max_iterations + 1):
+        d = _distances(xy, point)
+        # A member standing on the estimate would divide by zero; a tiny floor
+        # keeps the step defined and only nudges the result by millimetres
+        w = 1.0 / np.maximum(d, 1e-6)
+        new = (xy * w[:, None]).sum(axis=0) / w.sum()
+        step = math.hypot(*(new - point))
+        point = new
+        if step < tol:
+            break
+    return point, iteration
+
+
+def _circle_two(a, b):
+    center = (a + b) / 2
+    return center, math.hypot(*(a - center))
+
+
+def _circle_three(a, b, c):
+    bx, by = b - a
+    cx, cy = c - a
+    d = 2 * (bx * cy - by * cx)
+    if abs(d) < 1e-12:
+        # Collinear: the widest pair spans all three
+        return max((_circle_two(p, q) for p, q in ((a, b), (a, c), (b, c))), key=lambda circle: circle[1])
+    b2, c2 = bx * bx + by * by, cx * cx + cy * cy
+    center = a + np.array([(cy * b2 - by * c2) / d, (bx * c2 - cx * b2) / d])
+    return center, math.hypot(*(a - center))
+
+
+def _enclosing_circle(points):
+    """Exact minimum enclosing circle of a small point list (Welzl, iterative)."""
+    points = list(points)
+    random.Random(0).shuffle(points)
+    eps = 1e-7
+
+    def outside(p, circle):
+        return math.hypot(*(p - circle[0])) > circle[1] + eps
+
+    circle = (points[0], 0.0)
+    for i, p in enumerate(points):
+        if not outside(p, circle):
+            continue
+        circle = (p, 0.0)
+        for j in range(i):
+            q = points[j]
+            if not outside(q, circle):
+                continue
+            circle = _circle_two(p, q)
+            for k in range(j):
+                if outside(points[k], circle):
+                    circle = _circle_three(p, q, points[k])
+    return circle
+
+
+def minimax_center(xy):
+    """Centre of the minimum enclosing circle of xy. Returns (point, rounds)."""
+    angles = np.linspace(0, 2 * np.pi, MINIMAX_DIRECTIONS, endpoint=False)
+    directions = np.column_stack((np.cos(angles), np.sin(angles)))
+    core = set(np.argmax(xy @ directions.T, axis=0).tolist())
+    for rounds in range(1, len(xy) + 1):
+        center, radius = _enclosing_circle([xy[i] for i in core])
+        d = _distances(xy, center)
+        farthest = int(np.argmax(d))
+        if d[farthest] <= radius + 1e-6:
+            break
+        core.add(farthest)
+    return center, rounds
+
+
+def _score(d):
+    return {
+        "total_distance_m": round(float(d.sum()), 1),
+        "mean_distance_m": round(float(d.mean()), 1),
+        "max_distance_m": round(float(d.max()), 1),
+    }
+
+
+def suggest(positions, objective="total", candidates=None):
+    """
+    Best meeting point for positions ([(lat, lng)], at least one).
+
+    candidates, if given, is a list of dicts with lat and lng (anything else
+    is passed through). Returns a dict with the suggested lat/lng and its
+    distance figures, plus "optimum" and "candidate" when snapping.
+    """
+    if objective not in OBJECTIVES:
+        raise ValueError(f"objective must be one of: {', '.join(OBJECTIVES)}")
+    lats, lngs = zip(*positions)
+    plane = Plane(sum(lats) / len(lats))
+    xy = plane.to_xy(lats, lngs)
+
+    if objective == "total":
+        point, iterations = geometric_median(xy)
+    else:
+        point, iterations = minimax_center(xy)
+    lat, lng = plane.to_latlng(point)
+    optimum = {"lat": round(lat, 7), "lng": round(lng, 7), **_score(_distances(xy, point))}
+    result = {"objective": objective, "members": len(xy), "iterations": iterations}
+    if not candidates:
+        return {**result, **optimum}
+
+    cxy = plane.to_xy([c["lat"] for c in candidates], [c["lng"] for c in candidates])
+    # candidates x members distance matrix
+    d = np.hypot(cxy[:, None, 0] - xy[None, :, 0], cxy[:, None, 1] - xy[None, :, 1])
+    cost = d.sum(axis=1) if objective == "total" else d.max(axis=1)
+    best = int(np.argmin(cost))
+    return {
+        **result,
+        "lat": candidates[best]["lat"],
+        "lng": candidates[best]["lng"],
+        **_score(d[best]),
+        "candidate": candidates[best],
+        "optimum": optimum,
+    }
@@ -0,0 +1,39 @@
+# Generated by Django 4.2.7 on 2026-10-19 01:16
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_alter_room_id'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrafficProfileState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cell_deg', models.FloatField()),
+                ('first_day', models.DateField(blank=True, null=True)),
+                ('closed_through', models.DateField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='TrafficProfile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cell_x', models.IntegerField()),
+                ('cell_y', models.IntegerField()),
+                ('hour_of_week', models.PositiveSmallIntegerField()),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('room', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='traffic_profiles', to='api.room')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['cell_x', 'cell_y'], name='api_traffic_cell_x_37d687_idx')],
+                'unique_together': {('room', 'cell_x', 'cell_y', 'hour_of_week')},
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-19 01:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_jobs'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='movement',
+            index=models.Index(fields=['created_at'], name='api_movemen_created_acac10_idx'),
+        ),
+    ]
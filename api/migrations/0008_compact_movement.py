@@ -0,0 +1,30 @@
+# Generated by Django 4.2.7 on 2026-10-19 01:22
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('api', '0007_movement_created_at_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CompactMovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('lat_e7', models.IntegerField()),
+                ('lng_e7', models.IntegerField()),
+                ('ts', models.IntegerField()),
+                ('room', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='compact_movements', to='api.room')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='compact_movements', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['room', 'ts'], name='api_compact_room_id_421e54_idx'), models.Index(fields=['user', 'ts'], name='api_compact_user_id_945550_idx'), models.Index(fields=['ts'], name='api_compact_ts_b15e4f_idx')],
+            },
+        ),
+    ]
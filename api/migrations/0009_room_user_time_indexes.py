@@ -0,0 +1,21 @@
+# Generated by Django 4.2.7 on 2026-10-19 01:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_compact_movement'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='compactmovement',
+            index=models.Index(fields=['room', 'user', 'ts'], name='api_compact_room_id_8d2f3d_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movement',
+            index=models.Index(fields=['room', 'user', 'created_at'], name='api_movemen_room_id_03d594_idx'),
+        ),
+    ]
@@ -0,0 +1,92 @@
+# Generated by Django 4.2.7 on 2026-10-19 01:25
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('api', '0009_room_user_time_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SegmentationCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('storage', models.CharField(max_length=10)),
+                ('last_pk', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Trip',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('started_at', models.DateTimeField()),
+                ('ended_at', models.DateTimeField()),
+                ('start_lat', models.FloatField()),
+                ('start_lng', models.FloatField()),
+                ('end_lat', models.FloatField()),
+                ('end_lng', models.FloatField()),
+                ('distance_m', models.FloatField()),
+                ('duration_s', models.FloatField()),
+                ('avg_speed_mps', models.FloatField()),
+                ('points', models.PositiveIntegerField()),
+                ('room', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='trips', to='api.room')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='trips', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['room', 'user', 'started_at'], name='api_trip_room_id_934321_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='Stop',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('started_at', models.DateTimeField()),
+                ('ended_at', models.DateTimeField()),
+                ('lat', models.FloatField()),
+                ('lng', models.FloatField()),
+                ('duration_s', models.FloatField()),
+                ('points', models.PositiveIntegerField()),
+                ('room', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stops', to='api.room')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stops', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['room', 'user', 'started_at'], name='api_stop_room_id_9e059e_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='SegmentationState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('state', models.JSONField(default=dict)),
+                ('room', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='segmentation_states', to='api.room')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='segmentation_states', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('user', 'room')},
+            },
+        ),
+        migrations.CreateModel(
+            name='RoomTravelStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('distance_m', models.FloatField(default=0)),
+                ('moving_s', models.FloatField(default=0)),
+                ('trips', models.PositiveIntegerField(default=0)),
+                ('stops', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('room', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='travel_stats', to='api.room')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='travel_stats', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['room', 'distance_m'], name='api_roomtra_room_id_0808bd_idx')],
+                'unique_together': {('user', 'room')},
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.7 on 2026-10-19 01:35
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_trips_and_stops'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RoomActivity',
+            fields=[
+                ('room', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='activity', serialize=False, to='api.room')),
+                ('points_total', models.BigIntegerField(default=0)),
+                ('points_last_minute', models.PositiveIntegerField(default=0)),
+                ('active_members', models.PositiveIntegerField(default=0)),
+                ('min_lat', models.FloatField(blank=True, null=True)),
+                ('min_lng', models.FloatField(blank=True, null=True)),
+                ('max_lat', models.FloatField(blank=True, null=True)),
+                ('max_lng', models.FloatField(blank=True, null=True)),
+                ('last_update', models.DateTimeField(blank=True, null=True)),
+                ('flushed_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'room activity',
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.7 on 2026-10-19 01:44
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_room_activity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MovementArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('rows', models.PositiveIntegerField()),
+                ('min_lat', models.FloatField()),
+                ('max_lat', models.FloatField()),
+                ('min_lng', models.FloatField()),
+                ('max_lng', models.FloatField()),
+                ('archived_at', models.DateTimeField(auto_now=True)),
+                ('room', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='movement_archives', to='api.room')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['day'], name='api_movemen_day_e37e9a_idx')],
+                'unique_together': {('room', 'day')},
+            },
+        ),
+    ]
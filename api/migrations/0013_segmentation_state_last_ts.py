@@ -0,0 +1,31 @@
+# Generated by Django 4.2.7 on 2026-10-19 02:20
+
+from django.db import migrations, models
+
+
+def copy_last_ts(apps, schema_editor):
+    SegmentationState = apps.get_model('api', 'SegmentationState')
+    for row in SegmentationState.objects.iterator():
+        if row.state.get('last'):
+            row.last_ts = row.state['last'][2]
+            row.save(update_fields=['last_ts'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_movement_archive'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='segmentationstate',
+            name='last_ts',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='segmentationstate',
+            index=models.Index(fields=['last_ts'], name='api_segment_last_ts_225fc5_idx'),
+        ),
+        migrations.RunPython(copy_last_ts, migrations.RunPython.noop),
+    ]
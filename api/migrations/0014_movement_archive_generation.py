@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 09:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_segmentation_state_last_ts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='movementarchive',
+            name='generation',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
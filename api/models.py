@@ -1,8 +1,14 @@
 from django.db import models
 from django.contrib.auth.models import User
+from datetime import datetime, timedelta, timezone as dt_timezone
 import secrets
 import string
 
+# CompactMovement encoding: coordinates in 1e-7 degrees (~1 cm) and whole
+# seconds since MOVEMENT_EPOCH, both fitting a signed 32-bit integer.
+COORD_SCALE = 10_000_000
+MOVEMENT_EPOCH = datetime(2020, 1, 1, tzinfo=dt_timezone.utc)
+
 class Room(models.Model):
     id = models.CharField(primary_key=True, max_length=8, editable=False)
     name = models.CharField(max_length=150)
@@ -48,8 +54,58 @@ class Movement(models.Model):
         indexes = [
             models.Index(fields=["room", "created_at"]),
             models.Index(fields=["user", "created_at"]),
+            models.Index(fields=["created_at"]),
+            models.Index(fields=["room", "user", "created_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} @ ({self.latitude:.5f},{self.longitude:.5f}) in {self.room_id}"
+
+
+class CompactMovement(models.Model):
+    """
+    Space-saving form of Movement, written instead of it when
+    MOVEMENT_STORAGE = "compact". latitude/longitude/created_at properties
+    keep Movement's float and datetime API; query through api/movement_store.
+    """
+    user = models.ForeignKey(User, related_name="compact_movements", on_delete=models.CASCADE)
+    room = models.ForeignKey(Room, related_name="compact_movements", on_delete=models.CASCADE)
+    lat_e7 = models.IntegerField()
+    lng_e7 = models.IntegerField()
+    ts = models.IntegerField()  # seconds since MOVEMENT_EPOCH
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["room", "ts"]),
+            models.Index(fields=["user", "ts"]),
+            models.Index(fields=["ts"]),
+            models.Index(fields=["room", "user", "ts"]),
         ]
 
+    @property
+    def latitude(self):
+        return self.lat_e7 / COORD_SCALE
+
+    @latitude.setter
+    def latitude(self, value):
+        self.lat_e7 = round(value * COORD_SCALE)
+
+    @property
+    def longitude(self):
+        return self.lng_e7 / COORD_SCALE
+
+    @longitude.setter
+    def longitude(self, value):
+        self.lng_e7 = round(value * COORD_SCALE)
+
+    @property
+    def created_at(self):
+        return MOVEMENT_EPOCH + timedelta(seconds=self.ts)
+
+    @created_at.setter
+    def created_at(self, value):
+        self.ts = int((value - MOVEMENT_EPOCH).total_seconds())
+
     def __str__(self):
         return f"{self.user.username} @ ({self.latitude:.5f},{self.longitude:.5f}) in {self.room_id}"
 
@@ -86,4 +142,232 @@ class MeetingPoint(models.Model):
         ordering = ["-created_at"]
 
     def __str__(self):
-        return f"Meeting at {self.place_name} (r{self.room_id}) by {self.created_by_id}"
\ No newline at end of file
+        return f"Meeting at {self.place_name} (r{self.room_id}) by {self.created_by_id}"
+
+class TrafficProfile(models.Model):
+    """
+    Movement count per room, spatial cell and hour of week, folded in one
+    closed (UTC) day at a time by the build_traffic_profiles command.
+    Cells are TRAFFIC_PROFILE_CELL_DEG degrees square; hour_of_week is
+    weekday * 24 + hour with Monday 00h as 0.
+    """
+    room = models.ForeignKey(Room, related_name="traffic_profiles", on_delete=models.CASCADE)
+    cell_x = models.IntegerField()
+    cell_y = models.IntegerField()
+    hour_of_week = models.PositiveSmallIntegerField()
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ("room", "cell_x", "cell_y", "hour_of_week")
+        indexes = [
+            models.Index(fields=["cell_x", "cell_y"]),
+        ]
+
+    def __str__(self):
+        return f"Profile r{self.room_id} cell ({self.cell_x},{self.cell_y}) h{self.hour_of_week}: {self.count}"
+
+
+class TrafficProfileState(models.Model):
+    """
+    Single-row progress marker for the profile builder: every day from
+    first_day through closed_through has been folded into TrafficProfile.
+    """
+    cell_deg = models.FloatField()
+    first_day = models.DateField(null=True, blank=True)
+    closed_through = models.DateField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Profiles through {self.closed_through} (cell {self.cell_deg} deg)"
+
+
+class Job(models.Model):
+    """
+    A unit of heavy work queued by an endpoint and run by the run_jobs worker.
+    """
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (QUEUED, "Queued"),
+        (RUNNING, "Running"),
+        (DONE, "Done"),
+        (FAILED, "Failed"),
+    ]
+
+    kind = models.CharField(max_length=50)
+    params = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    worker = models.CharField(max_length=100, blank=True)
+    created_by = models.ForeignKey(User, related_name="jobs", null=True, blank=True, on_delete=models.CASCADE)
+    created_at = models.DateTimeField(auto_now_add=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    expires_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "created_at"]),
+            models.Index(fields=["expires_at"]),
+        ]
+
+    def __str__(self):
+        return f"Job {self.id} {self.kind} [{self.status}]"
+
+
+class Trip(models.Model):
+    """
+    A stretch of travel between stops, derived from stored fixes by
+    api/segmentation.py.
+    """
+    user = models.ForeignKey(User, related_name="trips", on_delete=models.CASCADE)
+    room = models.ForeignKey(Room, related_name="trips", on_delete=models.CASCADE)
+    started_at = models.DateTimeField()
+    ended_at = models.DateTimeField()
+    start_lat = models.FloatField()
+    start_lng = models.FloatField()
+    end_lat = models.FloatField()
+    end_lng = models.FloatField()
+    distance_m = models.FloatField()
+    duration_s = models.FloatField()
+    avg_speed_mps = models.FloatField()
+    points = models.PositiveIntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["room", "user", "started_at"]),
+        ]
+
+    def __str__(self):
+        return f"Trip {self.user_id} in {self.room_id}: {self.distance_m:.0f}m in {self.duration_s:.0f}s"
+
+
+class Stop(models.Model):
+    """
+    A place a member stayed within SEGMENT_STOP_RADIUS_M for at least
+    SEGMENT_STOP_MIN_SECONDS.
+    """
+    user = models.ForeignKey(User, related_name="stops", on_delete=models.CASCADE)
+    room = models.ForeignKey(Room, related_name="stops", on_delete=models.CASCADE)
+    started_at = models.DateTimeField()
+    ended_at = models.DateTimeField()
+    lat = models.FloatField()
+    lng = models.FloatField()
+    duration_s = models.FloatField()
+    points = models.PositiveIntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["room", "user", "started_at"]),
+        ]
+
+    def __str__(self):
+        return f"Stop {self.user_id} in {self.room_id} @ ({self.lat:.5f},{self.lng:.5f}) {self.duration_s:.0f}s"
+
+
+class RoomTravelStats(models.Model):
+    """
+    Running per-member totals for a room's leaderboard, updated as trips
+    and stops are closed.
+    """
+    user = models.ForeignKey(User, related_name="travel_stats", on_delete=models.CASCADE)
+    room = models.ForeignKey(Room, related_name="travel_stats", on_delete=models.CASCADE)
+    distance_m = models.FloatField(default=0)
+    moving_s = models.FloatField(default=0)
+    trips = models.PositiveIntegerField(default=0)
+    stops = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ("user", "room")
+        indexes = [
+            models.Index(fields=["room", "distance_m"]),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} in {self.room_id}: {self.distance_m:.0f}m over {self.trips} trips"
+
+
+class SegmentationState(models.Model):
+    """
+    Open (not yet closed) trip/stop of one member in one room, so the
+    pipeline can resume mid-segment. last_ts copies the time of state's last
+    fix (Unix seconds) so idle members are found without reading every row.
+    """
+    user = models.ForeignKey(User, related_name="segmentation_states", on_delete=models.CASCADE)
+    room = models.ForeignKey(Room, related_name="segmentation_states", on_delete=models.CASCADE)
+    state = models.JSONField(default=dict)
+    last_ts = models.FloatField(null=True, blank=True)
+
+    class Meta:
+        unique_together = ("user", "room")
+        indexes = [
+            models.Index(fields=["last_ts"]),
+        ]
+
+
+class SegmentationCheckpoint(models.Model):
+    """
+    Single-row marker: fixes with a pk up to last_pk in the given storage
+    have been segmented.
+    """
+    storage = models.CharField(max_length=10)
+    last_pk = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Segmented {self.storage} through pk {self.last_pk}"
+
+
+class RoomActivity(models.Model):
+    """
+    Flushed copy of a room's live activity counters (api/activity.py keeps
+    the live values in the cache and writes them here periodically).
+    """
+    room = models.OneToOneField(Room, related_name="activity", on_delete=models.CASCADE, primary_key=True)
+    points_total = models.BigIntegerField(default=0)
+    points_last_minute = models.PositiveIntegerField(default=0)
+    active_members = models.PositiveIntegerField(default=0)
+    min_lat = models.FloatField(null=True, blank=True)
+    min_lng = models.FloatField(null=True, blank=True)
+    max_lat = models.FloatField(null=True, blank=True)
+    max_lng = models.FloatField(null=True, blank=True)
+    last_update = models.DateTimeField(null=True, blank=True)
+    flushed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = "room activity"
+
+    def __str__(self):
+        return f"Activity {self.room_id}: {self.points_total} points"
+
+
+class MovementArchive(models.Model):
+    """
+    Index entry for one room's fixes of one UTC day, moved out of the
+    movement table into columnar files by api/archive.py. Merging late
+    fixes into the day writes a new generation of the files.
+    """
+    room = models.ForeignKey(Room, related_name="movement_archives", on_delete=models.CASCADE)
+    day = models.DateField()
+    generation = models.PositiveIntegerField(default=0)
+    rows = models.PositiveIntegerField()
+    min_lat = models.FloatField()
+    max_lat = models.FloatField()
+    min_lng = models.FloatField()
+    max_lng = models.FloatField()
+    archived_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ("room", "day")
+        indexes = [
+            models.Index(fields=["day"]),
+        ]
+
+    def __str__(self):
+        return f"Archive r{self.room_id} {self.day}: {self.rows} fixes"
@@ -0,0 +1,182 @@
+"""
+Single access point for stored GPS fixes.
+
+MOVEMENT_STORAGE selects where fixes live: "float" (Movement, the default)
+or "compact" (CompactMovement, scaled int32 coordinates and int32 seconds).
+Callers filter with Movement's field names (latitude__gte, created_at__lt,
+room_id, pk ranges, ...) and always get floats and aware datetimes back.
+"""
+import math
+from datetime import timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import ExtractHour, Floor
+from django.utils import timezone
+
+from .models import COORD_SCALE, MOVEMENT_EPOCH, CompactMovement, Membership, Movement
+
+
+def is_compact():
+    return settings.MOVEMENT_STORAGE == "compact"
+
+
+def active_model():
+    return CompactMovement if is_compact() else Movement
+
+
+def encode_coord(value):
+    return round(value * COORD_SCALE)
+
+
+def encode_ts(dt):
+    return (dt - MOVEMENT_EPOCH).total_seconds()
+
+
+def decode_ts(ts):
+    return MOVEMENT_EPOCH + timedelta(seconds=ts)
+
+
+def record(user_id, room_id, latitude, longitude):
+    if is_compact():
+        return CompactMovement.objects.create(
+            user_id=user_id,
+            room_id=room_id,
+            lat_e7=encode_coord(latitude),
+            lng_e7=encode_coord(longitude),
+            ts=int(encode_ts(timezone.now())),
+        )
+    return Movement.objects.create(user_id=user_id, room_id=room_id, latitude=latitude, longitude=longitude)
+
+
+# Bounds are rounded inwards so the integer filter keeps exactly the fixes
+# the float filter would.
+_COMPACT_LOOKUPS = {
+    "latitude": ("lat_e7", lambda v, op: _round_bound(v * COORD_SCALE, op)),
+    "longitude": ("lng_e7", lambda v, op: _round_bound(v * COORD_SCALE, op)),
+    "created_at": ("ts", lambda v, op: _round_bound(encode_ts(v), op)),
+}
+
+
+def _round_bound(value, op):
+    if op in ("gte", "gt"):
+        return math.ceil(value) if op == "gte" else math.floor(value)
+    if op in ("lte", "lt"):
+        return math.floor(value) if op == "lte" else math.ceil(value)
+    return round(value)
+
+
+def compact_filters(filters):
+    """Translate Movement-style filter kwargs to CompactMovement columns."""
+    translated = {}
+    for key, value in filters.items():
+        field, _, op = key.partition("__")
+        if field in _COMPACT_LOOKUPS:
+            column, convert = _COMPACT_LOOKUPS[field]
+            translated[f"{column}__{op}" if op else column] = convert(value, op or "exact")
+        else:
+            translated[key] = value
+    return translated
+
+
+def filter_movements(**filters):
+    """Queryset on the active store; filters use Movement's field names."""
+    if is_compact():
+        return CompactMovement.objects.filter(**compact_filters(filters))
+    return Movement.objects.filter(**filters)
+
+
+def points(filters, extra=(), order_by=()):
+    """
+    Iterate (latitude, longitude, created_at, *extra) for matching fixes.
+    extra names plain columns shared by both stores, e.g. "user_id";
+    order_by takes "pk"/"created_at" (optionally prefixed with "-").
+    """
+    if not is_compact():
+        yield from Movement.objects.filter(**filters).order_by(*order_by).values_list(
+            "latitude", "longitude", "created_at", *extra
+        ).iterator()
+        return
+    order_by = [f.replace("created_at", "ts") for f in order_by]
+    rows = (
+        CompactMovement.objects.filter(**compact_filters(filters))
+        .order_by(*order_by)
+        .values_list("lat_e7", "lng_e7", "ts", *extra)
+    )
+    for lat_e7, lng_e7, ts, *rest in rows.iterator():
+        yield (lat_e7 / COORD_SCALE, lng_e7 / COORD_SCALE, decode_ts(ts), *rest)
+
+
+def first_created_at():
+    if is_compact():
+        ts = CompactMovement.objects.order_by("ts").values_list("ts", flat=True).first()
+        return None if ts is None else decode_ts(ts)
+    return Movement.objects.order_by("created_at").values_list("created_at", flat=True).first()
+
+
+def first_pk_since(since):
+    """Lowest pk created at or after since (ids grow with time)."""
+    if is_compact():
+        qs = CompactMovement.objects.filter(ts__gte=math.ceil(encode_ts(since))).order_by("ts")
+    else:
+        qs = Movement.objects.filter(created_at__gte=since).order_by("created_at")
+    return qs.values_list("pk", flat=True).first()
+
+
+def last_pk():
+    return active_model().objects.order_by("-pk").values_list("pk", flat=True).first()
+
+
+def cell_hour_counts(start, end, cell_deg):
+    """
+    Fix counts grouped by room, cell (floor of degrees / cell_deg) and UTC
+    hour for start <= created_at < end. Yields dicts with room_id, cx, cy,
+    hour and n. start must be midnight UTC.
+    """
+    if is_compact():
+        start_ts, end_ts = math.ceil(encode_ts(start)), math.ceil(encode_ts(end))
+        cell_e7 = cell_deg * COORD_SCALE
+        # start is midnight, so the hour of day is integer arithmetic on ts
+        qs = CompactMovement.objects.filter(ts__gte=start_ts, ts__lt=end_ts).annotate(
+            cx=Floor(F("lng_e7") / cell_e7),
+            cy=Floor(F("lat_e7") / cell_e7),
+            hour=(F("ts") - start_ts) / 3600,
+        )
+    else:
+        qs = Movement.objects.filter(created_at__gte=start, created_at__lt=end).annotate(
+            cx=Floor(F("longitude") / cell_deg),
+            cy=Floor(F("latitude") / cell_deg),
+            hour=ExtractHour("created_at", tzinfo=dt_timezone.utc),
+        )
+    return qs.values("room_id", "cx", "cy", "hour").annotate(n=Count("id")).order_by()
+
+
+def latest_positions(room_id, at=None, archived=True):
+    """
+    Each member's last fix in the room at or before at (default: now), as
+    {user_id: (latitude, longitude, created_at)}.
+
+    One query: a correlated subquery picks every member's newest fix id via
+    the (room, user, time) index -- the portable form of a lateral join --
+    so the cost follows the member count, not the length of the history.
+    With archived, members without such a fix here are looked up in the
+    movement archive (api/archive.py), which costs one more query, plus a
+    membership query when the room has archived days.
+    """
+    model = active_model()
+    time_field = "ts" if is_compact() else "created_at"
+    newest = model.objects.filter(room_id=room_id, user_id=OuterRef("user_id"))
+    if at is not None:
+        bound = {"created_at__lte": at}
+        newest = newest.filter(**(compact_filters(bound) if is_compact() else bound))
+    newest = newest.order_by(f"-{time_field}", "-pk").values("pk")[:1]
+    last_ids = Membership.objects.filter(room_id=room_id).annotate(last_id=Subquery(newest)).values("last_id")
+    positions = {
+        user_id: (lat, lng, created_at)
+        for lat, lng, created_at, user_id in points({"pk__in": last_ids}, extra=("user_id",))
+    }
+    if archived:
+        from . import archive
+
+        positions.update(archive.latest_positions(room_id, at, known=positions))
+    return positions
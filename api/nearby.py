@@ -0,0 +1,281 @@
+"""
+"Who is near me": k-nearest and radius queries over members' latest fixes.
+
+Each worker keeps, per room it has been asked about, a uniform grid of
+NEARBY_CELL_M cells over members' latest positions (projected to metres
+around the room's first fix). The first query loads every member's latest
+fix. Later queries apply only the fixes stored since the last pk seen (the
+watermark), at most once every NEARBY_SYNC_SECONDS, so most queries touch
+no database at all.
+
+k-nearest walks square rings of cells outwards from the query point, clipped
+to the occupied cells' bounds, and stops once the k-th best distance is
+closer than the next ring can be. A point far outside the room would need
+rings of mostly empty cells. Once the walk has visited more cells than there
+are members, it switches to a linear scan of the members.
+Fixes older than NEARBY_MAX_AGE_SECONDS are not reported. Members are
+pruned once their fix is that old, with a scan at most once every
+PRUNE_EVERY_SECONDS.
+
+The same index carries the zoom-level clusters (api/clustering.py). These
+are built on the first cluster query and then kept current by update().
+"""
+import heapq
+import math
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.contrib.auth.models import User
+
+from . import movement_store
+from .clustering import ZoomGrid
+from .models import Membership
+from .traffic import METERS_PER_DEG_LAT
+
+PRUNE_EVERY_SECONDS = 60
+
+
+class RoomIndex:
+    def __init__(self, room_id, cell_m):
+        self.room_id = room_id
+        self.cell_m = cell_m
+        self.storage = settings.MOVEMENT_STORAGE
+        self.lock = threading.Lock()
+        self.lat0 = None
+        self.m_per_deg_lng = None
+        self.cells = {}  # (cx, cy) -> {user_id}
+        self.members = {}  # user_id -> (x, y, lat, lng, ts, cell)
+        self.usernames = {}
+        self.bounds = None  # [min_cx, min_cy, max_cx, max_cy]
+        self.zooms = None
+        self.watermark = None
+        self.synced_at = 0.0
+        self.pruned_at = 0.0
+
+    def __len__(self):
+        return len(self.members)
+
+    def _project(self, lat, lng):
+        if self.lat0 is None:
+            self.lat0 = lat
+            self.m_per_deg_lng = METERS_PER_DEG_LAT * max(0.01, math.cos(math.radians(lat)))
+        return lng * self.m_per_deg_lng, lat * METERS_PER_DEG_LAT
+
+    def _cell(self, x, y):
+        return math.floor(x / self.cell_m), math.floor(y / self.cell_m)
+
+    def update(self, user_id, lat, lng, ts):
+        """Move user_id to (lat, lng) unless the index already holds a newer fix."""
+        old = self.members.get(user_id)
+        if old and old[4] > ts:
+            return
+        x, y = self._project(lat, lng)
+        cell = self._cell(x, y)
+        if old and old[5] != cell:
+            bucket = self.cells[old[5]]
+            bucket.discard(user_id)
+            if not bucket:
+                del self.cells[old[5]]
+        self.cells.setdefault(cell, set()).add(user_id)
+        self.members[user_id] = (x, y, lat, lng, ts, cell)
+        if self.zooms is not None:
+            self.zooms.move(user_id, lat, lng)
+        if self.bounds is None:
+            self.bounds = [cell[0], cell[1], cell[0], cell[1]]
+        else:
+            b = self.bounds
+            b[0], b[1] = min(b[0], cell[0]), min(b[1], cell[1])
+            b[2], b[3] = max(b[2], cell[0]), max(b[3], cell[1])
+
+    def remove(self, user_id):
+        old = self.members.pop(user_id, None)
+        if old is None:
+            return
+        bucket = self.cells[old[5]]
+        bucket.discard(user_id)
+        if not bucket:
+            del self.cells[old[5]]
+        if self.zooms is not None:
+            self.zooms.remove(user_id)
+
+    def prune(self, min_ts):
+        """Drop members whose latest fix is older than min_ts."""
+        for user_id in [u for u, m in self.members.items() if m[4] < min_ts]:
+            self.remove(user_id)
+
+    def _ring(self, cx, cy, r):
+        """Cells of the square ring r around (cx, cy) that lie inside the bounds."""
+        x0, y0, x1, y1 = self.bounds
+        if r == 0:
+            if x0 <= cx <= x1 and y0 <= cy <= y1:
+                yield cx, cy
+            return
+        for y in (cy - r, cy + r):
+            if y0 <= y <= y1:
+                for x in range(max(cx - r, x0), min(cx + r, x1) + 1):
+                    yield x, y
+        for x in (cx - r, cx + r):
+            if x0 <= x <= x1:
+                for y in range(max(cy - r + 1, y0), min(cy + r - 1, y1) + 1):
+                    yield x, y
+
+    def nearest(self, lat, lng, k, min_ts=0.0, exclude=None):
+        """Up to k (distance_m, user_id) pairs, closest first."""
+        with self.lock:
+            return self._nearest(lat, lng, k, min_ts, exclude)
+
+    def _scan(self, x, y, k, min_ts, exclude):
+        return heapq.nsmallest(
+            k,
+            (
+                (math.hypot(m[0] - x, m[1] - y), user_id)
+                for user_id, m in self.members.items()
+                if m[4] >= min_ts and user_id != exclude
+            ),
+        )
+
+    def _nearest(self, lat, lng, k, min_ts, exclude):
+        if not self.members or k <= 0:
+            return []
+        x, y = self._project(lat, lng)
+        cx, cy = self._cell(x, y)
+        b = self.bounds
+        # Rings closer than the bounds are empty; rings past them add nothing
+        min_r = max(b[0] - cx, cx - b[2], b[1] - cy, cy - b[3], 0)
+        max_r = max(cx - b[0], b[2] - cx, cy - b[1], b[3] - cy, 0)
+        budget = len(self.members)
+        visited = 0
+        best = []  # max-heap of (-distance, user_id)
+        for r in range(min_r, max_r + 1):
+            for cell in self._ring(cx, cy, r):
+                visited += 1
+                if visited > budget:
+                    return self._scan(x, y, k, min_ts, exclude)
+                for user_id in self.cells.get(cell, ()):
+                    mx, my, _, _, ts, _ = self.members[user_id]
+                    if ts < min_ts or user_id == exclude:
+                        continue
+                    d = math.hypot(mx - x, my - y)
+                    if len(best) < k:
+                        heapq.heappush(best, (-d, user_id))
+                    elif d < -best[0][0]:
+                        heapq.heapreplace(best, (-d, user_id))
+            # Anything in a further ring is at least r cells away
+            if len(best) == k and -best[0][0] <= r * self.cell_m:
+                break
+        return sorted((-d, user_id) for d, user_id in best)
+
+    def within(self, lat, lng, radius_m, min_ts=0.0, exclude=None):
+        """(distance_m, user_id) pairs within radius_m, closest first."""
+        with self.lock:
+            return self._within(lat, lng, radius_m, min_ts, exclude)
+
+    def _within(self, lat, lng, radius_m, min_ts, exclude):
+        if not self.members:
+            return []
+        x, y = self._project(lat, lng)
+        (x0, y0), (x1, y1) = self._cell(x - radius_m, y - radius_m), self._cell(x + radius_m, y + radius_m)
+        b = self.bounds
+        x0, y0, x1, y1 = max(x0, b[0]), max(y0, b[1]), min(x1, b[2]), min(y1, b[3])
+        found = []
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                for user_id in self.cells.get((cx, cy), ()):
+                    mx, my, _, _, ts, _ = self.members[user_id]
+                    if ts < min_ts or user_id == exclude:
+                        continue
+                    d = math.hypot(mx - x, my - y)
+                    if d <= radius_m:
+                        found.append((d, user_id))
+        found.sort()
+        return found
+
+    def positions(self, min_ts=0.0):
+        """(lat, lng) of every member whose fix is not older than min_ts."""
+        with self.lock:
+            return [(m[2], m[3]) for m in self.members.values() if m[4] >= min_ts]
+
+    def clusters(self, zoom, bbox=None):
+        """ZoomGrid.query() over the members; the grid is built on first use."""
+        with self.lock:
+            if self.zooms is None:
+                self.zooms = ZoomGrid()
+                for user_id, m in self.members.items():
+                    self.zooms.move(user_id, m[2], m[3])
+            return self.zooms.query(zoom, bbox)
+
+    def sync(self, now=None):
+        """Apply fixes stored since the watermark (all latest fixes on first use)."""
+        now = time.time() if now is None else now
+        if now - self.synced_at < settings.NEARBY_SYNC_SECONDS:
+            return
+        with self.lock:
+            if now - self.synced_at < settings.NEARBY_SYNC_SECONDS:
+                return
+            if self.watermark is None:
+                # Read the watermark first: fixes racing the load are re-applied, never missed
+                watermark = movement_store.last_pk() or 0
+                # Archived fixes are too old to report
+                latest = movement_store.latest_positions(self.room_id, archived=False)
+                for user_id, (lat, lng, created_at) in latest.items():
+                    self.update(user_id, lat, lng, created_at.timestamp())
+                self.usernames.update(
+                    Membership.objects.filter(room_id=self.room_id).values_list("user_id", "user__username")
+                )
+                self.watermark = watermark
+            else:
+                rows = movement_store.points(
+                    {"room_id": self.room_id, "pk__gt": self.watermark},
+                    extra=("pk", "user_id"),
+                    order_by=("pk",),
+                )
+                for lat, lng, created_at, pk, user_id in rows:
+                    self.update(user_id, lat, lng, created_at.timestamp())
+                    self.watermark = pk
+                missing = [u for u in self.members if u not in self.usernames]
+                if missing:
+                    self.usernames.update(User.objects.filter(id__in=missing).values_list("id", "username"))
+            if now - self.pruned_at >= PRUNE_EVERY_SECONDS:
+                self.prune(now - settings.NEARBY_MAX_AGE_SECONDS)
+                self.pruned_at = now
+            self.synced_at = now
+
+    def describe(self, hits):
+        """Response rows for (distance_m, user_id) pairs (distance None to leave it out)."""
+        rows = []
+        for d, user_id in hits:
+            m = self.members.get(user_id)
+            if m is None:
+                # Pruned since the query
+                continue
+            row = {
+                "user_id": user_id,
+                "username": self.usernames.get(user_id),
+                "lat": m[2],
+                "lng": m[3],
+                "recorded_at": datetime.fromtimestamp(m[4], tz=dt_timezone.utc),
+            }
+            if d is not None:
+                row["distance_m"] = round(d, 1)
+            rows.append(row)
+        return rows
+
+
+_indexes = OrderedDict()  # room_id -> RoomIndex, least recently used first
+_indexes_lock = threading.Lock()
+
+
+def room_index(room_id):
+    """This worker's synced index for room_id."""
+    with _indexes_lock:
+        index = _indexes.get(room_id)
+        if index is None or index.storage != settings.MOVEMENT_STORAGE:
+            index = _indexes[room_id] = RoomIndex(room_id, settings.NEARBY_CELL_M)
+        _indexes.move_to_end(room_id)
+        while len(_indexes) > settings.NEARBY_MAX_ROOMS:
+            _indexes.popitem(last=False)
+    index.sync()
+    return index
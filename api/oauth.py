@@ -0,0 +1,88 @@
+"""
+Google access-token verification for google_auth.
+
+Userinfo calls go through one keep-alive requests.Session per process with
+strict timeouts, and verified tokens are cached for a short TTL under a hash
+of the token, so repeat logins skip the round trip to Google.
+"""
+import hashlib
+import re
+import threading
+
+import requests
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from requests.adapters import HTTPAdapter
+
+_session = None
+_session_lock = threading.Lock()
+
+
+class GoogleTokenInvalid(Exception):
+    pass
+
+
+class GoogleUnavailable(Exception):
+    pass
+
+
+def get_session():
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=settings.GOOGLE_HTTP_POOL_SIZE, max_retries=0)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+    return _session
+
+
+def _cache_key(access_token):
+    return "google-userinfo:" + hashlib.sha256(access_token.encode()).hexdigest()
+
+
+def fetch_userinfo(access_token):
+    """
+    Return Google's userinfo dict for a valid access token. Raises
+    GoogleTokenInvalid if Google rejects it, GoogleUnavailable on network
+    errors or timeouts.
+    """
+    key = _cache_key(access_token)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+    try:
+        response = get_session().get(
+            settings.GOOGLE_USERINFO_URL,
+            headers={"Authorization": f"Bearer {access_token}"},
+            timeout=(settings.GOOGLE_CONNECT_TIMEOUT, settings.GOOGLE_READ_TIMEOUT),
+        )
+        if response.status_code != 200:
+            raise GoogleTokenInvalid()
+        data = response.json()
+    except requests.RequestException:
+        raise GoogleUnavailable()
+    except ValueError:
+        # Non-JSON body from upstream
+        raise GoogleUnavailable()
+    cache.set(key, data, settings.GOOGLE_TOKEN_CACHE_SECONDS)
+    return data
+
+
+def free_username(base):
+    """
+    First of base, base1, base2, ... not taken yet, found with one query for
+    all existing names of that shape.
+    """
+    taken = set(
+        User.objects.filter(username__regex=rf"^{re.escape(base)}[0-9]*$").values_list("username", flat=True)
+    )
+    if base not in taken:
+        return base
+    counter = 1
+    while f"{base}{counter}" in taken:
+        counter += 1
+    return f"{base}{counter}"
@@ -0,0 +1,234 @@
+"""
+Hour-of-week traffic profiles built from Movement history.
+
+build_profiles() folds each closed UTC day into TrafficProfile counts and
+records its progress in TrafficProfileState, so reruns only read new days.
+Days moved to the columnar archive (api/archive.py) are read from there.
+profile_scores() scores paths for a target time from those counts, lazily
+loading just the cells the paths touch into a per-process LRU cache.
+"""
+import math
+import threading
+from collections import OrderedDict
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from itertools import chain
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import movement_store
+from .models import MovementArchive, TrafficProfile, TrafficProfileState
+from .traffic import METERS_PER_DEG_LAT
+
+
+class ProfileConfigError(Exception):
+    pass
+
+
+def hour_of_week(dt):
+    dt = dt.astimezone(dt_timezone.utc)
+    return dt.weekday() * 24 + dt.hour
+
+
+def _state(rebuild=False):
+    cell_deg = settings.TRAFFIC_PROFILE_CELL_DEG
+    state = TrafficProfileState.objects.first()
+    if state is None:
+        return TrafficProfileState.objects.create(cell_deg=cell_deg)
+    if state.cell_deg != cell_deg and not rebuild:
+        raise ProfileConfigError(
+            f"profiles were built with cell_deg={state.cell_deg}, settings say {cell_deg}; rebuild required"
+        )
+    if rebuild:
+        with transaction.atomic():
+            # Locked like a fold, so a concurrent builder sees the reset
+            state = TrafficProfileState.objects.select_for_update().get(pk=state.pk)
+            TrafficProfile.objects.all().delete()
+            state.cell_deg = cell_deg
+            state.first_day = None
+            state.closed_through = None
+            state.save()
+    return state
+
+
+def _fold_day(state, day):
+    """
+    Add day's counts to the profiles. Returns False, folding nothing, when
+    the locked state row is no longer the checkpoint state was read at:
+    another builder (the --every loop or the job) moved it meanwhile.
+    """
+    from . import archive
+
+    cell_deg = state.cell_deg
+    start = datetime.combine(day, time.min, tzinfo=dt_timezone.utc)
+    end = start + timedelta(days=1)
+    rows = chain(movement_store.cell_hour_counts(start, end, cell_deg), archive.cell_hour_counts(start, end, cell_deg))
+    base_how = day.weekday() * 24
+    counts = {}
+    for r in rows:
+        key = (r["room_id"], int(r["cx"]), int(r["cy"]), base_how + r["hour"])
+        counts[key] = counts.get(key, 0) + r["n"]
+
+    with transaction.atomic():
+        locked = TrafficProfileState.objects.select_for_update().get(pk=state.pk)
+        if (locked.cell_deg, locked.first_day, locked.closed_through) != (
+            cell_deg, state.first_day, state.closed_through
+        ):
+            return False
+        if counts:
+            room_ids = {k[0] for k in counts}
+            existing = TrafficProfile.objects.select_for_update().filter(
+                room_id__in=room_ids,
+                hour_of_week__gte=base_how,
+                hour_of_week__lt=base_how + 24,
+            )
+            to_update = []
+            for profile in existing:
+                key = (profile.room_id, profile.cell_x, profile.cell_y, profile.hour_of_week)
+                n = counts.pop(key, None)
+                if n:
+                    profile.count += n
+                    to_update.append(profile)
+            TrafficProfile.objects.bulk_update(to_update, ["count"], batch_size=1000)
+            TrafficProfile.objects.bulk_create(
+                [
+                    TrafficProfile(room_id=room_id, cell_x=cx, cell_y=cy, hour_of_week=how, count=n)
+                    for (room_id, cx, cy, how), n in counts.items()
+                ],
+                batch_size=1000,
+            )
+        if state.first_day is None:
+            state.first_day = day
+        state.closed_through = day
+        state.save(update_fields=["first_day", "closed_through", "updated_at"])
+    return True
+
+
+def _first_archived_day():
+    return MovementArchive.objects.order_by("day").values_list("day", flat=True).first()
+
+
+def build_profiles(rebuild=False, max_days=None):
+    """
+    Fold every closed day after the last checkpoint into the profiles.
+    Returns the number of days folded.
+    """
+    state = _state(rebuild=rebuild)
+    last_closed = timezone.now().astimezone(dt_timezone.utc).date() - timedelta(days=1)
+    if state.closed_through:
+        day = state.closed_through + timedelta(days=1)
+    else:
+        first = movement_store.first_created_at()
+        days = [d for d in (first and first.astimezone(dt_timezone.utc).date(), _first_archived_day()) if d]
+        if not days:
+            return 0
+        day = min(days)
+
+    folded = 0
+    while day <= last_closed and (max_days is None or folded < max_days):
+        if not _fold_day(state, day):
+            # Another builder is folding; it carries on from its own checkpoint
+            break
+        folded += 1
+        day += timedelta(days=1)
+    return folded
+
+
+def _weeks_observed(state, weekday):
+    """How many days with the given weekday the profiles cover."""
+    if state.first_day is None or state.closed_through is None:
+        return 0
+    days = (state.closed_through - state.first_day).days + 1
+    offset = (weekday - state.first_day.weekday()) % 7
+    return 0 if offset >= days else (days - offset - 1) // 7 + 1
+
+
+# ------------------------------
+# Lazy per-process cell cache
+# ------------------------------
+_cache_lock = threading.Lock()
+_cells = OrderedDict()  # (cell_x, cell_y) -> {room_id: {hour_of_week: count}}
+_cache_version = None
+
+
+def _cells_for(keys, version):
+    """Return cached profiles for the given cells, loading missing ones."""
+    global _cache_version
+    with _cache_lock:
+        if _cache_version != version:
+            _cells.clear()
+            _cache_version = version
+        missing = [k for k in keys if k not in _cells]
+
+    loaded = {k: {} for k in missing}
+    for i in range(0, len(missing), 200):
+        cond = Q()
+        for cx, cy in missing[i:i + 200]:
+            cond |= Q(cell_x=cx, cell_y=cy)
+        rows = TrafficProfile.objects.filter(cond).values_list("cell_x", "cell_y", "room_id", "hour_of_week", "count")
+        for cx, cy, room_id, how, n in rows:
+            loaded[(cx, cy)].setdefault(room_id, {})[how] = n
+
+    with _cache_lock:
+        _cells.update(loaded)
+        result = {}
+        for k in keys:
+            if k in _cells:
+                _cells.move_to_end(k)
+                result[k] = _cells[k]
+            else:
+                result[k] = loaded.get(k, {})
+        while len(_cells) > settings.TRAFFIC_PROFILE_CACHE_CELLS:
+            _cells.popitem(last=False)
+    return result
+
+
+def _node_cells(lat, lng, radius_m, cell_deg):
+    dlat = radius_m / METERS_PER_DEG_LAT
+    dlng = radius_m / max(1e-6, METERS_PER_DEG_LAT * max(0.1, math.cos(math.radians(lat))))
+    return [
+        (cx, cy)
+        for cx in range(math.floor((lng - dlng) / cell_deg), math.floor((lng + dlng) / cell_deg) + 1)
+        for cy in range(math.floor((lat - dlat) / cell_deg), math.floor((lat + dlat) / cell_deg) + 1)
+    ]
+
+
+def profile_scores(paths, radius_m, target, room_ids=None):
+    """
+    Expected movements per hour around every node of every path at the
+    target time's hour of week. room_ids=None means all rooms.
+
+    Returns (node_scores, info) or (None, None) when no profiles are built.
+    """
+    state = TrafficProfileState.objects.first()
+    if state is None or state.closed_through is None:
+        return None, None
+    cell_deg = state.cell_deg
+    how = hour_of_week(target)
+    weeks = _weeks_observed(state, how // 24)
+
+    node_cells = [[_node_cells(p["lat"], p["lng"], radius_m, cell_deg) for p in path] for path in paths]
+    keys = list({k for path in node_cells for cells in path for k in cells})
+    cells = _cells_for(keys, (cell_deg, state.closed_through))
+
+    room_filter = None if room_ids is None else set(room_ids)
+    node_scores = []
+    for path in node_cells:
+        scores = []
+        for cell_keys in path:
+            total = 0
+            for k in cell_keys:
+                for room_id, hours in cells[k].items():
+                    if room_filter is None or room_id in room_filter:
+                        total += hours.get(how, 0)
+            scores.append(total / weeks if weeks else 0.0)
+        node_scores.append(scores)
+
+    info = {
+        "hour_of_week": how,
+        "weeks_observed": weeks,
+        "profiles_through": state.closed_through.isoformat(),
+    }
+    return node_scores, info
@@ -0,0 +1,202 @@
+"""
+Bulk attendee provisioning for large events.
+
+provision() validates a batch of users with set-based uniqueness queries
+(one per chunk instead of two per user), hashes passwords across a process
+pool, and bulk-inserts users and their room Memberships chunk by chunk.
+Accounts signed up elsewhere between validation and insert are reported
+like any other taken username or email.
+"""
+import csv
+import io
+import json
+import os
+import time
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+from rest_framework import serializers
+
+from .models import Membership
+from .scan import process_pool
+from .serializers import check_email_format, check_password_strength, check_username_format
+
+FIELDS = ("username", "email", "password", "first_name")
+
+
+def parse_users(content, fmt="csv"):
+    """Parse a CSV (with a header row) or JSON list of user dicts, or a list."""
+    if isinstance(content, bytes):
+        content = content.decode("utf-8-sig")
+    if isinstance(content, list):
+        rows = content
+    elif fmt == "json":
+        rows = json.loads(content)
+        if not isinstance(rows, list):
+            raise ValueError("JSON users must be a list")
+    else:
+        rows = list(csv.DictReader(io.StringIO(content)))
+    return [{f: (str(row.get(f) or "")).strip() for f in FIELDS} for row in rows if isinstance(row, dict)]
+
+
+def _format_errors(row):
+    errors = {}
+    # SignupSerializer gets these from the model fields; a bulk insert would
+    # fail on them mid-batch (PostgreSQL DataError) after earlier chunks committed
+    for field in ("username", "email", "first_name"):
+        max_length = User._meta.get_field(field).max_length
+        if len(row[field]) > max_length:
+            errors[field] = f"Ensure this field has no more than {max_length} characters."
+    checks = [
+        ("username", check_username_format),
+        ("email", check_email_format),
+    ]
+    # Attendees without a password get an unusable one (e.g. Google sign-in)
+    if row["password"]:
+        checks.append(("password", check_password_strength))
+    for field, check in checks:
+        if field in errors:
+            continue
+        try:
+            check(row[field])
+        except serializers.ValidationError as e:
+            errors[field] = str(e.detail[0])
+    return errors
+
+
+def _existing(field, values, chunk_size):
+    values = list(values)
+    found = set()
+    for i in range(0, len(values), chunk_size):
+        found.update(
+            User.objects.filter(**{f"{field}__in": values[i:i + chunk_size]}).values_list(field, flat=True)
+        )
+    return found
+
+
+def _taken_errors(row, taken_usernames, taken_emails):
+    errors = {}
+    if row["username"] in taken_usernames:
+        errors["username"] = "This username is already taken."
+    if row["email"] in taken_emails:
+        errors["email"] = "An account with this email already exists."
+    return errors
+
+
+def validate_users(rows, chunk_size=500):
+    """
+    Split rows into (valid (row number, row) pairs, errors). Errors are
+    {"row", "errors"}; row numbers are 1-based and duplicates inside the
+    batch count as taken.
+    """
+    errors = []
+    candidates = []
+    for n, row in enumerate(rows, start=1):
+        row_errors = _format_errors(row)
+        if row_errors:
+            errors.append({"row": n, "errors": row_errors})
+        else:
+            candidates.append((n, row))
+
+    taken_usernames = _existing("username", {r["username"] for _, r in candidates}, chunk_size)
+    taken_emails = _existing("email", {r["email"] for _, r in candidates}, chunk_size)
+    valid = []
+    for n, row in candidates:
+        row_errors = _taken_errors(row, taken_usernames, taken_emails)
+        if row_errors:
+            errors.append({"row": n, "errors": row_errors})
+            continue
+        taken_usernames.add(row["username"])
+        taken_emails.add(row["email"])
+        valid.append((n, row))
+    errors.sort(key=lambda e: e["row"])
+    return valid, errors
+
+
+def _hash(password):
+    return make_password(password or None)
+
+
+def hash_passwords(passwords, workers=None):
+    workers = workers or settings.PROVISION_HASH_WORKERS or os.cpu_count() or 1
+    if workers < 2 or len(passwords) < 2:
+        return [_hash(p) for p in passwords]
+    with process_pool(workers) as pool:
+        return list(pool.map(_hash, passwords, chunksize=max(1, len(passwords) // (workers * 4))))
+
+
+def _insert(room, chunk):
+    """Create one chunk of (row number, row, hash) and its memberships, all or nothing."""
+    with transaction.atomic():
+        User.objects.bulk_create(
+            [
+                User(username=r["username"], email=r["email"], first_name=r["first_name"], password=h)
+                for _, r, h in chunk
+            ]
+        )
+        # Re-read ids: not every backend returns them from bulk_create
+        user_ids = User.objects.filter(username__in=[r["username"] for _, r, _ in chunk]).values_list("id", flat=True)
+        Membership.objects.bulk_create(
+            [Membership(user_id=uid, room=room) for uid in user_ids],
+            ignore_conflicts=True,
+        )
+
+
+def provision(room, rows, chunk_size=1000, workers=None, dry_run=False):
+    """
+    Create users from rows and add them to room. Invalid rows are skipped
+    and reported. workers is the number of hashing processes (default:
+    PROVISION_HASH_WORKERS). Returns a report dict including throughput.
+    """
+    started = time.monotonic()
+    valid, errors = validate_users(rows)
+    validated = time.monotonic()
+    report = {
+        "room_id": room.id,
+        "received": len(rows),
+        "valid": len(valid),
+        "created": 0,
+        "errors": errors,
+    }
+    if dry_run or not valid:
+        report["seconds"] = round(validated - started, 3)
+        return report
+
+    hashes = hash_passwords([r["password"] for _, r in valid], workers)
+    hashed = time.monotonic()
+
+    for i in range(0, len(valid), chunk_size):
+        chunk = [(n, r, h) for (n, r), h in zip(valid[i:i + chunk_size], hashes[i:i + chunk_size])]
+        while chunk:
+            try:
+                _insert(room, chunk)
+                break
+            except IntegrityError:
+                # Someone signed up with a username or email of this chunk
+                # since validation; drop those rows and retry the rest
+                taken_usernames = _existing("username", {r["username"] for _, r, _ in chunk}, chunk_size)
+                taken_emails = _existing("email", {r["email"] for _, r, _ in chunk}, chunk_size)
+                remaining = []
+                for n, r, h in chunk:
+                    row_errors = _taken_errors(r, taken_usernames, taken_emails)
+                    if row_errors:
+                        errors.append({"row": n, "errors": row_errors})
+                    else:
+                        remaining.append((n, r, h))
+                if len(remaining) == len(chunk):
+                    raise
+                chunk = remaining
+        report["created"] += len(chunk)
+    finished = time.monotonic()
+    errors.sort(key=lambda e: e["row"])
+
+    report.update(
+        seconds=round(finished - started, 3),
+        validate_seconds=round(validated - started, 3),
+        hash_seconds=round(hashed - validated, 3),
+        insert_seconds=round(finished - hashed, 3),
+        users_per_second=round(report["created"] / max(finished - started, 1e-9), 1),
+    )
+    return report
@@ -0,0 +1,35 @@
+"""
+Optional orjson-backed JSON renderer.
+
+FastJSONRenderer is a drop-in for DRF's JSONRenderer. With
+FAST_JSON_RENDERER on and orjson installed it encodes with orjson, handing
+everything orjson does not encode natively (datetimes, decimals, lazy
+strings, ...) to DRF's encoder, so values come out the same. Floats with
+an exponent are written in orjson's shortest form (1e-5, not 1e-05), which
+parses to the same number. Indented output and anything orjson rejects,
+such as ints beyond 64 bits or non-string keys, go through the stock renderer.
+"""
+from django.conf import settings
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+_encoder = JSONEncoder()
+
+
+class FastJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or not settings.FAST_JSON_RENDERER or data is None:
+            return super().render(data, accepted_media_type, renderer_context)
+        if self.get_indent(accepted_media_type or "", renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data, default=_encoder.default, option=orjson.OPT_PASSTHROUGH_DATETIME)
+        except TypeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        # Escaped by JSONRenderer too, for embedding in <script> tags
+        return ret.replace("\u2028".encode(), b"\\u2028").replace("\u2029".encode(), b"\\u2029")
@@ -0,0 +1,133 @@
+"""
+Movement scans for predict_traffic's live mode (either storage format, see
+api/movement_store.py).
+
+serial_scan() streams the matching rows through score_points() in this
+process. parallel_scan() splits the window's primary-key range into chunks
+and scores them in a process pool; the partial node_scores are summed, so
+the result matches the serial scan up to float summation order.
+
+archive_scan() scores the part of a window that has been moved to the
+columnar archive (api/archive.py); its scores add to either scan's.
+"""
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import connections
+
+from . import movement_store
+from .traffic import score_points
+
+
+def movement_filters(window_start, bbox, room_id=None, room_ids=None):
+    lat_min, lat_max, lng_min, lng_max = bbox
+    filters = {
+        "created_at__gte": window_start,
+        "latitude__gte": lat_min,
+        "latitude__lte": lat_max,
+        "longitude__gte": lng_min,
+        "longitude__lte": lng_max,
+    }
+    if room_id is not None:
+        filters["room_id"] = room_id
+    elif room_ids is not None:
+        filters["room_id__in"] = list(room_ids)
+    return filters
+
+
+def serial_scan(filters, paths, radius_m, window_end, decay_lambda):
+    return score_points(movement_store.points(filters), paths, radius_m, window_end, decay_lambda)
+
+
+def archive_scan(window_start, bbox, paths, radius_m, window_end, decay_lambda, room_id=None, room_ids=None):
+    """
+    Score archived fixes since window_start, or return None when the window
+    cannot reach the archive: it only holds days before yesterday (UTC), so
+    ordinary windows skip even the index lookup.
+    """
+    today = window_end.astimezone(dt_timezone.utc).date()
+    if window_start >= datetime.combine(today - timedelta(days=1), time.min, tzinfo=dt_timezone.utc):
+        return None
+    from . import archive
+
+    fixes = archive.points(window_start, bbox, room_id=room_id, room_ids=room_ids)
+    return score_points(fixes, paths, radius_m, window_end, decay_lambda)
+
+
+def add_scores(node_scores, part_scores):
+    """Add part_scores into node_scores in place (both lists of per-path score lists)."""
+    for total, part in zip(node_scores, part_scores):
+        for i, s in enumerate(part):
+            total[i] += s
+
+
+def window_pk_range(window_start):
+    """
+    (first_pk, last_pk) of movements created since window_start, or None.
+    Ids grow with created_at, so the span approximates the row count.
+    """
+    first = movement_store.first_pk_since(window_start)
+    if first is None:
+        return None
+    return first, movement_store.last_pk()
+
+
+def parallel_workers():
+    return settings.TRAFFIC_PARALLEL_WORKERS or os.cpu_count() or 1
+
+
+def should_parallelize(pk_range):
+    if pk_range is None or parallel_workers() < 2:
+        return False
+    return pk_range[1] - pk_range[0] + 1 >= settings.TRAFFIC_PARALLEL_MIN_ROWS
+
+
+def _init_worker():
+    # Spawned workers start without Django configured
+    import django
+    from django.apps import apps
+
+    if not apps.ready:
+        django.setup()
+
+
+def process_pool(workers):
+    """
+    ProcessPoolExecutor whose children can use Django. Prefers fork; open
+    DB connections are closed first so children don't share their sockets.
+    """
+    methods = multiprocessing.get_all_start_methods()
+    ctx = multiprocessing.get_context("fork" if "fork" in methods else "spawn")
+    connections.close_all()
+    return ProcessPoolExecutor(max_workers=workers, mp_context=ctx, initializer=_init_worker)
+
+
+def _scan_chunk(args):
+    filters, lo, hi, paths, radius_m, window_end, decay_lambda = args
+    try:
+        return serial_scan(dict(filters, pk__gte=lo, pk__lte=hi), paths, radius_m, window_end, decay_lambda)
+    finally:
+        connections.close_all()
+
+
+def parallel_scan(filters, pk_range, paths, radius_m, window_end, decay_lambda, workers=None):
+    workers = workers or parallel_workers()
+    lo, hi = pk_range
+    # A few chunks per worker so one dense time slice doesn't straggle
+    n_chunks = workers * 4
+    step = max(1, (hi - lo + n_chunks) // n_chunks)
+    chunks = [
+        (filters, start, min(hi, start + step - 1), paths, radius_m, window_end, decay_lambda)
+        for start in range(lo, hi + 1, step)
+    ]
+
+    node_scores = [[0.0] * len(path) for path in paths]
+    counted = 0
+    with process_pool(workers) as pool:
+        for part_scores, part_counted in pool.map(_scan_chunk, chunks):
+            counted += part_counted
+            add_scores(node_scores, part_scores)
+    return node_scores, counted
@@ -0,0 +1,265 @@
+"""
+Streaming trip and stop segmentation of stored fixes.
+
+Every fix is read once. run_segmentation() pages through the fixes stored
+after SegmentationCheckpoint.last_pk in pk (arrival) order and hands each
+member's fixes to segment(), a generator that yields closed trips and stops
+and keeps the open segment in a JSON-able dict (SegmentationState). Closed
+segments become Trip/Stop rows and bump the room's RoomTravelStats totals.
+
+A stop is a stay within SEGMENT_STOP_RADIUS_M of where it began for at least
+SEGMENT_STOP_MIN_SECONDS; a silence longer than SEGMENT_GAP_SECONDS closes
+whatever segment is open.
+"""
+from collections import defaultdict
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import movement_store
+from .models import RoomTravelStats, SegmentationCheckpoint, SegmentationState, Stop, Trip
+from .traffic import haversine_meters
+
+
+class SegmentationConfigError(Exception):
+    pass
+
+
+def _new_trip(lat, lng, ts):
+    return {"start": [lat, lng, ts], "end": [lat, lng, ts], "distance_m": 0.0, "points": 1}
+
+
+def _new_anchor(lat, lng, ts, trip):
+    # Remember how far the trip had got when this candidate stop began:
+    # if the stop is confirmed, the trip ended here.
+    return {
+        "lat": lat,
+        "lng": lng,
+        "start_ts": ts,
+        "last_ts": ts,
+        "sum_lat": lat,
+        "sum_lng": lng,
+        "n": 1,
+        "trip_distance_m": trip["distance_m"] if trip else 0.0,
+        "trip_points": trip["points"] if trip else 0,
+    }
+
+
+def _trip_summary(trip, end, distance_m, points):
+    duration_s = end[2] - trip["start"][2]
+    if points < 2 or duration_s <= 0:
+        return None
+    return {
+        "started_at": trip["start"][2],
+        "ended_at": end[2],
+        "start_lat": trip["start"][0],
+        "start_lng": trip["start"][1],
+        "end_lat": end[0],
+        "end_lng": end[1],
+        "distance_m": distance_m,
+        "duration_s": duration_s,
+        "avg_speed_mps": distance_m / duration_s,
+        "points": points,
+    }
+
+
+def _stop_summary(anchor):
+    return {
+        "started_at": anchor["start_ts"],
+        "ended_at": anchor["last_ts"],
+        "lat": anchor["sum_lat"] / anchor["n"],
+        "lng": anchor["sum_lng"] / anchor["n"],
+        "duration_s": anchor["last_ts"] - anchor["start_ts"],
+        "points": anchor["n"],
+    }
+
+
+def close_open(state):
+    """Yield whatever segment state still holds open, and empty it."""
+    if state.get("in_stop"):
+        yield ("stop", _stop_summary(state["anchor"]))
+    elif state.get("trip"):
+        trip = state["trip"]
+        summary = _trip_summary(trip, trip["end"], trip["distance_m"], trip["points"])
+        if summary:
+            yield ("trip", summary)
+    state.clear()
+
+
+def segment(fixes, state, radius_m, min_stop_s, gap_s):
+    """
+    Consume (lat, lng, ts_seconds) fixes of one member in time order and
+    yield ("trip", summary) / ("stop", summary) as segments close. state
+    is updated in place and can be stored to resume later.
+    """
+    for lat, lng, ts in fixes:
+        last = state.get("last")
+        if last and ts - last[2] > gap_s:
+            yield from close_open(state)
+            last = None
+        if last is None:
+            trip = _new_trip(lat, lng, ts)
+            state.update(last=[lat, lng, ts], trip=trip, anchor=_new_anchor(lat, lng, ts, trip), in_stop=False)
+            continue
+
+        anchor = state["anchor"]
+        if state["in_stop"] and haversine_meters(anchor["lat"], anchor["lng"], lat, lng) > radius_m:
+            # Leaving a stop: emit it and depart from the last fix inside it
+            yield ("stop", _stop_summary(anchor))
+            state["in_stop"] = False
+            state["trip"] = _new_trip(*last)
+
+        trip = state["trip"]
+        if trip:
+            trip["distance_m"] += haversine_meters(last[0], last[1], lat, lng)
+            trip["points"] += 1
+            trip["end"] = [lat, lng, ts]
+
+        if haversine_meters(anchor["lat"], anchor["lng"], lat, lng) <= radius_m:
+            anchor["last_ts"] = ts
+            anchor["sum_lat"] += lat
+            anchor["sum_lng"] += lng
+            anchor["n"] += 1
+            if not state["in_stop"] and ts - anchor["start_ts"] >= min_stop_s:
+                if trip:
+                    start_fix = [anchor["lat"], anchor["lng"], anchor["start_ts"]]
+                    summary = _trip_summary(trip, start_fix, anchor["trip_distance_m"], anchor["trip_points"])
+                    if summary:
+                        yield ("trip", summary)
+                state["trip"] = None
+                state["in_stop"] = True
+        elif not state["in_stop"]:
+            state["anchor"] = _new_anchor(lat, lng, ts, trip)
+        state["last"] = [lat, lng, ts]
+
+
+def _params():
+    return (
+        settings.SEGMENT_STOP_RADIUS_M,
+        settings.SEGMENT_STOP_MIN_SECONDS,
+        settings.SEGMENT_GAP_SECONDS,
+    )
+
+
+def _dt(ts):
+    return datetime.fromtimestamp(ts, tz=dt_timezone.utc)
+
+
+def _rows(model, user_id, room_id, events, kind):
+    return [
+        model(user_id=user_id, room_id=room_id, **dict(s, started_at=_dt(s["started_at"]), ended_at=_dt(s["ended_at"])))
+        for k, s in events
+        if k == kind
+    ]
+
+
+def _store(user_id, room_id, events):
+    trips = _rows(Trip, user_id, room_id, events, "trip")
+    stops = _rows(Stop, user_id, room_id, events, "stop")
+    Trip.objects.bulk_create(trips)
+    Stop.objects.bulk_create(stops)
+    stats, _ = RoomTravelStats.objects.get_or_create(user_id=user_id, room_id=room_id)
+    RoomTravelStats.objects.filter(pk=stats.pk).update(
+        distance_m=F("distance_m") + sum(t.distance_m for t in trips),
+        moving_s=F("moving_s") + sum(t.duration_s for t in trips),
+        trips=F("trips") + len(trips),
+        stops=F("stops") + len(stops),
+        updated_at=timezone.now(),
+    )
+    return len(trips), len(stops)
+
+
+def _checkpoint(rebuild=False):
+    storage = settings.MOVEMENT_STORAGE
+    checkpoint = SegmentationCheckpoint.objects.first()
+    if checkpoint is None:
+        return SegmentationCheckpoint.objects.create(storage=storage)
+    if checkpoint.storage != storage and not rebuild:
+        raise SegmentationConfigError(
+            f"segmented {checkpoint.storage} storage but MOVEMENT_STORAGE is {storage}; rebuild required"
+        )
+    if rebuild:
+        Trip.objects.all().delete()
+        Stop.objects.all().delete()
+        RoomTravelStats.objects.all().delete()
+        SegmentationState.objects.all().delete()
+        checkpoint.storage = storage
+        checkpoint.last_pk = 0
+        checkpoint.save()
+    return checkpoint
+
+
+def _apply(fixes_by_pair, params, close=False):
+    """Feed grouped fixes through segment() and persist everything."""
+    totals = [0, 0]
+    closed = []
+    pairs = list(fixes_by_pair)
+    states = {
+        (s.user_id, s.room_id): s
+        for s in SegmentationState.objects.select_for_update().filter(
+            user_id__in={u for u, _ in pairs}, room_id__in={r for _, r in pairs}
+        )
+    }
+    for user_id, room_id in pairs:
+        row = states.get((user_id, room_id)) or SegmentationState(user_id=user_id, room_id=room_id)
+        events = list(segment(fixes_by_pair[(user_id, room_id)], row.state, *params))
+        if close:
+            events.extend(close_open(row.state))
+        if events:
+            trips, stops = _store(user_id, room_id, events)
+            totals[0] += trips
+            totals[1] += stops
+        if row.state:
+            row.last_ts = row.state["last"][2]
+            row.save()
+        elif row.pk:
+            closed.append(row.pk)
+    if closed:
+        SegmentationState.objects.filter(pk__in=closed).delete()
+    return totals
+
+
+def run_segmentation(batch_size=5000, rebuild=False):
+    """
+    Segment every fix stored since the checkpoint, then close segments of
+    members silent for longer than SEGMENT_GAP_SECONDS.
+    Returns {"fixes", "trips", "stops"}.
+    """
+    params = _params()
+    checkpoint = _checkpoint(rebuild=rebuild)
+    last_pk = movement_store.last_pk() or 0
+    report = {"fixes": 0, "trips": 0, "stops": 0}
+
+    while checkpoint.last_pk < last_pk:
+        upper = min(checkpoint.last_pk + batch_size, last_pk)
+        fixes_by_pair = defaultdict(list)
+        rows = movement_store.points(
+            {"pk__gt": checkpoint.last_pk, "pk__lte": upper},
+            extra=("user_id", "room_id"),
+            order_by=("pk",),
+        )
+        for lat, lng, created_at, user_id, room_id in rows:
+            fixes_by_pair[(user_id, room_id)].append((lat, lng, created_at.timestamp()))
+            report["fixes"] += 1
+        with transaction.atomic():
+            trips, stops = _apply(fixes_by_pair, params)
+            checkpoint.last_pk = upper
+            checkpoint.save(update_fields=["last_pk", "updated_at"])
+        report["trips"] += trips
+        report["stops"] += stops
+
+    # Members who went quiet: their open trip or stop is over
+    idle_before = timezone.now().timestamp() - params[2]
+    with transaction.atomic():
+        idle = {
+            pair: []
+            for pair in SegmentationState.objects.filter(last_ts__lt=idle_before).values_list("user_id", "room_id")
+        }
+        if idle:
+            trips, stops = _apply(idle, params, close=True)
+            report["trips"] += trips
+            report["stops"] += stops
+    return report
@@ -5,6 +5,37 @@ from django.core.exceptions import ValidationError
 import re
 from .models import Room, Membership, Movement, GeoFence, MeetingPoint
 
+
+# Format checks shared by signup and bulk provisioning (api/provisioning.py).
+# Uniqueness is checked by the callers: per value here, per batch there.
+def check_email_format(value):
+    try:
+        validate_email(value)
+    except ValidationError:
+        raise serializers.ValidationError("Please enter a valid email address.")
+
+
+def check_username_format(value):
+    if len(value) < 3:
+        raise serializers.ValidationError("Username must be at least 3 characters long.")
+    
+    if not re.match(r'^[a-zA-Z0-9_]+$', value):
+        raise serializers.ValidationError("Username can only contain letters, numbers, and underscores.")
+
+
+def check_password_strength(value):
+    if len(value) < 8:
+        raise serializers.ValidationError("Password must be at least 8 characters long.")
+    
+    if not re.search(r'[A-Z]', value):
+        raise serializers.ValidationError("Password must contain at least one uppercase letter.")
+    
+    if not re.search(r'[a-z]', value):
+        raise serializers.ValidationError("Password must contain at least one lowercase letter.")
+    
+    if not re.search(r'\d', value):
+        raise serializers.ValidationError("Password must contain at least one number.")
+
 class SignupSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True, min_length=8)
     email = serializers.EmailField(required=True)
@@ -13,13 +44,13 @@ class SignupSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ("username", "email", "password", "confirm_password", "first_name")
+        # validate_username checks format and uniqueness; the model's own
+        # validators would repeat the uniqueness query
+        extra_kwargs = {"username": {"validators": []}}
 
     def validate_email(self, value):
         """Validate email format and uniqueness"""
-        try:
-            validate_email(value)
-        except ValidationError:
-            raise serializers.ValidationError("Please enter a valid email address.")
+        check_email_format(value)
         
         if User.objects.filter(email=value).exists():
             raise serializers.ValidationError("An account with this email already exists.")
@@ -28,11 +59,7 @@ class SignupSerializer(serializers.ModelSerializer):
 
     def validate_username(self, value):
         """Validate username format and uniqueness"""
-        if len(value) < 3:
-            raise serializers.ValidationError("Username must be at least 3 characters long.")
-        
-        if not re.match(r'^[a-zA-Z0-9_]+$', value):
-            raise serializers.ValidationError("Username can only contain letters, numbers, and underscores.")
+        check_username_format(value)
         
         if User.objects.filter(username=value).exists():
             raise serializers.ValidationError("This username is already taken.")
@@ -41,18 +68,7 @@ class SignupSerializer(serializers.ModelSerializer):
 
     def validate_password(self, value):
         """Validate password strength"""
-        if len(value) < 8:
-            raise serializers.ValidationError("Password must be at least 8 characters long.")
-        
-        if not re.search(r'[A-Z]', value):
-            raise serializers.ValidationError("Password must contain at least one uppercase letter.")
-        
-        if not re.search(r'[a-z]', value):
-            raise serializers.ValidationError("Password must contain at least one lowercase letter.")
-        
-        if not re.search(r'\d', value):
-            raise serializers.ValidationError("Password must contain at least one number.")
-        
+        check_password_strength(value)
         return value
 
     def validate(self, data):
@@ -0,0 +1,107 @@
+"""
+Cold-start measurements for the Django service.
+
+Both helpers start a fresh interpreter, since only a new process shows what
+a sleeping host pays on wake-up: import_profile() parses `python -X
+importtime` output for Django setup plus the URLconf, and cold_start() times
+the first bootstrap_room response through the WSGI application.
+"""
+import json
+import os
+import re
+import subprocess
+import sys
+
+from django.conf import settings
+
+_IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+_SETUP_SCRIPT = """
+import django
+django.setup()
+from django.urls import get_resolver
+get_resolver().url_patterns
+"""
+
+_COLD_START_SCRIPT = """
+import io, json, os, sys, time
+t0 = time.perf_counter()
+from django_api.wsgi import application
+t1 = time.perf_counter()
+body = json.dumps({"room_id": os.environ["COLD_START_ROOM_ID"]}).encode()
+environ = {
+    "REQUEST_METHOD": "POST",
+    "PATH_INFO": "/api/rooms/bootstrap",
+    "SCRIPT_NAME": "",
+    "QUERY_STRING": "",
+    "CONTENT_TYPE": "application/json",
+    "CONTENT_LENGTH": str(len(body)),
+    "SERVER_NAME": "localhost",
+    "SERVER_PORT": "80",
+    "HTTP_HOST": "localhost",
+    "HTTP_X_FORWARDED_PROTO": "https",
+    "HTTP_AUTHORIZATION": "Bearer " + os.environ["COLD_START_TOKEN"],
+    "wsgi.version": (1, 0),
+    "wsgi.url_scheme": "http",
+    "wsgi.input": io.BytesIO(body),
+    "wsgi.errors": sys.stderr,
+    "wsgi.multithread": False,
+    "wsgi.multiprocess": True,
+    "wsgi.run_once": False,
+}
+status = []
+b"".join(application(environ, lambda s, headers, exc_info=None: status.append(s)))
+t2 = time.perf_counter()
+print(json.dumps({"status": status[0], "setup_ms": (t1 - t0) * 1000, "first_response_ms": (t2 - t1) * 1000}))
+"""
+
+
+def _child_env(**extra):
+    env = dict(os.environ)
+    env.setdefault("DJANGO_SETTINGS_MODULE", "django_api.settings")
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(settings.BASE_DIR), env.get("PYTHONPATH")]))
+    env.update(extra)
+    return env
+
+
+def parse_importtime(stderr):
+    """[(module, self_us, cumulative_us, depth)] from -X importtime output."""
+    rows = []
+    for line in stderr.splitlines():
+        m = _IMPORTTIME_LINE.match(line)
+        if m:
+            self_us, cumulative_us, indent, name = m.groups()
+            rows.append((name, int(self_us), int(cumulative_us), len(indent) // 2))
+    return rows
+
+
+def import_profile():
+    """Import timings of django.setup() plus the URLconf in a new process."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _SETUP_SCRIPT],
+        capture_output=True,
+        text=True,
+        cwd=settings.BASE_DIR,
+        env=_child_env(),
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "startup failed")
+    return parse_importtime(result.stderr)
+
+
+def cold_start(room_id, token):
+    """
+    Start a new process and POST bootstrap_room through the WSGI app.
+    Returns {"status", "setup_ms", "first_response_ms"}; the caller adds
+    interpreter start-up by timing the call itself.
+    """
+    result = subprocess.run(
+        [sys.executable, "-c", _COLD_START_SCRIPT],
+        capture_output=True,
+        text=True,
+        cwd=settings.BASE_DIR,
+        env=_child_env(COLD_START_ROOM_ID=room_id, COLD_START_TOKEN=token),
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "cold start failed")
+    return json.loads(result.stdout.strip().splitlines()[-1])
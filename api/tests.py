@@ -1,3 +1,1583 @@
+"""
+Query budgets for the API views.
+
+Every endpoint is called against a realistically sized room (hundreds of
+members, a geofence, a meeting history, recent movement) and must run an
+exact number of queries, authentication included. A budget that breaks
+means a view gained (or lost) a round trip: fix the N+1, or update the
+number when the change is deliberate. Failures list the SQL that ran,
+flagging statements repeated per row.
+"""
+import io
+import json
+import math
+import random
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime, time as dt_time, timedelta, timezone as dt_timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from unittest import mock
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+from django.conf import settings
+from django.contrib.admin.helpers import ACTION_CHECKBOX_NAME
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connections
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from api import (
+    activity, archive, fast_serializers, geocoding, jobs, movement_store, nearby, profiles, provisioning, segmentation,
+)
+from api.checks import shared_cache_check
+from api.clustering import ZoomGrid
+from api.jobs import enqueue
+from api.meeting_suggest import minimax_center
+from api.profiles import build_profiles
+from api.renderers import FastJSONRenderer
+from api.scan import movement_filters, parallel_scan, serial_scan, window_pk_range
+from api.serializers import GeoFenceSerializer, MeetingPointSerializer, RoomSerializer
+from api.throttling import check_ingest, rejected_counts
+from api.traffic import clean_path, decay_lambda_for, haversine_meters, padded_bbox
+from api.models import (
+    COORD_SCALE, MOVEMENT_EPOCH, CompactMovement, GeoFence, Job, MeetingPoint, Membership, Movement, MovementArchive,
+    Room, RoomActivity, RoomTravelStats, SegmentationState, Stop, TrafficProfile, Trip,
+)
+
+MEMBERS = 300
+MOVEMENTS_PER_MEMBER = 5
+
+
+def _shape(sql):
+    """SQL with literals replaced, so per-row repeats of a statement group together."""
+    sql = re.sub(r"'(?:[^']|'')*'", "?", sql)
+    return re.sub(r"\b\d+(\.\d+)?\b", "?", sql)
+
+
+def format_queries(captured):
+    """Numbered SQL of captured queries, then statements run more than once."""
+    lines = [f"{n}. {q['sql']}" for n, q in enumerate(captured, start=1)]
+    repeats = [(shape, count) for shape, count in Counter(_shape(q["sql"]) for q in captured).items() if count > 1]
+    if repeats:
+        lines.append("Repeated statements (possible N+1):")
+        lines.extend(f"  x{count}: {shape}" for shape, count in sorted(repeats, key=lambda r: -r[1]))
+    return "\n".join(lines)
+
+
+class QueryBudgetMixin:
+    @contextmanager
+    def assertQueryBudget(self, budget, using="default"):
+        """
+        assertNumQueries that prints the offending SQL: fails unless the
+        block runs exactly `budget` queries.
+        """
+        with CaptureQueriesContext(connections[using]) as ctx:
+            yield ctx
+        executed = len(ctx.captured_queries)
+        if executed != budget:
+            self.fail(f"{executed} queries executed, budget is {budget}\n{format_queries(ctx.captured_queries)}")
+
+
+class ApiTestCase(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.creator = User.objects.create_user(
+            "creator", "creator@example.com", "Secret123", first_name="Cara"
+        )
+        # Members without hashing: make_password is not what these tests measure
+        User.objects.bulk_create(
+            [
+                User(username=f"member{i}", email=f"member{i}@example.com", first_name=f"M{i}", password="!")
+                for i in range(MEMBERS)
+            ]
+        )
+        cls.members = list(User.objects.filter(username__startswith="member").order_by("id"))
+        cls.room = Room.objects.create(name="Festival", creator=cls.creator)
+        cls.other_room = Room.objects.create(name="Afterparty", creator=cls.members[0])
+        Membership.objects.bulk_create(
+            [Membership(user=cls.creator, room=cls.room)]
+            + [Membership(user=u, room=cls.room) for u in cls.members]
+            + [Membership(user=u, room=cls.other_room) for u in cls.members[:50]]
+        )
+        # The creator belongs to many rooms, for list_rooms
+        for i in range(25):
+            room = Room.objects.create(name=f"Side stage {i}", creator=cls.members[i])
+            Membership.objects.create(user=cls.creator, room=room)
+
+        GeoFence.objects.create(
+            room=cls.room, center_lat=51.5007, center_lng=-0.1246, radius_m=400, created_by=cls.creator
+        )
+        for i in range(10):
+            MeetingPoint.objects.create(
+                room=cls.room,
+                place_name=f"Gate {i}",
+                lat=51.5 + i / 1000,
+                lng=-0.12,
+                reach_by=timezone.now() + timedelta(hours=1),
+                created_by=cls.creator,
+                active=i == 9,
+            )
+        Movement.objects.bulk_create(
+            [
+                Movement(user=u, room=cls.room, latitude=51.5 + (i % 20) / 10000, longitude=-0.124 + k / 10000)
+                for i, u in enumerate(cls.members)
+                for k in range(MOVEMENTS_PER_MEMBER)
+            ]
+        )
+        RoomTravelStats.objects.bulk_create(
+            [
+                RoomTravelStats(user=u, room=cls.room, distance_m=i * 10.0, moving_s=i * 5.0, trips=i % 7)
+                for i, u in enumerate(cls.members)
+            ]
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = self.client_for(self.creator)
+
+    def client_for(self, user):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(user)}")
+        return client
+
+    def post(self, url, data=None, client=None):
+        return (client or self.client).post(url, data or {}, format="json")
+
+
+class StubServerMixin:
+    """Serves stub_handler on a local port for the test class; stub_url is its base URL."""
+    stub_handler = None
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), cls.stub_handler)
+        cls.stub_url = f"http://127.0.0.1:{cls.server.server_port}"
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+
+class StubGoogle(BaseHTTPRequestHandler):
+    """Google userinfo stand-in: known bearer tokens get their user, others a 401, "slow" stalls."""
+    users = {
+        "creator-token": {"id": "1", "email": "creator@example.com", "name": "Cara"},
+        "newbie-token": {"id": "2", "email": "newbie@gmail.com", "given_name": "New", "family_name": "Bie"},
+    }
+    hits = []
+
+    def do_GET(self):
+        token = self.headers.get("Authorization", "").removeprefix("Bearer ")
+        StubGoogle.hits.append(token)
+        if token == "slow":
+            time.sleep(1)
+        user = self.users.get(token)
+        if user is None:
+            self.send_response(401)
+            self.end_headers()
+            return
+        data = json.dumps(user).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+class AuthQueryTests(ApiTestCase):
+    def test_signup(self):
+        data = {
+            "username": "newcomer",
+            "email": "newcomer@example.com",
+            "password": "Secret123",
+            "confirm_password": "Secret123",
+            "first_name": "New",
+        }
+        # username and email uniqueness checks, insert
+        with self.assertQueryBudget(3):
+            response = self.post("/api/signup", data, client=APIClient())
+        self.assertEqual(response.status_code, 201)
+
+    def test_login(self):
+        # user lookup (simplejwt does not update last_login by default)
+        with self.assertQueryBudget(1):
+            response = self.post("/api/login", {"username": "creator", "password": "Secret123"}, client=APIClient())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["username"], "creator")
+
+    def test_google_auth_existing_user(self):
+        from api.oauth import _cache_key
+
+        cache.set(_cache_key("google-token"), {"email": "creator@example.com", "id": "1"})
+        with self.assertQueryBudget(1):
+            response = self.post("/api/google-auth", {"access_token": "google-token"}, client=APIClient())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["username"], "creator")
+
+
+class GoogleAuthTests(StubServerMixin, ApiTestCase):
+    stub_handler = StubGoogle
+
+    def setUp(self):
+        super().setUp()
+        override = override_settings(GOOGLE_USERINFO_URL=self.stub_url + "/oauth2/v2/userinfo", GOOGLE_READ_TIMEOUT=0.2)
+        override.enable()
+        self.addCleanup(override.disable)
+        StubGoogle.hits = []
+
+    def google_auth(self, token):
+        return self.post("/api/google-auth", {"access_token": token}, client=APIClient())
+
+    def test_valid_token_then_cached(self):
+        response = self.google_auth("creator-token")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["username"], "creator")
+        self.assertEqual(StubGoogle.hits, ["creator-token"])
+
+        # Verified tokens are cached: user lookup only, no second call to Google
+        with self.assertQueryBudget(1):
+            response = self.google_auth("creator-token")
+        self.assertEqual(response.data["username"], "creator")
+        self.assertEqual(len(StubGoogle.hits), 1)
+
+    def test_rejected_token(self):
+        response = self.google_auth("revoked-token")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data["error"], "Invalid Google access token")
+        # Rejections are not cached
+        self.google_auth("revoked-token")
+        self.assertEqual(len(StubGoogle.hits), 2)
+
+    def test_timeout(self):
+        response = self.google_auth("slow")
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(response.data["error"], "Failed to verify Google token")
+
+    def test_new_user_gets_free_username(self):
+        User.objects.bulk_create([User(username="newbie", email="a@example.com"), User(username="newbie1", email="b@example.com")])
+        response = self.google_auth("newbie-token")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["username"], "newbie2")
+        user = User.objects.get(email="newbie@gmail.com")
+        self.assertEqual((user.first_name, user.last_name), ("New", "Bie"))
+        self.assertFalse(user.has_usable_password())
+
+
+class RoomQueryTests(ApiTestCase):
+    def test_create_room(self):
+        # auth, room id collision check, insert room, insert membership
+        with self.assertQueryBudget(4):
+            response = self.post("/api/rooms", {"name": "Main stage"})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data["creator"]["username"], "creator")
+
+    def test_join_room(self):
+        client = self.client_for(self.members[100])
+        # auth, room with creator, membership get_or_create (lookup, savepoint, insert, release)
+        with self.assertQueryBudget(6):
+            response = self.post("/api/rooms/join", {"room_id": self.other_room.id}, client=client)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data["joined"])
+
+    def test_list_rooms(self):
+        with self.assertQueryBudget(2):
+            response = self.post("/api/rooms/list")
+        self.assertEqual(len(response.data["rooms"]), 26)
+        self.assertEqual(response.data["rooms"][0]["creator"]["username"], "creator")
+
+    def test_bootstrap_room(self):
+        with self.assertQueryBudget(4):
+            response = self.post("/api/rooms/bootstrap", {"room_id": self.room.id})
+        self.assertTrue(response.data["ok"])
+        self.assertEqual(response.data["geofence"]["radius_m"], 400)
+        self.assertEqual(response.data["meeting"]["place_name"], "Gate 9")
+        self.assertEqual(response.data["room"], RoomSerializer(self.room).data)
+
+    def test_bootstrap_room_not_found(self):
+        with self.assertQueryBudget(2):
+            response = self.post("/api/rooms/bootstrap", {"room_id": "NOPE0000"})
+        self.assertEqual(response.status_code, 404)
+
+    def test_provision_room_dry_run(self):
+        users = [
+            {"username": f"guest{i}", "email": f"guest{i}@example.com", "password": "Secret123"}
+            for i in range(50)
+        ]
+        # auth, room, one username and one email IN query for the batch
+        with self.assertQueryBudget(4):
+            response = self.post("/api/rooms/provision", {"room_id": self.room.id, "users": users, "dry_run": True})
+        self.assertEqual(response.data["valid"], 50)
+
+    def test_provision_room(self):
+        users = [
+            {"username": f"guest{i}", "email": f"guest{i}@example.com", "password": "Secret123", "first_name": "G"}
+            for i in range(6)
+        ]
+        users += [
+            {"username": "guest0", "email": "other@example.com", "password": "Secret123"},  # duplicate in batch
+            {"username": "member1", "email": "new@example.com", "password": "Secret123"},  # already taken
+            {"username": "x" * 151, "email": "long@example.com", "password": "Secret123"},
+            {"username": "longname", "email": "long2@example.com", "first_name": "F" * 151},
+            {"username": "nopass", "email": "nopass@example.com"},
+        ]
+        response = self.post("/api/rooms/provision", {"room_id": self.room.id, "users": users})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data["created"], 7)
+        self.assertEqual(
+            {e["row"]: sorted(e["errors"]) for e in response.data["errors"]},
+            {7: ["username"], 8: ["username"], 9: ["username"], 10: ["first_name"]},
+        )
+        self.assertIn("150 characters", response.data["errors"][2]["errors"]["username"])
+
+        created = User.objects.filter(username__startswith="guest").order_by("username")
+        self.assertEqual([u.username for u in created], [f"guest{i}" for i in range(6)])
+        self.assertTrue(all(u.check_password("Secret123") for u in created))
+        self.assertFalse(User.objects.get(username="nopass").has_usable_password())
+        self.assertEqual(
+            Membership.objects.filter(room=self.room, user__username__in=[f"guest{i}" for i in range(6)] + ["nopass"])
+            .count(),
+            7,
+        )
+
+    @override_settings(PROVISION_SYNC_MAX_USERS=2)
+    def test_provision_room_queues_large_batches(self):
+        users = [{"username": f"guest{i}", "email": f"guest{i}@example.com"} for i in range(3)]
+        response = self.post("/api/rooms/provision", {"room_id": self.room.id, "users": users})
+        self.assertEqual(response.status_code, 202)
+        job = Job.objects.get(pk=response.data["job_id"])
+        self.assertEqual((job.kind, len(job.params["users"])), ("rooms.provision", 3))
+        self.assertFalse(User.objects.filter(username__startswith="guest").exists())
+
+    @override_settings(PROVISION_HASH_WORKERS=2)
+    def test_provision_reports_signups_racing_the_insert(self):
+        users = [
+            {"username": f"guest{i}", "email": f"guest{i}@example.com", "password": "Secret123"} for i in range(4)
+        ]
+        real_hash = provisioning.hash_passwords
+
+        def hash_while_others_sign_up(passwords, workers=None):
+            User.objects.create_user("guest1", "someone@example.com", "Secret123")
+            User.objects.create_user("someone", "guest2@example.com", "Secret123")
+            # Hashed in the PROVISION_HASH_WORKERS pool
+            return real_hash(passwords, workers)
+
+        with mock.patch.object(provisioning, "hash_passwords", hash_while_others_sign_up):
+            report = provisioning.provision(self.room, provisioning.parse_users(users), chunk_size=3)
+        self.assertEqual(report["created"], 2)
+        self.assertEqual(
+            report["errors"],
+            [
+                {"row": 2, "errors": {"username": "This username is already taken."}},
+                {"row": 3, "errors": {"email": "An account with this email already exists."}},
+            ],
+        )
+        created = User.objects.filter(username__in=["guest0", "guest3"])
+        self.assertTrue(all(u.check_password("Secret123") for u in created))
+        self.assertEqual(Membership.objects.filter(room=self.room, user__in=created).count(), 2)
+        self.assertFalse(Membership.objects.filter(room=self.room, user__username="someone").exists())
+
+    def test_room_snapshot(self):
+        # auth, room, latest fix per member, archived days, usernames
+        with self.assertQueryBudget(5):
+            response = self.post("/api/rooms/snapshot", {"room_id": self.room.id})
+        self.assertEqual(len(response.data["positions"]), MEMBERS)
+
+    def test_room_leaderboard(self):
+        client = self.client_for(self.members[5])
+        # auth, room, membership check, ranked totals
+        with self.assertQueryBudget(4):
+            response = self.post("/api/rooms/leaderboard", {"room_id": self.room.id, "limit": 50}, client=client)
+        self.assertEqual(len(response.data["leaders"]), 50)
+        self.assertEqual(response.data["leaders"][0]["username"], f"member{MEMBERS - 1}")
+
+    def test_forbidden_for_non_creator(self):
+        client = self.client_for(self.members[3])
+        with self.assertQueryBudget(2):
+            response = self.post("/api/rooms/snapshot", {"room_id": self.room.id}, client=client)
+        self.assertEqual(response.status_code, 403)
+
+
+class GeoFenceAndMeetingQueryTests(ApiTestCase):
+    def test_set_geofence(self):
+        # auth, room, update_or_create (savepoint, select for update, update, release)
+        with self.assertQueryBudget(6):
+            response = self.post(
+                "/api/geofence/set",
+                {"room_id": self.room.id, "center_lat": 51.5, "center_lng": -0.12, "radius_m": 250},
+            )
+        self.assertEqual(response.data["radius_m"], 250)
+
+    def test_get_geofence(self):
+        with self.assertQueryBudget(2):
+            response = self.post("/api/geofence/get", {"room_id": self.room.id})
+        self.assertEqual(response.data["geofence"]["created_by"]["username"], "creator")
+
+    def test_set_meeting_point(self):
+        # auth, room, deactivate previous, insert
+        with self.assertQueryBudget(4):
+            response = self.post(
+                "/api/meeting/set",
+                {
+                    "room_id": self.room.id,
+                    "place_name": "Main gate",
+                    "lat": 51.5,
+                    "lng": -0.12,
+                    "reach_by": (timezone.now() + timedelta(hours=2)).isoformat(),
+                },
+            )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(MeetingPoint.objects.filter(room=self.room, active=True).count(), 1)
+
+    def test_get_meeting_point(self):
+        with self.assertQueryBudget(2):
+            response = self.post("/api/meeting/get", {"room_id": self.room.id})
+        self.assertEqual(response.data["meeting"]["place_name"], "Gate 9")
+
+    def test_get_meeting_point_none(self):
+        # no active meeting, then the room existence check
+        with self.assertQueryBudget(3):
+            response = self.post("/api/meeting/get", {"room_id": self.other_room.id})
+        self.assertIsNone(response.data["meeting"])
+
+
+class MovementQueryTests(ApiTestCase):
+    def test_record_movement(self):
+        # user, room, insert (no auth: called by the Node server)
+        with self.assertQueryBudget(3):
+            response = self.post(
+                "/api/movement/record",
+                {"user_id": self.members[0].id, "room_id": self.room.id, "latitude": 51.5, "longitude": -0.12},
+                client=APIClient(),
+            )
+        self.assertEqual(response.status_code, 200)
+
+    def test_record_movement_throttled_skips_database(self):
+        body = {"user_id": self.members[0].id, "room_id": self.room.id, "latitude": 51.5, "longitude": -0.12}
+        client = APIClient()
+        with self.settings(INGEST_USER_RATE=1, INGEST_USER_BURST=1):
+            self.post("/api/movement/record", body, client=client)
+            with self.assertQueryBudget(0):
+                response = self.post("/api/movement/record", body, client=client)
+        self.assertEqual(response.status_code, 429)
+        self.assertIn("Retry-After", response)
+
+    def test_room_bucket_off_by_default_and_rejections_reported(self):
+        client = APIClient()
+        with self.settings(INGEST_USER_RATE=1, INGEST_USER_BURST=1, INGEST_ROOM_BURST=1):
+            # One fix each from many members: no room-wide limit unless INGEST_ROOM_RATE is set
+            for user in self.members[:20]:
+                body = {"user_id": user.id, "room_id": self.room.id, "latitude": 51.5, "longitude": -0.12}
+                self.assertEqual(self.post("/api/movement/record", body, client=client).status_code, 200)
+            self.assertEqual(self.post("/api/movement/record", body, client=client).status_code, 429)
+        response = self.post("/api/rooms/stats", {"room_id": self.room.id})
+        self.assertEqual(response.data["rejected_fixes"], 1)
+
+    @override_settings(INGEST_USER_RATE=1, INGEST_USER_BURST=1, INGEST_REJECTED_WINDOW_SECONDS=600)
+    def test_rejection_counters_are_per_window(self):
+        user = self.members[0].id
+        start = 1_800_000_000.0  # a window boundary
+        admitted = [check_ingest(user, self.room.id, now=start + dt) is None for dt in (0, 0.1, 0.2, 600, 600.1)]
+        self.assertEqual(admitted, [True, False, False, True, False])
+        self.assertEqual(rejected_counts(user, self.room.id, now=start + 599), {"user": 2, "room": 2})
+        self.assertEqual(rejected_counts(user, self.room.id, now=start + 600.5), {"user": 1, "room": 1})
+
+    def test_predict_traffic_room(self):
+        path = [{"lat": 51.5, "lng": -0.124}, {"lat": 51.502, "lng": -0.1236}]
+        # auth, room, one scan of the window
+        with self.assertQueryBudget(3):
+            response = self.post("/api/traffic/predict", {"room_id": self.room.id, "path": path, "parallel": False})
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(response.data["counted_movements"], 0)
+
+    def test_predict_traffic_historical(self):
+        # Ten fixes on the busy route's first point a week and a day ago, 09:00 UTC
+        busy, quiet = [{"lat": 51.51, "lng": -0.13}, {"lat": 51.511, "lng": -0.13}], [
+            {"lat": 51.6, "lng": -0.2}, {"lat": 51.601, "lng": -0.2}
+        ]
+        day = timezone.now().astimezone(dt_timezone.utc).date() - timedelta(days=8)
+        at = datetime.combine(day, dt_time(9, 10), tzinfo=dt_timezone.utc)
+        for user in self.members[:10]:
+            m = Movement.objects.create(user=user, room=self.room, latitude=51.51, longitude=-0.13)
+            Movement.objects.filter(pk=m.pk).update(created_at=at)
+
+        body = {"room_id": self.room.id, "paths": [busy, quiet], "mode": "historical", "radius_m": 30}
+        self.assertEqual(self.post("/api/traffic/predict", {**body, "target_time": at.isoformat()}).status_code, 409)
+        self.assertEqual(build_profiles(), 8)
+
+        target = at + timedelta(days=7, minutes=30)
+        response = self.post("/api/traffic/predict", {**body, "target_time": target.isoformat()}).data
+        self.assertEqual(response["hour_of_week"], day.weekday() * 24 + 9)
+        # Day 0 and day 7 of the eight folded share the weekday
+        self.assertEqual(response["weeks_observed"], 2)
+        busy_route, quiet_route = response["routes"]
+        self.assertEqual(busy_route["node_indices"][0], 100)
+        self.assertEqual(quiet_route["overall_index"], 0)
+        self.assertEqual(response["ranking"], [1, 0])
+
+        # Another hour of the week saw nothing
+        response = self.post("/api/traffic/predict", {**body, "target_time": (target + timedelta(hours=2)).isoformat()})
+        self.assertEqual([r["overall_index"] for r in response.data["routes"]], [0, 0])
+
+    def test_profile_fold_skips_a_day_another_builder_folded(self):
+        day = timezone.now().astimezone(dt_timezone.utc).date() - timedelta(days=2)
+        m = Movement.objects.create(user=self.creator, room=self.room, latitude=51.51, longitude=-0.13)
+        Movement.objects.filter(pk=m.pk).update(created_at=datetime.combine(day, dt_time(9), tzinfo=dt_timezone.utc))
+        stale = profiles._state()
+        self.assertEqual(build_profiles(), 2)
+        counts = list(TrafficProfile.objects.values_list("cell_x", "cell_y", "hour_of_week", "count"))
+        self.assertFalse(profiles._fold_day(stale, day))
+        self.assertEqual(list(TrafficProfile.objects.values_list("cell_x", "cell_y", "hour_of_week", "count")), counts)
+
+    def test_predict_traffic_multi_route(self):
+        paths = [
+            [{"lat": 51.5, "lng": -0.124}, {"lat": 51.502, "lng": -0.1236}],
+            [{"lat": 51.5, "lng": -0.125}, {"lat": 51.501, "lng": -0.126}],
+        ]
+        with self.assertQueryBudget(3):
+            response = self.post("/api/traffic/predict", {"room_id": self.room.id, "paths": paths, "parallel": False})
+        self.assertEqual(len(response.data["routes"]), 2)
+
+
+class RoomActivityTests(ApiTestCase):
+    def test_room_stats(self):
+        now = time.time()
+        for i, user in enumerate(self.members[:40]):
+            activity.note_fix(self.room.id, user.id, 51.5 + i / 1000, -0.12, now=now - 70)
+        activity.note_fix(self.room.id, self.members[0].id, 51.4, -0.2, now=now - 10)
+        # auth, room with its flushed activity; counters come from the cache
+        with self.assertQueryBudget(2):
+            response = self.post("/api/rooms/stats", {"room_id": self.room.id})
+        self.assertEqual(response.data["points_total"], 41)
+        # the 40 fixes from 70s ago fall in one of the last five full minutes
+        self.assertGreaterEqual(round(response.data["points_per_minute_5m"] * 5), 40)
+        self.assertEqual(response.data["active_members_5m"], 40)
+        self.assertEqual(response.data["bbox"]["min_lat"], 51.4)
+        self.assertEqual(response.data["bbox"]["max_lat"], 51.539)
+
+    def test_flush_survives_cache_loss(self):
+        for user in self.members[:3]:
+            activity.note_fix(self.room.id, user.id, 51.5, -0.12)
+        self.assertEqual(activity.flush(in_process=True), 1)
+        activity.note_fix(self.room.id, self.members[0].id, 51.6, -0.12)
+        self.assertEqual(activity.flush(in_process=True), 1)
+        self.assertEqual(RoomActivity.objects.get(room=self.room).points_total, 4)
+
+        cache.clear()
+        response = self.post("/api/rooms/stats", {"room_id": self.room.id})
+        self.assertEqual(response.data["source"], "flushed")
+        self.assertEqual(response.data["points_total"], 4)
+        self.assertEqual(response.data["active_members_5m"], 3)
+        self.assertEqual(response.data["bbox"]["max_lat"], 51.6)
+
+    def test_active_members_count_each_member_once_per_window(self):
+        now = 60 * 1000000 + 30
+        activity.note_fix(self.room.id, self.members[0].id, 51.5, -0.12, now=now - 6 * 60)
+        for minute in range(3, -1, -1):
+            activity.note_fix(self.room.id, self.members[1].id, 51.5, -0.12, now=now - minute * 60)
+            activity.note_fix(self.room.id, self.members[1].id, 51.5, -0.12, now=now - minute * 60 + 1)
+        activity.note_fix(self.room.id, self.members[2].id, 51.5, -0.12, now=now - 2 * 60)
+        stats = activity.room_stats(self.room, now=now)
+        # members[0] left the window; members[1] counts once across four minutes
+        self.assertEqual(stats["active_members_5m"], 2)
+        self.assertEqual(stats["points_total"], 10)
+
+    def test_bbox_growth_keeps_a_concurrent_expansion(self):
+        activity.note_fix(self.room.id, self.members[0].id, 51.5, -0.12)
+        # Another worker grows the box after this one read it
+        cache.set(activity._bbox_key(self.room.id), [51.5, -0.12, 51.7, -0.12])
+        with mock.patch.object(activity.cache, "get_many", return_value={}):
+            activity.note_fix(self.room.id, self.members[1].id, 51.4, -0.12)
+        bbox = activity.room_stats(self.room)["bbox"]
+        self.assertEqual((bbox["min_lat"], bbox["max_lat"]), (51.4, 51.7))
+
+        # While the box is locked the fix is left out; a later one retries
+        cache.add(activity._bbox_lock_key(self.room.id), 1)
+        with mock.patch.object(activity, "BBOX_LOCK_ATTEMPTS", 1), mock.patch.object(activity.time, "sleep"):
+            activity.note_fix(self.room.id, self.members[1].id, 51.8, -0.12)
+        self.assertEqual(activity.room_stats(self.room)["bbox"]["max_lat"], 51.7)
+        cache.delete(activity._bbox_lock_key(self.room.id))
+        activity.note_fix(self.room.id, self.members[1].id, 51.8, -0.12)
+        self.assertEqual(activity.room_stats(self.room)["bbox"]["max_lat"], 51.8)
+
+    def test_flush_visits_only_registered_rooms(self):
+        activity.note_fix(self.room.id, self.members[0].id, 51.5, -0.12)
+        activity.note_fix(self.room.id, self.members[1].id, 51.5, -0.12)
+        activity.note_fix(self.other_room.id, self.members[0].id, 51.5, -0.12)
+        self.assertEqual(activity.flush(in_process=True), 2)
+        # Nothing new: no rooms and no queries
+        with self.assertQueryBudget(0):
+            self.assertEqual(activity.flush(in_process=True), 0)
+
+        activity.note_fix(self.other_room.id, self.members[0].id, 51.5, -0.12)
+        self.assertEqual(activity.flush(in_process=True), 1)
+        self.assertEqual(RoomActivity.objects.get(room=self.room).points_total, 2)
+        self.assertEqual(RoomActivity.objects.get(room=self.other_room).points_total, 2)
+
+        # Registrations of a deleted room are dropped
+        gone = Room.objects.create(name="Gone", creator=self.creator)
+        activity.note_fix(gone.id, self.members[0].id, 51.5, -0.12)
+        gone.delete()
+        self.assertEqual(activity.flush(in_process=True), 0)
+
+    def test_flush_refuses_process_local_cache(self):
+        activity.note_fix(self.room.id, self.members[0].id, 51.5, -0.12)
+        # A separate flush process would only see its own, empty cache
+        with self.assertRaises(CommandError):
+            call_command("flush_room_activity", stdout=io.StringIO())
+        self.assertFalse(RoomActivity.objects.filter(room=self.room).exists())
+
+    def test_record_movement_counts_fix(self):
+        body = {"user_id": self.members[0].id, "room_id": self.room.id, "latitude": 51.5, "longitude": -0.12}
+        self.post("/api/movement/record", body, client=APIClient())
+        self.assertEqual(activity.room_stats(self.room)["points_total"], 1)
+
+
+class NearbyTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        nearby._indexes.clear()
+
+    def test_room_nearby(self):
+        point = {"room_id": self.room.id, "lat": 51.5005, "lng": -0.1236, "k": 5}
+        # auth, room; first use loads the index: watermark, latest fixes, usernames
+        with self.assertQueryBudget(5):
+            response = self.post("/api/rooms/nearby", point)
+        latest = movement_store.latest_positions(self.room.id)
+        index = nearby._indexes[self.room.id]
+        x, y = index._project(point["lat"], point["lng"])
+        expected = sorted(
+            (math.hypot(index.members[u][0] - x, index.members[u][1] - y), u) for u in latest
+        )[:5]
+        self.assertEqual([m["user_id"] for m in response.data["members"]], [u for _, u in expected])
+        self.assertEqual(response.data["members"][0]["username"], User.objects.get(id=expected[0][1]).username)
+
+        # Within the sync interval the index answers without touching the database
+        with self.assertQueryBudget(2):
+            self.post("/api/rooms/nearby", point)
+
+    def test_room_nearby_picks_up_new_fixes(self):
+        self.post("/api/rooms/nearby", {"room_id": self.room.id, "lat": 51.5, "lng": -0.12})
+        mover = self.members[7]
+        movement_store.record(mover.id, self.room.id, 51.51, -0.10)
+        nearby._indexes[self.room.id].synced_at = 0
+        # auth, room, fixes past the watermark
+        with self.assertQueryBudget(3):
+            response = self.post(
+                "/api/rooms/nearby", {"room_id": self.room.id, "lat": 51.5101, "lng": -0.1001, "radius_m": 50}
+            )
+        self.assertEqual([m["user_id"] for m in response.data["members"]], [mover.id])
+
+        # Without a point, the caller's own last fix is used and the caller left out
+        response = self.post("/api/rooms/nearby", {"room_id": self.room.id, "k": 3}, self.client_for(mover))
+        self.assertEqual(response.data["lat"], 51.51)
+        self.assertNotIn(mover.id, [m["user_id"] for m in response.data["members"]])
+        self.assertEqual(len(response.data["members"]), 3)
+
+
+    def test_far_query_point_is_bounded(self):
+        self.post("/api/rooms/nearby", {"room_id": self.room.id, "lat": 51.5, "lng": -0.12})
+        index = nearby._indexes[self.room.id]
+        # 0,0 is ~5,700 km from the room: tens of thousands of empty rings
+        for lat, lng in ((0.0, 0.0), (55.4, -0.12), (51.5005, -0.1236)):
+            x, y = index._project(lat, lng)
+            brute = sorted(math.hypot(m[0] - x, m[1] - y) for m in index.members.values())[:7]
+            started = time.perf_counter()
+            # Members share positions, so compare distances: ties may pick either member
+            self.assertEqual([d for d, _ in index.nearest(lat, lng, 7)], brute)
+            self.assertLess(time.perf_counter() - started, 0.5)
+
+        response = self.post("/api/rooms/nearby", {"room_id": self.room.id, "lat": 91, "lng": 0})
+        self.assertEqual(response.status_code, 400)
+        response = self.post("/api/rooms/nearby", {"room_id": self.room.id, "lat": 0, "lng": "nan"})
+        self.assertEqual(response.status_code, 400)
+
+
+class ClusterTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        nearby._indexes.clear()
+
+    def test_room_clusters(self):
+        # auth, room; first use loads the index: watermark, latest fixes, usernames
+        with self.assertQueryBudget(5):
+            response = self.post("/api/rooms/clusters", {"room_id": self.room.id, "zoom": 3})
+        self.assertEqual(response.data["members"], [])
+        self.assertEqual([c["count"] for c in response.data["clusters"]], [MEMBERS])
+
+        # Fixture members stand in groups of 15 on 20 spots 11 m apart: up close
+        # the cells split the room, never a spot
+        response = self.post("/api/rooms/clusters", {"room_id": self.room.id, "zoom": 20})
+        self.assertEqual(response.data["grid_zoom"], 18)
+        counts = [c["count"] for c in response.data["clusters"]]
+        self.assertGreater(len(counts), 5)
+        self.assertEqual(sum(counts), MEMBERS)
+        self.assertTrue(all(c % 15 == 0 for c in counts))
+
+    def test_room_clusters_follow_moves(self):
+        self.post("/api/rooms/clusters", {"room_id": self.room.id, "zoom": 16})
+        mover = self.members[3]
+        movement_store.record(mover.id, self.room.id, 51.52, -0.10)
+        nearby._indexes[self.room.id].synced_at = 0
+        bbox = {"min_lat": 51.51, "min_lng": -0.11, "max_lat": 51.53, "max_lng": -0.09}
+        response = self.post("/api/rooms/clusters", {"room_id": self.room.id, "zoom": 16, "bbox": bbox})
+        self.assertEqual(response.data["clusters"], [])
+        self.assertEqual([m["user_id"] for m in response.data["members"]], [mover.id])
+
+        # The world at street level is coarsened until it fits CLUSTER_MAX_CELLS
+        world = {"min_lat": -80, "min_lng": -180, "max_lat": 80, "max_lng": 180}
+        response = self.post("/api/rooms/clusters", {"room_id": self.room.id, "zoom": 16, "bbox": world})
+        self.assertLess(response.data["grid_zoom"], 5)
+        self.assertEqual(sum(c["count"] for c in response.data["clusters"]), MEMBERS)
+
+    def test_zoom_grid_stays_consistent(self):
+        grid = ZoomGrid(max_zoom=12, cell_px=64)
+        rng = random.Random(3)
+        for _ in range(2000):
+            grid.move(rng.randrange(200), 51.5 + rng.uniform(-0.05, 0.05), -0.12 + rng.uniform(-0.05, 0.05))
+        for user_id in range(0, 200, 7):
+            grid.remove(user_id)
+        rebuilt = ZoomGrid(max_zoom=12, cell_px=64)
+        for user_id, (lat, lng, _) in grid.positions.items():
+            rebuilt.move(user_id, lat, lng)
+        for level, expected in zip(grid.levels, rebuilt.levels):
+            self.assertEqual({k: (c[0], c[3]) for k, c in level.items()}, {k: (c[0], c[3]) for k, c in expected.items()})
+            for key, cell in level.items():
+                self.assertAlmostEqual(cell[1], expected[key][1], places=6)
+
+
+class MeetingSuggestTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        nearby._indexes.clear()
+
+    def test_suggest_meeting_point(self):
+        # auth, room; first use loads the index: watermark, latest fixes, usernames
+        with self.assertQueryBudget(5):
+            response = self.post("/api/meeting/suggest", {"room_id": self.room.id})
+        self.assertEqual(response.data["members"], MEMBERS)
+        # Fixture members stand on a north-south line 51.5 .. 51.5019 at lng -0.1236
+        self.assertAlmostEqual(response.data["lat"], 51.50095, places=4)
+        self.assertAlmostEqual(response.data["lng"], -0.1236, places=5)
+
+        response = self.post("/api/meeting/suggest", {"room_id": self.room.id, "objective": "max"})
+        self.assertAlmostEqual(response.data["lat"], 51.50095, places=5)
+        self.assertAlmostEqual(response.data["max_distance_m"], 0.00095 * 111000, places=0)
+
+    def test_suggest_snaps_to_candidates(self):
+        candidates = [
+            {"place_name": "North gate", "lat": 51.51, "lng": -0.1236},
+            {"place_name": "Bar", "lat": 51.5012, "lng": -0.1230},
+        ]
+        response = self.post("/api/meeting/suggest", {"room_id": self.room.id, "candidates": candidates})
+        self.assertEqual(response.data["candidate"]["place_name"], "Bar")
+        self.assertLess(response.data["optimum"]["total_distance_m"], response.data["total_distance_m"])
+
+        response = self.post("/api/meeting/suggest", {"room_id": self.room.id}, self.client_for(self.members[0]))
+        self.assertEqual(response.status_code, 403)
+
+    def test_minimax_matches_brute_force(self):
+        rng = np.random.default_rng(5)
+        xy = rng.normal(0, 500, size=(2000, 2))
+        center, _ = minimax_center(xy)
+        radius = np.hypot(*(xy - center).T).max()
+        for dx, dy in ((1, 0), (-1, 0), (0, 1), (0, -1)):
+            self.assertGreater(np.hypot(*(xy - center - (dx, dy)).T).max(), radius)
+
+
+class ScanTests(ApiTestCase):
+    def test_parallel_scan_matches_serial(self):
+        paths = [
+            clean_path([{"lat": 51.5, "lng": -0.124}, {"lat": 51.502, "lng": -0.1236}]),
+            clean_path([{"lat": 51.5005, "lng": -0.1245}, {"lat": 51.5015, "lng": -0.1235}]),
+        ]
+        window_end = timezone.now()
+        window_start = window_end - timedelta(minutes=60)
+        args = (paths, 50, window_end, decay_lambda_for(60))
+        pk_range = window_pk_range(window_start)
+        for room_id in (None, self.room.id):
+            filters = movement_filters(window_start, padded_bbox(paths, 50), room_id=room_id)
+            expected, expected_counted = serial_scan(filters, *args)
+            # 3 workers x 4 chunks: the fixture's pk range is split a dozen ways
+            scores, counted = parallel_scan(filters, pk_range, *args, workers=3)
+            self.assertEqual(counted, expected_counted)
+            self.assertEqual(counted, MEMBERS * MOVEMENTS_PER_MEMBER)
+            self.assertGreater(sum(map(sum, expected)), 0)
+            for path_scores, path_expected in zip(scores, expected):
+                for score, want in zip(path_scores, path_expected):
+                    self.assertAlmostEqual(score, want, places=9)
+
+
+def walk_stop_walk(lat=51.5, lng=-0.12, t0=0.0):
+    """Fixes every 30 s: 10 walking north (~56 m apart), 15 standing still, 10 walking on."""
+    fixes = [(lat + i * 0.0005, lng, t0 + 30 * i) for i in range(10)]
+    fixes += [(lat + 9 * 0.0005, lng, t0 + 300 + 30 * i) for i in range(15)]
+    fixes += [(lat + (10 + i) * 0.0005, lng, t0 + 750 + 30 * i) for i in range(10)]
+    return fixes
+
+
+def path_length(fixes):
+    return sum(haversine_meters(a[0], a[1], b[0], b[1]) for a, b in zip(fixes, fixes[1:]))
+
+
+class FastSerializerTests(ApiTestCase):
+    def assertSameData(self, fast, reference):
+        # Key order too: the renderers write dicts in insertion order
+        self.assertEqual(json.dumps(fast), json.dumps(reference))
+
+    def test_builders_match_model_serializers(self):
+        # Blank user fields, and a timestamp on a whole second (no fraction in ISO 8601)
+        bare = User.objects.create_user("bare", "", "Secret123")
+        room = Room.objects.create(name="Bare", creator=bare)
+        Room.objects.filter(pk=room.pk).update(created_at=room.created_at.replace(microsecond=0))
+        Membership.objects.create(user=bare, room=room)
+        Membership.objects.create(user=bare, room=self.room)
+        GeoFence.objects.create(room=room, center_lat=-33.86, center_lng=151.21, radius_m=0, created_by=bare)
+        MeetingPoint.objects.create(
+            room=room, place_name="", lat=0.0, lng=-0.0, reach_by=timezone.now(), created_by=bare, active=False
+        )
+        empty = Room.objects.create(name="Empty", creator=self.creator)
+
+        for tz in ("UTC", "Europe/London", "Australia/Sydney"):
+            with self.subTest(tz=tz), override_settings(TIME_ZONE=tz):
+                for r in (room, self.room):
+                    r.refresh_from_db()
+                    self.assertSameData(fast_serializers.room_data(r.id), RoomSerializer(r).data)
+                self.assertIsNone(fast_serializers.room_data("NOPE0000"))
+
+                rooms = [m.room for m in Membership.objects.filter(user=bare).order_by("pk").select_related("room")]
+                self.assertSameData(fast_serializers.user_rooms_data(bare), RoomSerializer(rooms, many=True).data)
+                self.assertEqual(fast_serializers.user_rooms_data(self.members[0])[0]["name"], "Festival")
+
+                for r in (room, self.room):
+                    self.assertSameData(fast_serializers.geofence_data(r.id), GeoFenceSerializer(r.geofence).data)
+                    meeting = MeetingPoint.objects.filter(room=r, active=True).first()
+                    self.assertSameData(
+                        fast_serializers.active_meeting_data(r.id),
+                        meeting and MeetingPointSerializer(meeting).data,
+                    )
+                self.assertIsNone(fast_serializers.active_meeting_data(room.id))
+                self.assertIsNone(fast_serializers.geofence_data(empty.id))
+
+    @override_settings(FAST_JSON_RENDERER=True)
+    def test_renderer_matches_stock(self):
+        payload = {
+            "at": timezone.now(),
+            "day": timezone.now().date(),
+            "small": 1e-5,
+            "big": 1.5e300,
+            "text": "line\u2028separator \u00e9",
+            "none": None,
+            "nested": [{"n": 2**62, "ok": True}],
+            "room": RoomSerializer(self.room).data,
+        }
+        stock, fast = JSONRenderer().render(payload), FastJSONRenderer().render(payload)
+        self.assertEqual(json.loads(fast), json.loads(stock))
+        self.assertIn(b"\\u2028", fast)
+        # Beyond orjson's 64-bit ints: the stock encoder takes over
+        self.assertEqual(FastJSONRenderer().render({"n": 2**70}), JSONRenderer().render({"n": 2**70}))
+
+
+class SegmentationTests(ApiTestCase):
+    params = (50, 300, 900)  # stop radius, minimum stop, gap
+
+    def run_segment(self, fixes, state=None):
+        state = {} if state is None else state
+        events = list(segmentation.segment(fixes, state, *self.params))
+        return events, state
+
+    def test_walk_stop_walk(self):
+        fixes = walk_stop_walk()
+        events, state = self.run_segment(fixes)
+        events += list(segmentation.close_open(state))
+        self.assertEqual([kind for kind, _ in events], ["trip", "stop", "trip"])
+        first, stop, second = (summary for _, summary in events)
+
+        # The trip ends where the stop began
+        self.assertEqual((first["started_at"], first["ended_at"], first["points"]), (0, 270, 10))
+        self.assertAlmostEqual(first["distance_m"], path_length(fixes[:10]))
+        self.assertAlmostEqual(first["avg_speed_mps"], first["distance_m"] / 270)
+        self.assertEqual((stop["started_at"], stop["ended_at"], stop["points"]), (270, 720, 16))
+        self.assertAlmostEqual(stop["lat"], fixes[9][0])
+        # The next trip departs from the last fix inside the stop
+        self.assertEqual((second["started_at"], second["ended_at"], second["points"]), (720, 1020, 11))
+        self.assertAlmostEqual(second["distance_m"], path_length(fixes[24:]))
+        self.assertEqual(state, {})
+
+    def test_gap_closes_the_open_trip(self):
+        fixes = [(51.5 + i * 0.0005, -0.12, 30 * i) for i in range(5)]
+        fixes += [(51.6 + i * 0.0005, -0.12, 1200 + 30 * i) for i in range(5)]
+        events, state = self.run_segment(fixes)
+        self.assertEqual([(k, s["started_at"], s["ended_at"], s["points"]) for k, s in events], [("trip", 0, 120, 5)])
+        # No distance is counted across the silence
+        self.assertAlmostEqual(events[0][1]["distance_m"], path_length(fixes[:5]))
+        self.assertEqual(
+            [(k, s["started_at"], s["ended_at"]) for k, s in segmentation.close_open(state)], [("trip", 1200, 1320)]
+        )
+
+    def test_state_resumes_between_batches(self):
+        fixes = walk_stop_walk()
+        expected, _ = self.run_segment(fixes)
+        events, state = [], {}
+        for i in range(0, len(fixes), 4):
+            batch, state = self.run_segment(fixes[i:i + 4], json.loads(json.dumps(state)))
+            events += batch
+        self.assertEqual(events, expected)
+
+    def stored(self):
+        def rounded(rows):
+            return sorted(tuple(round(v, 6) if isinstance(v, float) else v for v in row) for row in rows)
+
+        return {
+            "trips": rounded(Trip.objects.values_list("user_id", "started_at", "ended_at", "distance_m", "points")),
+            "stops": rounded(Stop.objects.values_list("user_id", "started_at", "ended_at", "lat", "points")),
+            "stats": rounded(RoomTravelStats.objects.values_list("user_id", "distance_m", "trips", "stops")),
+            "open": rounded(
+                (user_id, json.dumps(state, sort_keys=True))
+                for user_id, state in SegmentationState.objects.values_list("user_id", "state")
+            ),
+        }
+
+    def test_resumed_run_matches_full_run(self):
+        RoomTravelStats.objects.all().delete()
+        Movement.objects.all().delete()
+        start = timezone.now().timestamp() - 1020
+        tracks = [(user, walk_stop_walk(51.5 + n / 100, t0=start)) for n, user in enumerate(self.members[:2])]
+
+        def store(fixes_by_user):
+            for user, fixes in fixes_by_user:
+                for lat, lng, ts in fixes:
+                    m = Movement.objects.create(user=user, room=self.room, latitude=lat, longitude=lng)
+                    Movement.objects.filter(pk=m.pk).update(created_at=segmentation._dt(ts))
+
+        # Two runs, the checkpoint and open segments carried between them
+        store((user, fixes[:15]) for user, fixes in tracks)
+        segmentation.run_segmentation(batch_size=7)
+        store((user, fixes[15:]) for user, fixes in tracks)
+        report = segmentation.run_segmentation(batch_size=7)
+        self.assertEqual((report["trips"], report["stops"]), (2, 2))
+        resumed = self.stored()
+
+        segmentation.run_segmentation(rebuild=True)
+        self.assertEqual(self.stored(), resumed)
+        self.assertEqual(len(resumed["trips"]), 2)
+        self.assertEqual(len(resumed["open"]), 2)
+
+        # Once their last fix is older than the gap, open trips are closed
+        with override_settings(SEGMENT_GAP_SECONDS=0):
+            report = segmentation.run_segmentation()
+        self.assertEqual((report["fixes"], report["trips"]), (0, 2))
+        self.assertFalse(SegmentationState.objects.exists())
+
+    def test_idle_close_selects_idle_states(self):
+        Movement.objects.all().delete()
+        now = time.time()
+        SegmentationState.objects.bulk_create(
+            [
+                SegmentationState(user=u, room=self.room, state={"last": [51.5, -0.12, ts]}, last_ts=ts)
+                for i, u in enumerate(self.members[:50])
+                for ts in [now - 1000 if i % 2 else now - 10]
+            ]
+        )
+        # checkpoint read and created, last pk, idle pairs, their rows locked, one
+        # delete for all closed states, and the transaction's savepoint pair
+        with self.assertQueryBudget(8):
+            segmentation.run_segmentation()
+        self.assertEqual(
+            set(SegmentationState.objects.values_list("user_id", flat=True)), {u.id for u in self.members[:50:2]}
+        )
+
+
+class CompactStorageTests(ApiTestCase):
+    def test_encodings_round_trip(self):
+        for value in (51.5003, -0.1236, 89.9999999, -179.9999999, 0.0):
+            self.assertAlmostEqual(movement_store.encode_coord(value) / COORD_SCALE, value, places=9)
+            fix = CompactMovement(latitude=value, longitude=-value)
+            self.assertAlmostEqual(fix.latitude, value, places=9)
+            self.assertAlmostEqual(fix.longitude, -value, places=9)
+        for dt in (MOVEMENT_EPOCH, timezone.now(), datetime(2031, 7, 1, 12, 30, 15, 999999, tzinfo=dt_timezone.utc)):
+            self.assertEqual(movement_store.decode_ts(movement_store.encode_ts(dt)), dt)
+            # Stored whole seconds truncate
+            self.assertEqual(movement_store.decode_ts(int(movement_store.encode_ts(dt))), dt.replace(microsecond=0))
+
+    def test_filters_round_inwards(self):
+        half_second = MOVEMENT_EPOCH + timedelta(seconds=10.5)
+        self.assertEqual(
+            movement_store.compact_filters({
+                "latitude__gte": 51.50000005,
+                "latitude__lt": 51.50000005,
+                "longitude__lte": -0.12340005,
+                "longitude__gt": -0.12340005,
+                "latitude": 51.5,
+                "created_at__gte": half_second,
+                "created_at__lte": half_second,
+                "room_id": "ROOM",
+            }),
+            {
+                "lat_e7__gte": 515000001,
+                "lat_e7__lt": 515000001,
+                "lng_e7__lte": -1234001,
+                "lng_e7__gt": -1234001,
+                "lat_e7": 515000000,
+                "ts__gte": 11,
+                "ts__lte": 10,
+                "room_id": "ROOM",
+            },
+        )
+
+    def reads(self):
+        """What the read paths answer, with times cut to the compact store's whole seconds."""
+        cache.clear()
+        path = [{"lat": 51.5, "lng": -0.124}, {"lat": 51.502, "lng": -0.1236}]
+        predict = self.post("/api/traffic/predict", {"room_id": self.room.id, "path": path, "parallel": False}).data
+        snapshot = self.post("/api/rooms/snapshot", {"room_id": self.room.id}).data["positions"]
+        bbox = {
+            "latitude__gte": 51.50005, "latitude__lt": 51.50105, "longitude__gte": -0.12395, "longitude__lte": -0.1237,
+        }
+        return {
+            "positions": {
+                user_id: (round(lat, 9), round(lng, 9), at.replace(microsecond=0))
+                for user_id, (lat, lng, at) in movement_store.latest_positions(self.room.id).items()
+            },
+            "snapshot": [(p["user_id"], p["username"], round(p["lat"], 9)) for p in snapshot],
+            "counted": predict["counted_movements"],
+            "indices": predict["node_indices"],
+            "in_bbox": movement_store.filter_movements(**bbox).count(),
+        }
+
+    def assertSameReads(self, reads, expected):
+        self.assertEqual(len(reads["indices"]), len(expected["indices"]))
+        for index, expected_index in zip(reads["indices"], expected["indices"]):
+            # Decay weights move a little with the truncated seconds
+            self.assertAlmostEqual(index, expected_index, delta=0.5)
+        del reads["indices"], expected["indices"]
+        self.assertEqual(reads, expected)
+
+    def assertPksFollowTime(self, model, time_field):
+        times = list(model.objects.order_by("pk").values_list(time_field, flat=True))
+        self.assertEqual(times, sorted(times))
+
+    def test_reads_and_writes_match_float_storage(self):
+        # A fix that arrived late: highest pk, oldest time
+        late = Movement.objects.create(user=self.members[0], room=self.room, latitude=51.5001, longitude=-0.124)
+        Movement.objects.filter(pk=late.pk).update(created_at=timezone.now() - timedelta(minutes=30))
+        Movement.objects.filter(pk__lt=late.pk).update(created_at=timezone.now() - timedelta(minutes=5))
+        expected = self.reads()
+        total = Movement.objects.count()
+
+        call_command("migrate_movement_storage", "--to", "compact", "--batch-size", "400", stdout=io.StringIO())
+        self.assertEqual((Movement.objects.count(), CompactMovement.objects.count()), (0, total))
+        self.assertPksFollowTime(CompactMovement, "ts")
+        with override_settings(MOVEMENT_STORAGE="compact"):
+            self.assertSameReads(self.reads(), expected)
+            # Writes land in the compact table and read back as floats
+            self.post(
+                "/api/movement/record",
+                {"user_id": self.members[1].id, "room_id": self.room.id, "latitude": 51.5123456, "longitude": -0.1},
+                client=APIClient(),
+            )
+            self.assertEqual(CompactMovement.objects.count(), total + 1)
+            lat, lng, _ = movement_store.latest_positions(self.room.id)[self.members[1].id]
+            self.assertEqual((lat, lng), (51.5123456, -0.1))
+            expected = self.reads()
+
+        call_command("migrate_movement_storage", "--to", "float", "--batch-size", "400", stdout=io.StringIO())
+        self.assertEqual((Movement.objects.count(), CompactMovement.objects.count()), (total + 1, 0))
+        self.assertPksFollowTime(Movement, "created_at")
+        self.assertSameReads(self.reads(), expected)
+
+    def test_migration_refuses_to_interleave(self):
+        CompactMovement.objects.create(
+            user=self.creator, room=self.room, lat_e7=0, lng_e7=0, ts=int(movement_store.encode_ts(timezone.now())) + 60
+        )
+        with self.assertRaises(CommandError):
+            call_command("migrate_movement_storage", "--to", "compact", stdout=io.StringIO())
+        self.assertEqual(CompactMovement.objects.count(), 1)
+
+
+class ArchiveTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        override = override_settings(MOVEMENT_ARCHIVE_DIR=tmp.name, MOVEMENT_ARCHIVE_AFTER_DAYS=30)
+        override.enable()
+        self.addCleanup(override.disable)
+        # 40 and 35 days old: archived; 10 days old: stays in the database
+        self.old = []
+        for days in (40, 35, 10):
+            created_at = timezone.now() - timedelta(days=days)
+            for i, user in enumerate(self.members[:20]):
+                m = Movement.objects.create(user=user, room=self.room, latitude=51.5 + i / 10000, longitude=-0.1238)
+                Movement.objects.filter(pk=m.pk).update(created_at=created_at + timedelta(seconds=i))
+                if days > 30:
+                    self.old.append((created_at + timedelta(seconds=i), user.id, 51.5 + i / 10000))
+
+    def predict(self, **extra):
+        path = [{"lat": 51.5, "lng": -0.124}, {"lat": 51.502, "lng": -0.1236}]
+        body = {"room_id": self.room.id, "path": path, "parallel": False, "window_minutes": 60 * 24 * 45, **extra}
+        return self.post("/api/traffic/predict", body).data
+
+    def test_archive_moves_cold_days(self):
+        before = Movement.objects.count()
+        report = archive.archive_movements()
+        self.assertEqual(report["days"], 2)
+        self.assertEqual(report["rows"], 40)
+        self.assertEqual(Movement.objects.count(), before - 40)
+
+        restored = []
+        for entry in MovementArchive.objects.order_by("day"):
+            cols = archive.load(entry)
+            self.assertTrue(np.all(np.diff(cols["ts"]) >= 0))
+            restored += [
+                (archive._from_us(ts), user_id, lat)
+                for ts, user_id, lat in zip(cols["ts"].tolist(), cols["user"].tolist(), cols["lat"].tolist())
+            ]
+        self.assertEqual(restored, self.old)
+        # Nothing cold is left: a rerun is a no-op
+        self.assertEqual(archive.archive_movements()["rows"], 0)
+
+        # Archives of deleted rooms are removed on the next run
+        self.assertEqual(archive.archive_movements()["pruned"], 0)
+        self.room.delete()
+        self.assertEqual(archive.archive_movements()["pruned"], 1)
+        self.assertFalse(archive.day_dir(self.room.id, timezone.now().date()).parent.exists())
+
+    def late_fixes(self):
+        """Two fixes for an already archived day, between its archived ones."""
+        late = []
+        for i, user in enumerate(self.members[:2]):
+            created_at = self.old[0][0] + timedelta(seconds=i, milliseconds=500)
+            m = Movement.objects.create(user=user, room=self.room, latitude=51.6, longitude=-0.1238)
+            Movement.objects.filter(pk=m.pk).update(created_at=created_at)
+            late.append((created_at, user.id, 51.6))
+        return late
+
+    def archived_day(self, day):
+        entry = MovementArchive.objects.get(room=self.room, day=day)
+        cols = archive.load(entry)
+        rows = [
+            (archive._from_us(ts), user_id, lat)
+            for ts, user_id, lat in zip(cols["ts"].tolist(), cols["user"].tolist(), cols["lat"].tolist())
+        ]
+        return entry, rows
+
+    def test_late_fixes_merge_into_a_new_generation(self):
+        archive.archive_movements()
+        day = self.old[0][0].date()
+        late = self.late_fixes()
+        report = archive.archive_movements()
+        self.assertEqual((report["rows"], report["superseded"]), (2, 1))
+
+        entry, rows = self.archived_day(day)
+        self.assertEqual(entry.generation, 1)
+        self.assertEqual(rows, sorted(self.old[:20] + late))
+        self.assertEqual(entry.max_lat, 51.6)
+        self.assertFalse(archive.day_dir(self.room.id, day).exists())
+        self.assertFalse(Movement.objects.filter(latitude=51.6).exists())
+
+    def test_merge_crash_before_the_index_update_loses_nothing(self):
+        archive.archive_movements()
+        day = self.old[0][0].date()
+        late = self.late_fixes()
+        with mock.patch.object(archive.transaction, "atomic", side_effect=RuntimeError("crash")):
+            with self.assertRaises(RuntimeError):
+                archive.archive_day(self.room.id, day)
+        # Readers still get the indexed generation; the late fixes stay stored
+        entry, rows = self.archived_day(day)
+        self.assertEqual((entry.generation, rows), (0, self.old[:20]))
+        self.assertEqual(Movement.objects.filter(latitude=51.6).count(), 2)
+
+        self.assertEqual(archive.archive_movements()["rows"], 2)
+        entry, rows = self.archived_day(day)
+        self.assertEqual((entry.generation, rows), (1, sorted(self.old[:20] + late)))
+
+    def test_archiving_needs_an_explicit_directory(self):
+        before = Movement.objects.count()
+        with override_settings(MOVEMENT_ARCHIVE_DIR=""):
+            with self.assertRaises(CommandError):
+                call_command("archive_movements", stdout=io.StringIO())
+            # Nothing archived yet: readers do not need the directory
+            self.assertEqual(len(movement_store.latest_positions(self.room.id)), MEMBERS)
+        self.assertEqual(Movement.objects.count(), before)
+
+    def test_predict_traffic_reads_archive(self):
+        expected = self.predict()
+        archive.archive_movements()
+        response = self.predict()
+        self.assertEqual(response["counted_archived"], 40)
+        self.assertEqual(response["counted_movements"], expected["counted_movements"])
+        self.assertEqual(response["node_indices"], expected["node_indices"])
+
+    def test_snapshot_reads_archive(self):
+        def snapshot(at):
+            body = {"room_id": self.room.id, "at": at.isoformat()}
+            return {p["user_id"]: (p["lat"], p["recorded_at"]) for p in self.post("/api/rooms/snapshot", body).data["positions"]}
+
+        # A member whose every fix gets archived
+        gone = User.objects.create_user("gone", "gone@example.com", "Secret123")
+        Membership.objects.create(user=gone, room=self.room)
+        m = Movement.objects.create(user=gone, room=self.room, latitude=51.6, longitude=-0.1)
+        Movement.objects.filter(pk=m.pk).update(created_at=timezone.now() - timedelta(days=38))
+
+        past = timezone.now() - timedelta(days=37)
+        expected_past = snapshot(past)
+        expected_now = movement_store.latest_positions(self.room.id)
+        self.assertEqual(len(expected_past), 21)
+        archive.archive_movements()
+        cache.clear()
+
+        self.assertEqual(snapshot(past), expected_past)
+        self.assertEqual(movement_store.latest_positions(self.room.id), expected_now)
+        self.assertEqual(movement_store.latest_positions(self.room.id)[gone.id][:2], (51.6, -0.1))
+        self.assertNotIn(gone.id, movement_store.latest_positions(self.room.id, archived=False))
+
+    def test_profiles_fold_archived_days(self):
+        build_profiles(rebuild=True)
+        expected = set(TrafficProfile.objects.values_list("cell_x", "cell_y", "hour_of_week", "count"))
+        archive.archive_movements()
+        build_profiles(rebuild=True)
+        self.assertEqual(set(TrafficProfile.objects.values_list("cell_x", "cell_y", "hour_of_week", "count")), expected)
+
+
+class AdminTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.admin_user = User.objects.create_superuser("root", "root@example.com", "Secret123")
+        self.client.force_login(self.admin_user)
+
+    def test_changelists_count_a_bounded_number_of_rows(self):
+        # session, user, count, page (Movement adds the date hierarchy's min/max and dates)
+        for url, budget in (
+            ("/admin/api/movement/", 6),
+            ("/admin/api/movement/?q=" + self.room.id, 6),
+            ("/admin/api/room/", 4),
+            ("/admin/api/membership/", 4),
+        ):
+            with self.assertQueryBudget(budget) as ctx:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            count_sql = next(q["sql"] for q in ctx.captured_queries if "COUNT(" in q["sql"])
+            self.assertIn("LIMIT 10000", count_sql)
+
+    @override_settings(ADMIN_DELETE_BATCH_SIZE=400)
+    def test_delete_selected_across_pages_in_batches(self):
+        url = "/admin/api/movement/?q=" + self.room.id
+        first = Movement.objects.filter(room=self.room).values_list("pk", flat=True)[:1]
+        body = {"action": "delete_selected", "index": 0, "select_across": 1, ACTION_CHECKBOX_NAME: list(first)}
+        response = self.client.post(url, body)
+        self.assertContains(response, "Movements: 1500")
+        self.assertContains(response, 'name="select_across" value="1"')
+
+        del body["index"]
+        body["post"] = "yes"
+        with CaptureQueriesContext(connections["default"]) as ctx:
+            self.client.post(url, body)
+        self.assertFalse(Movement.objects.filter(room=self.room).exists())
+        deletes = [q["sql"] for q in ctx.captured_queries if q["sql"].startswith("DELETE")]
+        self.assertEqual(len(deletes), 4)
+
+    @override_settings(ADMIN_DELETE_BATCH_SIZE=400)
+    def test_delete_room_batches_movements(self):
+        # session, user, room (in a savepoint): the confirmation page does not load the room's movements
+        with self.assertQueryBudget(5):
+            response = self.client.get(f"/admin/api/room/{self.room.id}/delete/")
+        self.assertContains(response, "1 room")
+        response = self.client.post(f"/admin/api/room/{self.room.id}/delete/", {"post": "yes"})
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(Room.objects.filter(id=self.room.id).exists())
+        self.assertFalse(Movement.objects.filter(room_id=self.room.id).exists())
+
+
+class StubGeocoder(BaseHTTPRequestHandler):
+    """Nominatim stand-in: /search answers `limit` places named after q, /details knows ways below 1000."""
+    hits = []
+    delay = 0.0
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        StubGeocoder.hits.append((url.path, params))
+        time.sleep(StubGeocoder.delay)
+        if url.path == "/search":
+            body = [
+                {"place_id": i, "display_name": f"{params['q']} {i}", "lat": "51.5", "lon": "-0.12", "osm_type": "way"}
+                for i in range(int(params["limit"]))
+            ]
+        elif url.path == "/details" and int(params["osmid"]) < 1000:
+            body = {"osm_type": params["osmtype"], "osm_id": int(params["osmid"]), "geometry": {"type": "LineString"}}
+        else:
+            self.send_response(404)
+            self.end_headers()
+            return
+        data = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+class GeocodeTests(StubServerMixin, ApiTestCase):
+    stub_handler = StubGeocoder
+
+    def setUp(self):
+        super().setUp()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        override = override_settings(
+            GEOCODER_URL=self.stub_url,
+            GEOCODER_CACHE_PATH=f"{tmp.name}/geocoder.sqlite3",
+            GEOCODER_FETCH_LIMIT=10,
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+        geocoding._memory.clear()
+        StubGeocoder.hits = []
+        StubGeocoder.delay = 0.0
+
+    def search(self, q, **extra):
+        return self.post("/api/geocode/search", {"q": q, **extra})
+
+    def test_search_is_cached_by_normalised_query(self):
+        # Authentication only: the proxy does not touch the database
+        with self.assertQueryBudget(1):
+            response = self.search("  Big  BEN ", limit=10)
+        self.assertEqual(response.data["q"], "big ben")
+        self.assertEqual(len(response.data["results"]), 10)
+        self.assertEqual(StubGeocoder.hits, [("/search", {
+            "q": "big ben", "format": "json", "addressdetails": "1", "extratags": "1", "limit": "10",
+            "accept-language": "en",
+        })])
+
+        # Same text on Enter: the first result, from the cached list
+        response = self.search("big ben", limit=1)
+        self.assertEqual(response.data["results"], [{
+            "place_id": 0, "display_name": "big ben 0", "lat": "51.5", "lon": "-0.12", "osm_type": "way",
+        }])
+        self.assertEqual(len(StubGeocoder.hits), 1)
+
+        # Callers close together share a biased entry
+        self.search("big ben", near={"lat": 51.501, "lng": -0.124})
+        self.search("big ben", near={"lat": 51.52, "lng": -0.11})
+        self.assertEqual(len(StubGeocoder.hits), 2)
+        self.assertEqual(StubGeocoder.hits[1][1]["viewbox"], "-0.2000,51.4000,0.0000,51.6000")
+
+    def test_disk_tier_survives_restart_until_expiry(self):
+        self.search("camden market")
+        geocoding._memory.clear()
+        self.assertEqual(len(self.search("camden market").data["results"]), 10)
+        self.assertEqual(len(StubGeocoder.hits), 1)
+
+        geocoding._db().execute("UPDATE entries SET expires = 0")
+        geocoding._memory.clear()
+        self.search("camden market")
+        self.assertEqual(len(StubGeocoder.hits), 2)
+
+    def test_disk_tier_keeps_most_recently_used(self):
+        with override_settings(GEOCODER_DISK_ENTRIES=2):
+            for q in ("alpha", "bravo", "charlie"):
+                geocoding.search(q, 1)
+                time.sleep(0.01)
+            geocoding._memory.clear()
+            geocoding.search("alpha", 1)
+            geocoding.prune()
+        keys = [k for k, in geocoding._db().execute("SELECT key FROM entries ORDER BY key")]
+        self.assertEqual(keys, ["search:alpha", "search:charlie"])
+
+    def test_identical_lookups_in_flight_are_coalesced(self):
+        StubGeocoder.delay = 0.3
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(geocoding.search("tate modern", 5))) for _ in range(5)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(len(StubGeocoder.hits), 1)
+        self.assertEqual(len(results), 5)
+        self.assertTrue(all(r == results[0] for r in results))
+
+    def test_waits_for_another_workers_fetch(self):
+        # Another worker claimed the lookup; its answer lands in the shared file
+        db = geocoding._db()
+        db.execute("INSERT INTO claims VALUES (?, ?)", ("search:soho", time.time()))
+        answer = [{"display_name": "Soho, from the other worker"}]
+
+        def other_worker():
+            time.sleep(0.2)
+            other = sqlite3.connect(settings.GEOCODER_CACHE_PATH, isolation_level=None)
+            other.execute("INSERT INTO entries VALUES (?, ?, ?, ?)", ("search:soho", json.dumps(answer), time.time() + 60, 0))
+            other.execute("DELETE FROM claims")
+            other.close()
+
+        threading.Thread(target=other_worker).start()
+        self.assertEqual(geocoding.search("Soho", 10), answer)
+        self.assertEqual(StubGeocoder.hits, [])
+
+    def test_unusable_cache_file_is_skipped(self):
+        # The cache directory cannot be created under a regular file
+        with tempfile.NamedTemporaryFile() as f, override_settings(GEOCODER_CACHE_PATH=f"{f.name}/geocoder.sqlite3"):
+            self.assertEqual(len(geocoding.search("soho", 10)), 10)
+        self.assertEqual(len(StubGeocoder.hits), 1)
+
+    def test_leader_errors_reach_followers(self):
+        started = threading.Event()
+        errors = []
+
+        def fetch():
+            started.set()
+            time.sleep(0.2)
+            raise ValueError("broken answer")
+
+        def follower():
+            started.wait()
+            try:
+                geocoding._cached("search:broken", lambda: [])
+            except ValueError as e:
+                errors.append(e)
+
+        thread = threading.Thread(target=follower)
+        thread.start()
+        with self.assertRaises(ValueError):
+            geocoding._cached("search:broken", fetch)
+        thread.join()
+        self.assertEqual([str(e) for e in errors], ["broken answer"])
+
+    def test_details_and_errors(self):
+        response = self.post("/api/geocode/details", {"osm_type": "way", "osm_id": 123})
+        self.assertEqual(response.data["place"]["geometry"], {"type": "LineString"})
+        self.post("/api/geocode/details", {"osm_type": "W", "osm_id": "123"})
+        self.assertEqual(StubGeocoder.hits[0][1]["polygon_geojson"], "1")
+        self.assertEqual(len(StubGeocoder.hits), 1)
+
+        self.assertEqual(self.post("/api/geocode/details", {"osm_type": "W", "osm_id": 5000}).status_code, 404)
+        self.assertEqual(self.post("/api/geocode/details", {"osm_type": "X", "osm_id": 1}).status_code, 400)
+        self.assertEqual(self.search("a").status_code, 400)
+        self.assertEqual(self.search("big ben", near={"lat": 100, "lng": 0}).status_code, 400)
+        with override_settings(GEOCODER_URL="http://127.0.0.1:9"):
+            self.assertEqual(self.search("nowhere").status_code, 502)
+
+
+class JobQueryTests(ApiTestCase):
+    def test_job_status_and_result(self):
+        job = enqueue("traffic.build_profiles", {}, user=self.creator)
+        Job.objects.filter(pk=job.pk).update(status=Job.DONE, result={"folded_days": 0})
+        with self.assertQueryBudget(2):
+            response = self.post("/api/jobs/status", {"job_id": job.id})
+        self.assertEqual(response.data["status"], Job.DONE)
+        with self.assertQueryBudget(2):
+            response = self.post("/api/jobs/result", {"job_id": job.id})
+        self.assertEqual(response.data["folded_days"], 0)
+
+
+class JobQueueTests(TestCase):
+    def setUp(self):
+        patch = mock.patch.dict(jobs.HANDLERS, {"test.echo": lambda params: params})
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def age(self, job, **fields):
+        Job.objects.filter(pk=job.pk).update(**{f: timezone.now() - timedelta(seconds=s) for f, s in fields.items()})
+
+    def test_claim_is_exclusive(self):
+        job = enqueue("test.echo", {"n": 1})
+        self.assertEqual(jobs.claim_next("a").id, job.id)
+        self.assertIsNone(jobs.claim_next("b"))
+
+        # b picked the job as a candidate, then a claimed it before b's UPDATE
+        job = enqueue("test.echo", {"n": 2})
+        claimed_first = []
+
+        def now():
+            if not claimed_first:
+                claimed_first.append(None)
+                claimed_first[0] = jobs.claim_next("a")
+            return timezone.now()
+
+        with mock.patch.object(jobs, "timezone", SimpleNamespace(now=now)):
+            self.assertIsNone(jobs.claim_next("b"))
+        self.assertEqual(claimed_first[0].id, job.id)
+        job.refresh_from_db()
+        self.assertEqual((job.worker, job.attempts), ("a", 1))
+
+    def test_max_running_bounds_claims(self):
+        for n in range(3):
+            enqueue("test.echo", {"n": n})
+        with override_settings(JOBS_MAX_RUNNING=2):
+            first, second = jobs.claim_next("a"), jobs.claim_next("b")
+            self.assertIsNone(jobs.claim_next("c"))
+            jobs.run(first)
+            third = jobs.claim_next("c")
+        self.assertEqual({first.params["n"], second.params["n"], third.params["n"]}, {0, 1, 2})
+        self.assertEqual(Job.objects.get(pk=first.pk).result, first.params)
+
+    def test_lost_job_is_requeued_then_failed(self):
+        job = enqueue("test.echo", {})
+        with override_settings(JOBS_LEASE_SECONDS=60, JOBS_MAX_ATTEMPTS=2):
+            claimed = jobs.claim_next("a")
+            jobs.heartbeat([job.id], "a")
+            self.assertEqual(jobs.recover_stale(), (0, 0))
+
+            self.age(job, heartbeat_at=61)
+            self.assertEqual(jobs.recover_stale(), (1, 0))
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.worker), (Job.QUEUED, ""))
+            # The lost worker cannot finish a job it no longer holds
+            jobs.run(claimed)
+            self.assertEqual(Job.objects.get(pk=job.pk).status, Job.QUEUED)
+
+            jobs.claim_next("b")
+            self.age(job, heartbeat_at=61)
+            self.assertEqual(jobs.recover_stale(), (0, 1))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.error, job.attempts), (Job.FAILED, "worker lost", 2))
+        self.assertIsNotNone(job.expires_at)
+
+    def test_finished_jobs_are_purged_after_ttl(self):
+        expired, kept, queued = (enqueue("test.echo", {"n": n}) for n in range(3))
+        for job in (expired, kept):
+            jobs.run(jobs.claim_next("a"))
+        self.age(expired, expires_at=1)
+        self.assertEqual(jobs.purge_expired(), 1)
+        self.assertEqual(set(Job.objects.values_list("pk", flat=True)), {kept.pk, queued.pk})
+
+
+class ChecksTests(TestCase):
+    def test_shared_cache_required_outside_debug(self):
+        with override_settings(REQUIRE_SHARED_CACHE=True):
+            self.assertEqual([e.id for e in shared_cache_check(None)], ["api.E001"])
+            redis = {"default": {"BACKEND": "django.core.cache.backends.redis.RedisCache", "LOCATION": "redis://x"}}
+            with override_settings(CACHES=redis):
+                self.assertEqual(shared_cache_check(None), [])
+        with override_settings(REQUIRE_SHARED_CACHE=False):
+            self.assertEqual(shared_cache_check(None), [])
+
 
-# Create your tests here.
+class QueryReportTests(QueryBudgetMixin, TestCase):
+    def test_report_flags_repeated_statements(self):
+        captured = [{"sql": f'SELECT * FROM "auth_user" WHERE "id" = {i}'} for i in range(3)]
+        report = format_queries(captured)
+        self.assertIn("3. SELECT", report)
+        self.assertIn('x3: SELECT * FROM "auth_user" WHERE "id" = ?', report)
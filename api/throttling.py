@@ -0,0 +1,120 @@
+"""
+Token-bucket throttling of movement ingestion, with state in the cache.
+
+Each bucket is stored as one number, its "theoretical arrival time" (the
+GCRA form of a token bucket): a fix is admitted when it does not push that
+time more than `burst` intervals past now. Every fix must fit both the
+sender's bucket and its room's; a rejected fix consumes from neither, so
+a flooding client cannot drain its room's budget for everyone else.
+
+The room bucket only applies when INGEST_ROOM_RATE is set (off by default,
+see settings). Rejections are counted per user and per room in windows of
+INGEST_REJECTED_WINDOW_SECONDS, each counter expiring after its window;
+room_stats reports the room's count for the current window.
+
+The buckets only hold globally if the cache is shared by all workers (see
+api/checks.py). Buckets are read with one get_many and written back with a
+set each, so concurrent workers can let a few extra fixes through at the
+edge; that is the price of not locking on the hot path. If the cache is
+unreachable, ingestion is admitted (fail open) rather than blocked.
+"""
+import logging
+import math
+import re
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+_IDENT = re.compile(r"^[\w-]{1,64}$")
+REJECTED_KEY = "ingest-rejected:{scope}:{ident}:{window}"
+
+
+def valid_ident(value):
+    """True if value can be used in a bucket key (ids sent by the caller)."""
+    return bool(_IDENT.match(str(value)))
+
+
+def _buckets(user_id, room_id):
+    buckets = [("user", f"ingest-bucket:user:{user_id}", settings.INGEST_USER_RATE, settings.INGEST_USER_BURST)]
+    if settings.INGEST_ROOM_RATE > 0:
+        buckets.append(
+            ("room", f"ingest-bucket:room:{room_id}", settings.INGEST_ROOM_RATE, settings.INGEST_ROOM_BURST)
+        )
+    return buckets
+
+
+def _window(now):
+    return int(now // settings.INGEST_REJECTED_WINDOW_SECONDS)
+
+
+def _count_rejected(scope, ident, now):
+    window = _window(now)
+    key = REJECTED_KEY.format(scope=scope, ident=ident, window=window)
+    # Kept until its window is over, then left to expire
+    timeout = math.ceil((window + 1) * settings.INGEST_REJECTED_WINDOW_SECONDS - now) + 1
+    if not cache.add(key, 1, timeout=timeout):
+        try:
+            cache.incr(key)
+        except ValueError:
+            # Expired or evicted between add and incr
+            cache.set(key, 1, timeout=timeout)
+
+
+def check_ingest(user_id, room_id, now=None):
+    """
+    Take one token from the user's and the room's bucket.
+
+    Returns None when the fix is admitted, otherwise a dict with the
+    limiting scope ("user" or "room"), retry_after (seconds until a token
+    is free) and suggested_interval_ms (the sustained rate that bucket
+    allows).
+    """
+    if not settings.INGEST_THROTTLE:
+        return None
+    now = time.time() if now is None else now
+    buckets = _buckets(user_id, room_id)
+    try:
+        stored = cache.get_many([key for _, key, _, _ in buckets])
+    except Exception:
+        logger.warning("ingest throttle cache unavailable; admitting fix", exc_info=True)
+        return None
+
+    updates = {}
+    for scope, key, rate, burst in buckets:
+        interval = 1.0 / rate
+        tat = max(stored.get(key, now), now) + interval
+        allowed_at = tat - burst * interval
+        if allowed_at > now:
+            _count_rejected("user", user_id, now)
+            _count_rejected("room", room_id, now)
+            return {
+                "scope": scope,
+                "retry_after": allowed_at - now,
+                "suggested_interval_ms": math.ceil(interval * 1000),
+            }
+        updates[key] = (tat, math.ceil(tat - now) + 1)
+
+    try:
+        for key, (tat, ttl) in updates.items():
+            cache.set(key, tat, timeout=ttl)
+    except Exception:
+        logger.warning("ingest throttle cache unavailable; bucket not updated", exc_info=True)
+    return None
+
+
+def rejected_counts(user_id=None, room_id=None, now=None):
+    """
+    Fixes rejected in the current window for a user and/or room, e.g.
+    {"user": 12, "room": 40}.
+    """
+    window = _window(time.time() if now is None else now)
+    keys = {}
+    if user_id is not None:
+        keys["user"] = REJECTED_KEY.format(scope="user", ident=user_id, window=window)
+    if room_id is not None:
+        keys["room"] = REJECTED_KEY.format(scope="room", ident=room_id, window=window)
+    stored = cache.get_many(list(keys.values()))
+    return {scope: stored.get(key, 0) for scope, key in keys.items()}
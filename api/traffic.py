@@ -0,0 +1,145 @@
+"""
+Traffic scoring helpers used by the analytics endpoints.
+
+A path is a list of {"lat", "lng"} dicts. Movement points are scored against
+the closest segment of each path; the contribution decays linearly with the
+distance to the segment and exponentially with the age of the point.
+"""
+import math
+
+METERS_PER_DEG_LAT = 111000.0
+
+
+def haversine_meters(lat1, lon1, lat2, lon2):
+    R = 6371000.0
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    dphi = math.radians(lat2 - lat1)
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+    return R * c
+
+
+def point_to_segment_distance_m(p_lat, p_lng, a_lat, a_lng, b_lat, b_lng):
+    # Approximate: project to local meters using haversine for legs
+    # Convert to a simple 2D plane by using meters relative to A
+    ax = 0.0
+    ay = 0.0
+    bx = haversine_meters(a_lat, a_lng, a_lat, b_lng) * (1 if b_lng > a_lng else -1)
+    by = haversine_meters(a_lat, a_lng, b_lat, a_lng) * (1 if b_lat > a_lat else -1)
+    px = haversine_meters(a_lat, a_lng, a_lat, p_lng) * (1 if p_lng > a_lng else -1)
+    py = haversine_meters(a_lat, a_lng, p_lat, a_lng) * (1 if p_lat > a_lat else -1)
+    abx = bx - ax
+    aby = by - ay
+    apx = px - ax
+    apy = py - ay
+    ab_len2 = abx * abx + aby * aby
+    if ab_len2 == 0:
+        # A and B are the same point
+        return math.hypot(apx, apy)
+    t = max(0.0, min(1.0, (apx * abx + apy * aby) / ab_len2))
+    cx = ax + t * abx
+    cy = ay + t * aby
+    return math.hypot(px - cx, py - cy)
+
+
+def clean_path(path):
+    """
+    Validate and normalize path points. Raises ValueError with the index of
+    the first bad point.
+    """
+    cleaned = []
+    for idx, p in enumerate(path):
+        try:
+            lat = float(p.get("lat"))
+            lng = float(p.get("lng"))
+            if not (math.isfinite(lat) and math.isfinite(lng)):
+                raise ValueError("non-finite")
+        except Exception:
+            raise ValueError(f"invalid path point at index {idx}")
+        cleaned.append({"lat": lat, "lng": lng})
+    return cleaned
+
+
+def padded_bbox(paths, radius_m):
+    """
+    Bounding box (lat_min, lat_max, lng_min, lng_max) around all points of
+    all paths, padded by radius_m (approximate meters->degrees).
+    """
+    lats = [p["lat"] for path in paths for p in path]
+    lngs = [p["lng"] for path in paths for p in path]
+    lat_min, lat_max = min(lats), max(lats)
+    lng_min, lng_max = min(lngs), max(lngs)
+    mean_lat = (lat_min + lat_max) / 2.0
+    meters_per_deg_lng = max(1e-6, METERS_PER_DEG_LAT * max(0.1, math.cos(math.radians(mean_lat))))
+    dlat = radius_m / METERS_PER_DEG_LAT
+    dlng = radius_m / meters_per_deg_lng
+    return lat_min - dlat, lat_max + dlat, lng_min - dlng, lng_max + dlng
+
+
+def decay_lambda_for(window_minutes):
+    decay_half_life_min = max(10, window_minutes // 4)  # simple time decay
+    return math.log(2) / decay_half_life_min
+
+
+def score_points(points, paths, radius_m, window_end, decay_lambda):
+    """
+    Score (latitude, longitude, created_at) points against every path in a
+    single pass.
+
+    Each path only looks at points inside its own padded bounding box, so a
+    point far from a route costs a comparison, not a segment scan.
+
+    Returns (node_scores, counted) where node_scores[i] is the raw score list
+    for paths[i] and counted is the number of points consumed.
+    """
+    prepared = []
+    for path in paths:
+        segments = [
+            (path[i]["lat"], path[i]["lng"], path[i + 1]["lat"], path[i + 1]["lng"])
+            for i in range(len(path) - 1)
+        ]
+        prepared.append((padded_bbox([path], radius_m), segments))
+    node_scores = [[0.0] * len(path) for path in paths]
+
+    counted = 0
+    for lat, lng, created_at in points:
+        counted += 1
+        time_weight = None
+        for scores, ((lat_lo, lat_hi, lng_lo, lng_hi), segments) in zip(node_scores, prepared):
+            if not (lat_lo <= lat <= lat_hi and lng_lo <= lng <= lng_hi):
+                continue
+
+            # Distance to closest segment
+            min_dist = float("inf")
+            min_seg_index = -1
+            for idx, (a_lat, a_lng, b_lat, b_lng) in enumerate(segments):
+                d = point_to_segment_distance_m(lat, lng, a_lat, a_lng, b_lat, b_lng)
+                if d < min_dist:
+                    min_dist = d
+                    min_seg_index = idx
+
+            if min_dist <= radius_m and min_seg_index >= 0:
+                if time_weight is None:
+                    # recency weight (minutes ago)
+                    minutes_ago = max(0.0, (window_end - created_at).total_seconds() / 60.0)
+                    time_weight = math.exp(-decay_lambda * minutes_ago)
+                # Distribute score to the segment endpoints
+                contribution = (1.0 - (min_dist / radius_m)) * time_weight
+                scores[min_seg_index] += contribution
+                scores[min_seg_index + 1] += contribution
+    return node_scores, counted
+
+
+def to_indices(node_scores, max_score=None):
+    """
+    Normalize raw node scores to a 0..100 scale. Pass a shared max_score to
+    keep several paths comparable. Returns (node_indices, overall_index).
+    """
+    if max_score is None:
+        max_score = max(node_scores) if node_scores else 0.0
+    scale = 100.0 / max_score if max_score > 0 else 0.0
+    node_indices = [round(s * scale, 2) for s in node_scores]
+    overall_index = round(sum(node_indices) / len(node_indices), 2) if node_indices else 0.0
+    return node_indices, overall_index
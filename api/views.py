@@ -5,15 +5,21 @@ from django.contrib.auth.models import User
 from django.utils.dateparse import parse_datetime
 from django.utils.timezone import make_aware
 from .serializers import SignupSerializer, RoomSerializer, MembershipSerializer, GeoFenceSerializer, MeetingPointSerializer
-from .models import Room, Membership, GeoFence, MeetingPoint, Movement
+from .models import Room, Membership, GeoFence, MeetingPoint, Job, RoomTravelStats
 from rest_framework_simplejwt.views import TokenObtainPairView
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from . import activity, movement_store, nearby
+from .fast_serializers import active_meeting_data, geofence_data, room_data, user_rooms_data
+from .jobs import enqueue
+from .throttling import check_ingest, rejected_counts, valid_ident
+from .traffic import clean_path, padded_bbox, decay_lambda_for, to_indices
 import math
+import time
 from datetime import timedelta
 from django.utils import timezone
 import json
-import requests
 from django.conf import settings
+from django.core.cache import cache
 
 # Custom token view: attaches user info to response
 class MyTokenObtainPairSerializer(TokenObtainPairSerializer):
@@ -60,21 +66,20 @@ def signup(request):
 @permission_classes([permissions.AllowAny])
 def google_auth(request):
     """Handle Google OAuth authentication"""
+    # Imported on first use to keep worker cold starts short (see profile_startup)
+    from .oauth import GoogleTokenInvalid, GoogleUnavailable, fetch_userinfo, free_username
+
     try:
         access_token = request.data.get('access_token')
         if not access_token:
             return Response({"error": "Access token is required"}, status=status.HTTP_400_BAD_REQUEST)
         
-        # Verify the token with Google
-        google_response = requests.get(
-            'https://www.googleapis.com/oauth2/v2/userinfo',
-            headers={'Authorization': f'Bearer {access_token}'}
-        )
-        
-        if google_response.status_code != 200:
+        # Verify the token with Google (pooled session, cached per token hash)
+        try:
+            google_user_data = fetch_userinfo(access_token)
+        except GoogleTokenInvalid:
             return Response({"error": "Invalid Google access token"}, status=status.HTTP_400_BAD_REQUEST)
         
-        google_user_data = google_response.json()
         email = google_user_data.get('email')
         google_id = google_user_data.get('id')
         name = google_user_data.get('name', '')
@@ -88,14 +93,8 @@ def google_auth(request):
         try:
             user = User.objects.get(email=email)
         except User.DoesNotExist:
-            # Create new user
-            username = email.split('@')[0]
-            # Ensure username is unique
-            base_username = username
-            counter = 1
-            while User.objects.filter(username=username).exists():
-                username = f"{base_username}{counter}"
-                counter += 1
+            # Create new user with a unique username
+            username = free_username(email.split('@')[0])
             
             user = User.objects.create_user(
                 username=username,
@@ -119,7 +118,7 @@ def google_auth(request):
             'is_new_user': user.date_joined.date() == timezone.now().date()
         })
         
-    except requests.RequestException:
+    except GoogleUnavailable:
         return Response({"error": "Failed to verify Google token"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
     except Exception as e:
         return Response({"error": "Authentication failed"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -142,7 +141,8 @@ def join_room(request):
     if not room_id:
         return Response({"error":"room_id required"}, status=status.HTTP_400_BAD_REQUEST)
     try:
-        room = Room.objects.get(id=room_id)
+        # creator is serialized in the response
+        room = Room.objects.select_related("creator").get(id=room_id)
     except Room.DoesNotExist:
         return Response({"error":"room not found"}, status=status.HTTP_404_NOT_FOUND)
     membership, created = Membership.objects.get_or_create(user=request.user, room=room)
@@ -151,9 +151,7 @@ def join_room(request):
 # List user's rooms
 @api_view(["POST"])
 def list_rooms(request):
-    memberships = Membership.objects.filter(user=request.user).select_related("room")
-    rooms = [RoomSerializer(m.room).data for m in memberships]
-    return Response({"rooms": rooms})
+    return Response({"rooms": user_rooms_data(request.user)})
 
 # Bootstrap endpoint (simple)
 @api_view(["POST"])
@@ -163,21 +161,293 @@ def bootstrap_room(request):
     This can return room meta or simple ok.
     """
     room_id = request.data.get("room_id")
-    try:
-        room = Room.objects.get(id=room_id)
-    except Room.DoesNotExist:
+    room = room_data(room_id)
+    if room is None:
         return Response({"error":"room not found"}, status=404)
-    data = {"ok": True, "room": RoomSerializer(room).data}
+    data = {"ok": True, "room": room}
     # include geofence and latest active meeting if present
-    fence = getattr(room, "geofence", None)
+    fence = geofence_data(room["id"])
     if fence:
-        data["geofence"] = GeoFenceSerializer(fence).data
-    meeting = room.meetings.filter(active=True).first()
+        data["geofence"] = fence
+    meeting = active_meeting_data(room["id"])
     if meeting:
-        data["meeting"] = MeetingPointSerializer(meeting).data
+        data["meeting"] = meeting
+    return Response(data)
+
+
+# Bulk attendee provisioning (creator only)
+@api_view(["POST"])
+def provision_room(request):
+    """
+    Create many attendee accounts and add them to a room in one call.
+
+    Body: {"room_id", "users": [{"username", "email", "password", "first_name"}, ...]}
+    or multipart with room_id and a CSV/JSON "file" (CSV needs a header row).
+    Optional "dry_run" validates only; "async" queues a job instead, as do
+    batches of more than PROVISION_SYNC_MAX_USERS users. A queued batch
+    answers 202 with {"job_id", "status"}.
+    """
+    from .provisioning import parse_users, provision
+
+    room_id = request.data.get("room_id")
+    if not room_id:
+        return Response({"error": "room_id required"}, status=400)
+    try:
+        room = Room.objects.get(id=room_id)
+    except Room.DoesNotExist:
+        return Response({"error": "room not found"}, status=404)
+    if room.creator_id != request.user.id:
+        return Response({"error": "forbidden"}, status=403)
+
+    upload = request.FILES.get("file")
+    try:
+        if upload:
+            fmt = "json" if upload.name.lower().endswith(".json") else "csv"
+            users = parse_users(upload.read(), fmt)
+        else:
+            users = parse_users(request.data.get("users") or [], "json")
+    except (ValueError, UnicodeDecodeError):
+        return Response({"error": "could not parse users"}, status=400)
+    if not users:
+        return Response({"error": "users (list or file) required"}, status=400)
+
+    dry_run = request.data.get("dry_run") in (True, "true", "1")
+    if request.data.get("async") in (True, "true", "1") or len(users) > settings.PROVISION_SYNC_MAX_USERS:
+        job = enqueue("rooms.provision", {"room_id": room.id, "users": users, "dry_run": dry_run}, user=request.user)
+        return Response({"job_id": job.id, "status": job.status}, status=202)
+    # Hashed in this process: no pool forked from a web worker
+    return Response(provision(room, users, workers=1, dry_run=dry_run), status=200 if dry_run else 201)
+
+
+# Point-in-time snapshot (creator only)
+@api_view(["POST"])
+def room_snapshot(request):
+    """
+    Each member's last known position in the room at or before "at"
+    (ISO datetime, default: now). Snapshots older than
+    SNAPSHOT_CACHE_MIN_AGE_SECONDS can no longer change and are cached.
+    """
+    room_id = request.data.get("room_id")
+    if not room_id:
+        return Response({"error": "room_id required"}, status=400)
+    try:
+        room = Room.objects.get(id=room_id)
+    except Room.DoesNotExist:
+        return Response({"error": "room not found"}, status=404)
+    if room.creator_id != request.user.id:
+        return Response({"error": "forbidden"}, status=403)
+
+    now = timezone.now()
+    at_raw = request.data.get("at")
+    at = now
+    if at_raw:
+        at = parse_datetime(at_raw)
+        if at is None:
+            return Response({"error": "invalid at datetime"}, status=400)
+        if at.tzinfo is None:
+            at = make_aware(at)
+
+    cache_key = None
+    if at <= now - timedelta(seconds=settings.SNAPSHOT_CACHE_MIN_AGE_SECONDS):
+        cache_key = f"room-snapshot:{room.id}:{at.timestamp()}:{settings.MOVEMENT_STORAGE}"
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return Response(cached)
+
+    positions = movement_store.latest_positions(room.id, at)
+    usernames = dict(
+        Membership.objects.filter(room=room, user_id__in=positions).values_list("user_id", "user__username")
+    )
+    data = {
+        "room_id": room.id,
+        "at": at,
+        "positions": [
+            {
+                "user_id": user_id,
+                "username": usernames.get(user_id),
+                "lat": lat,
+                "lng": lng,
+                "recorded_at": recorded_at,
+            }
+            for user_id, (lat, lng, recorded_at) in sorted(positions.items())
+        ],
+    }
+    if cache_key:
+        cache.set(cache_key, data, settings.SNAPSHOT_CACHE_SECONDS)
     return Response(data)
 
 
+@api_view(["POST"])
+def room_stats(request):
+    """
+    Live activity panel for the room creator: points in the last minute and
+    per minute over five, members active in the last five minutes, the
+    room's bounding box and last update time, and how many fixes ingest
+    throttling rejected in the current INGEST_REJECTED_WINDOW_SECONDS. Served from counters kept at ingestion
+    (api/activity.py, api/throttling.py), never from Movement.
+    """
+    room_id = request.data.get("room_id")
+    if not room_id:
+        return Response({"error": "room_id required"}, status=400)
+    try:
+        room = Room.objects.select_related("activity").get(id=room_id)
+    except Room.DoesNotExist:
+        return Response({"error": "room not found"}, status=404)
+    if room.creator_id != request.user.id:
+        return Response({"error": "forbidden"}, status=403)
+    return Response({**activity.room_stats(room), "rejected_fixes": rejected_counts(room_id=room.id)["room"]})
+
+
+LEADERBOARD_ORDER = {
+    "distance": "-distance_m",
+    "moving_time": "-moving_s",
+    "trips": "-trips",
+}
+
+
+@api_view(["POST"])
+def room_leaderboard(request):
+    """
+    Members ranked by travel totals from trip/stop segmentation
+    (metric: distance | moving_time | trips). Served from the running
+    RoomTravelStats rows, so the cost follows the member count.
+    """
+    room_id = request.data.get("room_id")
+    if not room_id:
+        return Response({"error": "room_id required"}, status=400)
+    metric = request.data.get("metric", "distance")
+    if metric not in LEADERBOARD_ORDER:
+        return Response({"error": "metric must be one of: " + ", ".join(LEADERBOARD_ORDER)}, status=400)
+    try:
+        limit = max(1, min(int(request.data.get("limit", 10)), 100))
+    except (TypeError, ValueError):
+        return Response({"error": "limit must be an integer"}, status=400)
+    try:
+        room = Room.objects.get(id=room_id)
+    except Room.DoesNotExist:
+        return Response({"error": "room not found"}, status=404)
+    if room.creator_id != request.user.id and not Membership.objects.filter(room=room, user=request.user).exists():
+        return Response({"error": "forbidden"}, status=403)
+
+    rows = (
+        RoomTravelStats.objects.filter(room=room)
+        .order_by(LEADERBOARD_ORDER[metric], "user_id")
+        .values("user_id", "user__username", "distance_m", "moving_s", "trips", "stops")[:limit]
+    )
+    leaders = [
+        {
+            "rank": rank,
+            "user_id": r["user_id"],
+            "username": r["user__username"],
+            "distance_m": round(r["distance_m"], 1),
+            "moving_s": round(r["moving_s"]),
+            "trips": r["trips"],
+            "stops": r["stops"],
+            "avg_speed_mps": round(r["distance_m"] / r["moving_s"], 2) if r["moving_s"] else 0.0,
+        }
+        for rank, r in enumerate(rows, start=1)
+    ]
+    return Response({"room_id": room.id, "metric": metric, "leaders": leaders})
+
+
+NEARBY_MAX_K = 100
+NEARBY_MAX_RADIUS_M = 5000
+NEARBY_MAX_RADIUS_RESULTS = 500
+
+
+@api_view(["POST"])
+def room_nearby(request):
+    """
+    Members nearest to a point: the k nearest (default 10), or every member
+    within radius_m. The point defaults to the caller's own last fix, and the
+    caller is left out of the results. Answered from this worker's in-memory
+    grid over latest fixes (api/nearby.py).
+    """
+    room_id = request.data.get("room_id")
+    if not room_id:
+        return Response({"error": "room_id required"}, status=400)
+    try:
+        k = max(1, min(int(request.data.get("k", 10)), NEARBY_MAX_K))
+        radius_m = request.data.get("radius_m")
+        radius_m = None if radius_m in (None, "") else float(radius_m)
+        lat, lng = request.data.get("lat"), request.data.get("lng")
+        point = None if lat in (None, "") or lng in (None, "") else (float(lat), float(lng))
+    except (TypeError, ValueError):
+        return Response({"error": "k, radius_m, lat and lng must be numbers"}, status=400)
+    if radius_m is not None and not 0 < radius_m <= NEARBY_MAX_RADIUS_M:
+        return Response({"error": f"radius_m must be between 0 and {NEARBY_MAX_RADIUS_M}"}, status=400)
+    if point is not None and not (-90 <= point[0] <= 90 and -180 <= point[1] <= 180):
+        return Response({"error": "lat must be within ±90 and lng within ±180"}, status=400)
+    try:
+        room = Room.objects.get(id=room_id)
+    except Room.DoesNotExist:
+        return Response({"error": "room not found"}, status=404)
+    if room.creator_id != request.user.id and not Membership.objects.filter(room=room, user=request.user).exists():
+        return Response({"error": "forbidden"}, status=403)
+
+    index = nearby.room_index(room.id)
+    if point is None:
+        own = index.members.get(request.user.id)
+        if own is None:
+            return Response({"error": "lat and lng required: no recent position for you in this room"}, status=400)
+        point = (own[2], own[3])
+    min_ts = time.time() - settings.NEARBY_MAX_AGE_SECONDS
+    if radius_m is None:
+        hits = index.nearest(*point, k, min_ts=min_ts, exclude=request.user.id)
+    else:
+        hits = index.within(*point, radius_m, min_ts=min_ts, exclude=request.user.id)
+    return Response({
+        "room_id": room.id,
+        "lat": point[0],
+        "lng": point[1],
+        "count": len(hits),
+        "members": index.describe(hits[:NEARBY_MAX_RADIUS_RESULTS]),
+    })
+
+
+BBOX_KEYS = ("min_lat", "min_lng", "max_lat", "max_lng")
+
+
+@api_view(["POST"])
+def room_clusters(request):
+    """
+    Members' latest positions clustered for a map zoom level and optional
+    viewport (bbox: {min_lat, min_lng, max_lat, max_lng}). Dense cells come
+    back as clusters with a count and centroid, sparse ones as individual
+    members, so the payload stays bounded however large the room is.
+    """
+    room_id = request.data.get("room_id")
+    if not room_id or request.data.get("zoom") in (None, ""):
+        return Response({"error": "room_id, zoom required"}, status=400)
+    bbox = request.data.get("bbox")
+    try:
+        zoom = int(request.data["zoom"])
+        if bbox is not None:
+            bbox = tuple(float(bbox[k]) for k in BBOX_KEYS)
+    except (TypeError, ValueError, KeyError):
+        return Response({"error": "zoom must be an integer and bbox must have " + ", ".join(BBOX_KEYS)}, status=400)
+    if bbox is not None and (bbox[0] > bbox[2] or bbox[1] > bbox[3]):
+        return Response({"error": "bbox minimums must not exceed maximums"}, status=400)
+    try:
+        room = Room.objects.get(id=room_id)
+    except Room.DoesNotExist:
+        return Response({"error": "room not found"}, status=404)
+    if room.creator_id != request.user.id and not Membership.objects.filter(room=room, user=request.user).exists():
+        return Response({"error": "forbidden"}, status=403)
+
+    index = nearby.room_index(room.id)
+    grid_zoom, clusters, singles = index.clusters(zoom, bbox)
+    return Response({
+        "room_id": room.id,
+        "zoom": zoom,
+        "grid_zoom": grid_zoom,
+        "clusters": [
+            {"count": count, "lat": round(lat, 6), "lng": round(lng, 6)} for count, lat, lng in clusters
+        ],
+        "members": index.describe([(None, user_id) for user_id in singles]),
+    })
+
+
 # ------------------------------
 # Geofence Endpoints (Admin only)
 # ------------------------------
@@ -195,7 +465,7 @@ def set_geofence(request):
     except Room.DoesNotExist:
         return Response({"error":"room not found"}, status=404)
     # only creator can set
-    if request.user != room.creator:
+    if room.creator_id != request.user.id:
         return Response({"error":"forbidden"}, status=403)
 
     fence, _ = GeoFence.objects.update_or_create(
@@ -215,14 +485,12 @@ def get_geofence(request):
     room_id = request.data.get("room_id")
     if not room_id:
         return Response({"error": "room_id required"}, status=400)
-    try:
-        room = Room.objects.get(id=room_id)
-    except Room.DoesNotExist:
+    fence = geofence_data(room_id)
+    if fence:
+        return Response({"geofence": fence})
+    if not Room.objects.filter(id=room_id).exists():
         return Response({"error":"room not found"}, status=404)
-    fence = getattr(room, "geofence", None)
-    if not fence:
-        return Response({"geofence": None})
-    return Response({"geofence": GeoFenceSerializer(fence).data})
+    return Response({"geofence": None})
 
 
 # ------------------------------------
@@ -242,7 +510,7 @@ def set_meeting_point(request):
         room = Room.objects.get(id=room_id)
     except Room.DoesNotExist:
         return Response({"error":"room not found"}, status=404)
-    if request.user != room.creator:
+    if room.creator_id != request.user.id:
         return Response({"error":"forbidden"}, status=403)
 
     dt = parse_datetime(reach_by_raw)
@@ -270,14 +538,119 @@ def get_meeting_point(request):
     room_id = request.data.get("room_id")
     if not room_id:
         return Response({"error":"room_id required"}, status=400)
+    meeting = active_meeting_data(room_id)
+    if meeting:
+        return Response({"meeting": meeting})
+    if not Room.objects.filter(id=room_id).exists():
+        return Response({"error":"room not found"}, status=404)
+    return Response({"meeting": None})
+
+
+MEETING_MAX_CANDIDATES = 100
+
+
+@api_view(["POST"])
+def suggest_meeting_point(request):
+    """
+    Suggest a meeting point for the room creator from members' latest
+    positions: minimum total distance (objective "total", the default) or
+    minimum largest distance ("max"), optionally restricted to candidates
+    ([{"lat", "lng", ...}]). Pass the result to /api/meeting/set to use it.
+    """
+    from .meeting_suggest import OBJECTIVES, suggest
+
+    room_id = request.data.get("room_id")
+    if not room_id:
+        return Response({"error": "room_id required"}, status=400)
+    objective = request.data.get("objective", "total")
+    if objective not in OBJECTIVES:
+        return Response({"error": "objective must be one of: " + ", ".join(OBJECTIVES)}, status=400)
+    candidates = request.data.get("candidates") or None
+    if candidates is not None:
+        try:
+            if not isinstance(candidates, list) or len(candidates) > MEETING_MAX_CANDIDATES:
+                raise ValueError
+            candidates = [{**c, "lat": float(c["lat"]), "lng": float(c["lng"])} for c in candidates]
+        except (TypeError, ValueError, KeyError):
+            return Response(
+                {"error": f"candidates must be a list of at most {MEETING_MAX_CANDIDATES} objects with lat and lng"},
+                status=400,
+            )
     try:
         room = Room.objects.get(id=room_id)
     except Room.DoesNotExist:
-        return Response({"error":"room not found"}, status=404)
-    meeting = room.meetings.filter(active=True).first()
-    if not meeting:
-        return Response({"meeting": None})
-    return Response({"meeting": MeetingPointSerializer(meeting).data})
+        return Response({"error": "room not found"}, status=404)
+    if room.creator_id != request.user.id:
+        return Response({"error": "forbidden"}, status=403)
+
+    positions = nearby.room_index(room.id).positions(time.time() - settings.NEARBY_MAX_AGE_SECONDS)
+    if not positions:
+        return Response({"error": "no recent member positions"}, status=409)
+    return Response({"room_id": room.id, **suggest(positions, objective, candidates)})
+
+
+# ------------------------------------
+# Place search (caching geocoder proxy)
+# ------------------------------------
+GEOCODE_MIN_QUERY_CHARS = 2
+GEOCODE_MAX_QUERY_CHARS = 200
+
+
+@api_view(["POST"])
+def geocode_search(request):
+    """
+    Places matching q through the caching proxy in api/geocoding.py. Body:
+    q, limit (default and maximum GEOCODER_FETCH_LIMIT), and near
+    ({"lat", "lng"}) to bias results towards the caller. Results have the
+    geocoder's format=json shape.
+    """
+    from .geocoding import GeocoderNotFound, GeocoderUnavailable, normalize_query, search
+
+    q = normalize_query(str(request.data.get("q") or ""))
+    if not GEOCODE_MIN_QUERY_CHARS <= len(q) <= GEOCODE_MAX_QUERY_CHARS:
+        return Response(
+            {"error": f"q must be {GEOCODE_MIN_QUERY_CHARS} to {GEOCODE_MAX_QUERY_CHARS} characters"}, status=400
+        )
+    near = request.data.get("near")
+    try:
+        limit = int(request.data.get("limit") or settings.GEOCODER_FETCH_LIMIT)
+        if near is not None:
+            near = (float(near["lat"]), float(near["lng"]))
+            if not (-90 <= near[0] <= 90 and -180 <= near[1] <= 180):
+                raise ValueError
+    except (TypeError, ValueError, KeyError):
+        return Response({"error": "limit must be an integer and near must have a valid lat and lng"}, status=400)
+    limit = max(1, min(limit, settings.GEOCODER_FETCH_LIMIT))
+    try:
+        results = search(q, limit, near)
+    except (GeocoderUnavailable, GeocoderNotFound):
+        return Response({"error": "place search is unavailable"}, status=502)
+    return Response({"q": q, "results": results})
+
+
+@api_view(["POST"])
+def geocode_details(request):
+    """
+    Details of one OSM object, with its geometry as GeoJSON, through the
+    caching proxy. Body: osm_type ("N", "W", "R" or node/way/relation) and
+    osm_id.
+    """
+    from .geocoding import OSM_TYPES, GeocoderNotFound, GeocoderUnavailable, details
+
+    osm_type = str(request.data.get("osm_type") or "")[:1].upper()
+    try:
+        osm_id = int(request.data.get("osm_id"))
+    except (TypeError, ValueError):
+        osm_id = None
+    if osm_type not in OSM_TYPES or osm_id is None or osm_id <= 0:
+        return Response({"error": "osm_type (N, W or R) and a positive osm_id required"}, status=400)
+    try:
+        place = details(osm_type, osm_id)
+    except GeocoderNotFound:
+        return Response({"error": "place not found"}, status=404)
+    except GeocoderUnavailable:
+        return Response({"error": "place details are unavailable"}, status=502)
+    return Response({"place": place})
 
 
 # ------------------------------------
@@ -289,6 +662,8 @@ def record_movement(request):
     """
     Called by Node socket server on each location-update.
     Expects: user_id, room_id, latitude, longitude
+    Answers 429 with Retry-After and suggested_interval_ms when the user's
+    or the room's ingest bucket is empty (see api/throttling.py).
     """
     user_id = request.data.get("user_id")
     room_id = request.data.get("room_id")
@@ -296,57 +671,35 @@ def record_movement(request):
     longitude = request.data.get("longitude")
     if not all([user_id, room_id, latitude, longitude]):
         return Response({"error":"user_id, room_id, latitude, longitude required"}, status=400)
+    if not (valid_ident(user_id) and valid_ident(room_id)):
+        return Response({"error":"user or room not found"}, status=404)
+    # Shed excess fixes before touching the database
+    limited = check_ingest(user_id, room_id)
+    if limited:
+        response = Response(
+            {
+                "error": "rate limited",
+                "scope": limited["scope"],
+                "retry_after_ms": math.ceil(limited["retry_after"] * 1000),
+                "suggested_interval_ms": limited["suggested_interval_ms"],
+            },
+            status=429,
+        )
+        response["Retry-After"] = str(max(1, math.ceil(limited["retry_after"])))
+        return response
     try:
         user = User.objects.get(id=user_id)
         room = Room.objects.get(id=room_id)
     except (User.DoesNotExist, Room.DoesNotExist):
         return Response({"error":"user or room not found"}, status=404)
-    Movement.objects.create(
-        user=user,
-        room=room,
-        latitude=float(latitude),
-        longitude=float(longitude),
-    )
+    movement_store.record(user.id, room.id, float(latitude), float(longitude))
+    activity.note_fix(room.id, user.id, float(latitude), float(longitude))
     return Response({"ok": True})
 
 
 # ------------------------------------
 # Traffic prediction from Movement history
 # ------------------------------------
-def _haversine_meters(lat1, lon1, lat2, lon2):
-    R = 6371000.0
-    phi1 = math.radians(lat1)
-    phi2 = math.radians(lat2)
-    dphi = math.radians(lat2 - lat1)
-    dlambda = math.radians(lon2 - lon1)
-    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-    return R * c
-
-
-def _point_to_segment_distance_m(p_lat, p_lng, a_lat, a_lng, b_lat, b_lng):
-    # Approximate: project to local meters using haversine for legs
-    # Convert to a simple 2D plane by using meters relative to A
-    ax = 0.0
-    ay = 0.0
-    bx = _haversine_meters(a_lat, a_lng, a_lat, b_lng) * (1 if b_lng > a_lng else -1)
-    by = _haversine_meters(a_lat, a_lng, b_lat, a_lng) * (1 if b_lat > a_lat else -1)
-    px = _haversine_meters(a_lat, a_lng, a_lat, p_lng) * (1 if p_lng > a_lng else -1)
-    py = _haversine_meters(a_lat, a_lng, p_lat, a_lng) * (1 if p_lat > a_lat else -1)
-    abx = bx - ax
-    aby = by - ay
-    apx = px - ax
-    apy = py - ay
-    ab_len2 = abx * abx + aby * aby
-    if ab_len2 == 0:
-        # A and B are the same point
-        return math.hypot(apx, apy)
-    t = max(0.0, min(1.0, (apx * abx + apy * aby) / ab_len2))
-    cx = ax + t * abx
-    cy = ay + t * aby
-    return math.hypot(px - cx, py - cy)
-
-
 @api_view(["POST"])
 def predict_traffic(request):
     """
@@ -358,126 +711,226 @@ def predict_traffic(request):
       "room_id": number (required if scope=="room"),
       "room_ids": [number, ...] (required if scope=="rooms"),
       "path": [{"lat": float, "lng": float}, ...],  # ordered polyline
+      "paths": [[{"lat": float, "lng": float}, ...], ...],  # alternative routes, instead of path
       "radius_m": optional int (default 50),
-      "window_minutes": optional int (default 60)
+      "window_minutes": optional int (default 60),
+      "mode": "live" | "historical" (default: "live"),
+      "target_time": ISO datetime (historical mode, default: now),
+      "parallel": true | false | "auto" (default: "auto")
     }
 
-    Returns per-node density and an overall index.
+    Returns per-node density and an overall index. When "paths" is given all
+    routes are scored in one Movement scan over their union bounding box and
+    the response carries a "routes" list plus a "ranking" of route indexes,
+    least congested first. Route indices share one scale so they compare.
+
+    Historical mode scores the path from the hour-of-week profiles (see
+    api/profiles.py) for target_time instead of scanning recent Movement.
+
+    Live scans can fan out over a process pool (api/scan.py). "auto" does so
+    for scope=global once the window holds TRAFFIC_PARALLEL_MIN_ROWS rows.
+    Windows reaching back past yesterday also scan the columnar archive of
+    old movements (api/archive.py); "counted_archived" says how many of the
+    counted movements came from it.
+
+    With "async": true the request is queued as a background job and the
+    response is {"job_id", "status"}; poll /api/jobs/status and fetch the
+    body above from /api/jobs/result.
     """
-    scope = (request.data.get("scope") or "room").lower()
-    room_id = request.data.get("room_id")
-    room_ids = request.data.get("room_ids") or []
-    path = request.data.get("path") or []
-    radius_m = int(request.data.get("radius_m") or 50)
-    window_minutes = int(request.data.get("window_minutes") or 60)
+    if request.data.get("async"):
+        params = {k: v for k, v in request.data.items() if k != "async"}
+        job = enqueue("traffic.predict", params, user=request.user)
+        return Response({"job_id": job.id, "status": job.status}, status=202)
+    data, status_code = run_traffic_prediction(request.data)
+    return Response(data, status=status_code)
 
-    if not path or len(path) < 2:
-        return Response({"error": "path (>=2 points) required"}, status=400)
+
+def run_traffic_prediction(params):
+    """
+    Body of predict_traffic, shared with the background job handler.
+    Returns (response data, status code).
+    """
+    from .profiles import profile_scores
+    from .scan import (
+        add_scores, archive_scan, movement_filters, parallel_scan, serial_scan, should_parallelize, window_pk_range,
+    )
+
+    scope = (params.get("scope") or "room").lower()
+    room_id = params.get("room_id")
+    room_ids = params.get("room_ids") or []
+    path = params.get("path") or []
+    paths = params.get("paths")
+    radius_m = int(params.get("radius_m") or 50)
+    window_minutes = int(params.get("window_minutes") or 60)
+    mode = (params.get("mode") or "live").lower()
+    target_raw = params.get("target_time")
+    parallel = params.get("parallel", "auto")
+
+    if mode not in ("live", "historical"):
+        return {"error": "mode must be live or historical"}, 400
+    if parallel not in ("auto", True, False):
+        return {"error": "parallel must be true, false or \"auto\""}, 400
+    multi = paths is not None
+    if multi:
+        if not isinstance(paths, list) or not paths:
+            return {"error": "paths (list of paths) required"}, 400
+        if any(not isinstance(p, list) or len(p) < 2 for p in paths):
+            return {"error": "each path in paths needs >=2 points"}, 400
+    else:
+        if not path or len(path) < 2:
+            return {"error": "path (>=2 points) required"}, 400
+        paths = [path]
     if scope == "room" and not room_id:
-        return Response({"error": "room_id required for scope=room"}, status=400)
+        return {"error": "room_id required for scope=room"}, 400
     if scope == "rooms" and (not isinstance(room_ids, list) or not room_ids):
-        return Response({"error": "room_ids (list) required for scope=rooms"}, status=400)
+        return {"error": "room_ids (list) required for scope=rooms"}, 400
     if scope == "room":
         try:
             room = Room.objects.get(id=room_id)
         except Room.DoesNotExist:
-            return Response({"error": "room not found"}, status=404)
+            return {"error": "room not found"}, 404
 
     window_end = timezone.now()
     window_start = window_end - timedelta(minutes=window_minutes)
 
     # Validate and normalize path points
-    cleaned_path = []
-    for idx, p in enumerate(path):
+    cleaned_paths = []
+    for path_idx, p in enumerate(paths):
         try:
-            lat = float(p.get("lat"))
-            lng = float(p.get("lng"))
-            if not (math.isfinite(lat) and math.isfinite(lng)):
-                raise ValueError("non-finite")
-            cleaned_path.append({"lat": lat, "lng": lng})
-        except Exception:
-            return Response({"error": f"invalid path point at index {idx}"}, status=400)
+            cleaned_paths.append(clean_path(p))
+        except ValueError as e:
+            if multi:
+                return {"error": f"paths[{path_idx}]: {e}"}, 400
+            return {"error": str(e)}, 400
 
     # Optional: coerce room_ids to ints for safety
     if scope == "rooms":
         try:
             room_ids = [int(rid) for rid in room_ids]
         except Exception:
-            return Response({"error": "room_ids must be integers"}, status=400)
-
-    # Bounding box prefilter to limit scan area (approximate meters->degrees)
-    lats = [p["lat"] for p in cleaned_path]
-    lngs = [p["lng"] for p in cleaned_path]
-    lat_min, lat_max = min(lats), max(lats)
-    lng_min, lng_max = min(lngs), max(lngs)
-    mean_lat = (lat_min + lat_max) / 2.0
-    meters_per_deg_lat = 111000.0
-    meters_per_deg_lng = max(1e-6, 111000.0 * max(0.1, math.cos(math.radians(mean_lat))))
-    dlat = radius_m / meters_per_deg_lat
-    dlng = radius_m / meters_per_deg_lng
-
-    movements_qs = Movement.objects.filter(created_at__gte=window_start)
-    # Scope filters
-    if scope == "room":
-        movements_qs = movements_qs.filter(room=room)
-    elif scope == "rooms":
-        movements_qs = movements_qs.filter(room_id__in=room_ids)
-    # Spatial prefilter
-    movements_qs = movements_qs.filter(
-        latitude__gte=lat_min - dlat,
-        latitude__lte=lat_max + dlat,
-        longitude__gte=lng_min - dlng,
-        longitude__lte=lng_max + dlng,
-    ).only("latitude", "longitude", "created_at")
-
-    # Precompute segments
-    segments = []  # [(a_lat,a_lng,b_lat,b_lng)]
-    for i in range(len(cleaned_path) - 1):
-        a = cleaned_path[i]
-        b = cleaned_path[i + 1]
-        if a is None or b is None:
-            continue
-        segments.append((a["lat"], a["lng"], b["lat"], b["lng"]))
-
-    # Initialize scores per node
-    node_scores = [0.0 for _ in range(len(cleaned_path))]
-    decay_half_life_min = max(10, window_minutes // 4)  # simple time decay
-    decay_lambda = math.log(2) / decay_half_life_min
-
-    total_considered = 0
-    for m in movements_qs.iterator():
-        total_considered += 1
-        # recency weight (minutes ago)
-        minutes_ago = max(0.0, (window_end - m.created_at).total_seconds() / 60.0)
-        time_weight = math.exp(-decay_lambda * minutes_ago)
-
-        # Distance to closest segment
-        min_dist = float("inf")
-        min_seg_index = -1
-        for idx, (a_lat, a_lng, b_lat, b_lng) in enumerate(segments):
-            d = _point_to_segment_distance_m(m.latitude, m.longitude, a_lat, a_lng, b_lat, b_lng)
-            if d < min_dist:
-                min_dist = d
-                min_seg_index = idx
-
-        if min_dist <= radius_m and min_seg_index >= 0:
-            # Distribute score to the segment endpoints
-            contribution = (1.0 - (min_dist / radius_m)) * time_weight
-            node_scores[min_seg_index] += contribution
-            node_scores[min_seg_index + 1] += contribution
-
-    # Normalize to 0..100 scale for convenience
-    max_score = max(node_scores) if node_scores else 0.0
-    scale = 100.0 / max_score if max_score > 0 else 0.0
-    node_indices = [round(s * scale, 2) for s in node_scores]
-    overall_index = round(sum(node_indices) / len(node_indices), 2) if node_indices else 0.0
+            return {"error": "room_ids must be integers"}, 400
 
-    return Response({
+    data = {
         "ok": True,
         "room_id": room_id,
         "window_minutes": window_minutes,
         "radius_m": radius_m,
-        "counted_movements": total_considered,
-        "overall_index": overall_index,
-        "node_indices": node_indices,
-    })
+    }
+    if mode == "historical":
+        target = timezone.now()
+        if target_raw:
+            target = parse_datetime(target_raw)
+            if target is None:
+                return {"error": "invalid target_time datetime"}, 400
+            if target.tzinfo is None:
+                target = make_aware(target)
+        profile_room_ids = None
+        if scope == "room":
+            profile_room_ids = [room.id]
+        elif scope == "rooms":
+            profile_room_ids = room_ids
+        node_scores, info = profile_scores(cleaned_paths, radius_m, target, profile_room_ids)
+        if node_scores is None:
+            return {"error": "historical profiles not built yet"}, 409
+        data.update(mode="historical", target_time=target.isoformat(), **info)
+        return _traffic_response(data, node_scores, multi)
+
+    # Bounding box prefilter over the union of all paths
+    bbox = padded_bbox(cleaned_paths, radius_m)
+    filters = movement_filters(
+        window_start,
+        bbox,
+        room_id=room.id if scope == "room" else None,
+        room_ids=room_ids if scope == "rooms" else None,
+    )
+    scan_args = (cleaned_paths, radius_m, window_end, decay_lambda_for(window_minutes))
+
+    pk_range = None
+    if parallel is True or (parallel == "auto" and scope == "global"):
+        pk_range = window_pk_range(window_start)
+        if parallel == "auto" and not should_parallelize(pk_range):
+            pk_range = None
+    if pk_range:
+        node_scores, total_considered = parallel_scan(filters, pk_range, *scan_args)
+    else:
+        node_scores, total_considered = serial_scan(filters, *scan_args)
+    archived = archive_scan(
+        window_start,
+        bbox,
+        *scan_args,
+        room_id=room.id if scope == "room" else None,
+        room_ids=room_ids if scope == "rooms" else None,
+    )
+    if archived is not None:
+        add_scores(node_scores, archived[0])
+        total_considered += archived[1]
+        data["counted_archived"] = archived[1]
+
+    data["counted_movements"] = total_considered
+    return _traffic_response(data, node_scores, multi)
+
+
+def _traffic_response(data, node_scores, multi):
+    if not multi:
+        # Normalize to 0..100 scale for convenience
+        node_indices, overall_index = to_indices(node_scores[0])
+        data["overall_index"] = overall_index
+        data["node_indices"] = node_indices
+        return data, 200
+
+    shared_max = max((max(s) for s in node_scores), default=0.0)
+    routes = []
+    for path_idx, scores in enumerate(node_scores):
+        node_indices, overall_index = to_indices(scores, shared_max)
+        routes.append({"index": path_idx, "overall_index": overall_index, "node_indices": node_indices})
+    data["routes"] = routes
+    data["ranking"] = [r["index"] for r in sorted(routes, key=lambda r: r["overall_index"])]
+    return data, 200
+
+
+# ------------------------------------
+# Background jobs (owner only)
+# ------------------------------------
+def _get_own_job(request):
+    job_id = request.data.get("job_id")
+    if not job_id:
+        return None, Response({"error": "job_id required"}, status=400)
+    try:
+        return Job.objects.get(id=job_id, created_by=request.user), None
+    except (Job.DoesNotExist, ValueError):
+        return None, Response({"error": "job not found"}, status=404)
+
+
+def _job_status(job):
+    return {
+        "job_id": job.id,
+        "kind": job.kind,
+        "status": job.status,
+        "created_at": job.created_at,
+        "finished_at": job.finished_at,
+        "error": job.error or None,
+    }
+
+
+@api_view(["POST"])
+def job_status(request):
+    job, error = _get_own_job(request)
+    if error:
+        return error
+    return Response(_job_status(job))
+
+
+@api_view(["POST"])
+def job_result(request):
+    """
+    Returns the job's result body exactly as the synchronous endpoint would,
+    202 with the status while it is still queued/running, or 400 on failure.
+    """
+    job, error = _get_own_job(request)
+    if error:
+        return error
+    if job.status == Job.DONE:
+        return Response(job.result)
+    if job.status == Job.FAILED:
+        return Response({"error": job.error, "status": job.status}, status=400)
+    return Response(_job_status(job), status=202)
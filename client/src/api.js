@@ -113,4 +113,9 @@ export const api = {
   // Meeting delete
   deleteMeeting: (token, room_id) =>
     request("/meeting/delete", { method: "POST", token, body: { room_id } }),
+  // Place search (cached server-side proxy in front of Nominatim)
+  geocodeSearch: (token, { q, limit, near }) =>
+    request("/geocode/search", { method: "POST", token, body: { q, limit, near } }),
+  geocodeDetails: (token, { osm_type, osm_id }) =>
+    request("/geocode/details", { method: "POST", token, body: { osm_type, osm_id } }),
 };
\ No newline at end of file
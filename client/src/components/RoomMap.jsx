@@ -483,8 +483,7 @@ export default function RoomMap() {
     
     try {
       // Search worldwide without location restrictions
-      const response = await fetch(`https://nominatim.openstreetmap.org/search?format=json&q=${encodeURIComponent(searchQuery)}&limit=1`);
-      const data = await response.json();
+      const { results: data } = await api.geocodeSearch(token, { q: searchQuery, limit: 1 });
       
       if (data && data.length > 0) {
         // Take the first result (most relevant)
@@ -593,8 +592,7 @@ export default function RoomMap() {
     if (currentLocation && result.osm_type === 'way') {
       try {
         // Get detailed geometry of the road
-        const detailResponse = await fetch(`https://nominatim.openstreetmap.org/details?osmtype=W&osmid=${result.osm_id}&format=json&polygon_geojson=1`);
-        const detailData = await detailResponse.json();
+        const { place: detailData } = await api.geocodeDetails(token, { osm_type: 'W', osm_id: result.osm_id });
         
         if (detailData.geometry && detailData.geometry.coordinates) {
           let minDistance = Infinity;
@@ -644,8 +642,7 @@ export default function RoomMap() {
     
     try {
       // Search worldwide without location restrictions
-      const response = await fetch(`https://nominatim.openstreetmap.org/search?format=json&q=${encodeURIComponent(searchQuery)}&limit=10`);
-      const data = await response.json();
+      const { results: data } = await api.geocodeSearch(token, { q: searchQuery, limit: 10 });
       
       if (data && data.length > 0) {
         // Take the first result (most relevant)
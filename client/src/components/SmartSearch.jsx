@@ -1,4 +1,6 @@
 import React, { useEffect, useRef, useState } from "react";
+import { api } from "../api";
+import { useAuth } from "../AuthContext";
 
 /**
  * SmartSearch.jsx
@@ -6,7 +8,7 @@ import React, { useEffect, useRef, useState } from "react";
  *  - instant, debounced suggestions
  *  - importance + proximity scoring (pushes important/nearby places first)
  *  - keyboard navigation (arrow keys + Enter)
- *  - caching + aborting inflight requests
+ *  - caching + ignoring superseded responses
  *  - lightweight styling (Tailwind-ready)
  *
  * Usage:
@@ -14,13 +16,12 @@ import React, { useEffect, useRef, useState } from "react";
  *    currentLocation={currentLocation} // { lat, lng } or null
  *    onSelect={(place) => { ... }}
  *    placeholder="Search places..."
- *    nominatimEmail="your@email.com" // optional but recommended for Nominatim policy
  * />
  *
  * onSelect receives: { lat, lon, display_name, type, class, distanceKm }
  * Notes:
- *  - This component uses Nominatim (OpenStreetMap). For production/high-volume use,
- *    consider a paid places API (Mapbox/Google) or your own search index.
+ *  - Searches go through the Django place search proxy (/api/geocode/search),
+ *    which caches and coalesces Nominatim (OpenStreetMap) lookups for all users.
  *  - Debounce default = 300ms, reduces unnecessary requests.
  */
 
@@ -60,15 +61,16 @@ function haversineKm(a, b) {
   return R * 2 * Math.atan2(Math.sqrt(aa), Math.sqrt(1 - aa));
 }
 
-export default function SmartSearch({ currentLocation = null, onSelect = () => {}, placeholder = "Search places...", nominatimEmail = null }) {
+export default function SmartSearch({ currentLocation = null, onSelect = () => {}, placeholder = "Search places..." }) {
   const [query, setQuery] = useState("");
   const [suggestions, setSuggestions] = useState([]);
   const [loading, setLoading] = useState(false);
   const [show, setShow] = useState(false);
   const [activeIndex, setActiveIndex] = useState(-1);
 
+  const { token } = useAuth();
   const cacheRef = useRef(new Map()); // queryKey -> { ts, results }
-  const abortRef = useRef(null);
+  const searchSeqRef = useRef(0);
   const debounceRef = useRef(null);
   const containerRef = useRef(null);
 
@@ -100,11 +102,9 @@ export default function SmartSearch({ currentLocation = null, onSelect = () => {
   }, [query, currentLocation]);
 
   async function doSearch(q) {
-    const bboxBias = currentLocation
-      ? `${currentLocation.lng - 0.1},${currentLocation.lat - 0.1},${currentLocation.lng + 0.1},${currentLocation.lat + 0.1}`
-      : null;
+    const near = currentLocation ? { lat: currentLocation.lat, lng: currentLocation.lng } : null;
 
-    const cacheKey = `${q}::${bboxBias ?? "global"}`;
+    const cacheKey = `${q}::${near ? `${near.lat.toFixed(2)},${near.lng.toFixed(2)}` : "global"}`;
     const cached = cacheRef.current.get(cacheKey);
     if (cached && Date.now() - cached.ts < CACHE_TTL_MS) {
       setSuggestions(cached.results);
@@ -112,20 +112,14 @@ export default function SmartSearch({ currentLocation = null, onSelect = () => {
       return;
     }
 
-    // Abort previous in-flight request
-    if (abortRef.current) abortRef.current.abort();
-    abortRef.current = new AbortController();
+    // Only the latest search may update the list
+    const seq = ++searchSeqRef.current;
     setLoading(true);
 
     try {
-      // Build Nominatim query. We use addressdetails + extratags + limit
-      let url = `https://nominatim.openstreetmap.org/search?format=json&addressdetails=1&extratags=1&limit=15&q=${encodeURIComponent(q)}`;
-      if (bboxBias) url += `&viewbox=${encodeURIComponent(bboxBias)}&bounded=0`;
-      if (nominatimEmail) url += `&email=${encodeURIComponent(nominatimEmail)}`;
-
-      const res = await fetch(url, { signal: abortRef.current.signal, headers: { "Accept-Language": "en" } });
-      if (!res.ok) throw new Error("Places search failed");
-      const data = await res.json();
+      // The proxy returns Nominatim results with address details + extratags
+      const { results: data } = await api.geocodeSearch(token, { q, limit: 15, ...(near ? { near } : {}) });
+      if (seq !== searchSeqRef.current) return;
 
       // Score + sort
       const enriched = (data || []).map((r) => {
@@ -161,12 +155,12 @@ export default function SmartSearch({ currentLocation = null, onSelect = () => {
       setShow(true);
       setActiveIndex(-1);
     } catch (err) {
-      if (err.name === "AbortError") return;
+      if (seq !== searchSeqRef.current) return;
       console.error(err);
       setSuggestions([]);
       setShow(true);
     } finally {
-      setLoading(false);
+      if (seq === searchSeqRef.current) setLoading(false);
     }
   }
 
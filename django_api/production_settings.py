@@ -17,6 +17,11 @@ CORS_ALLOWED_ORIGINS = [
 
 CORS_ALLOW_CREDENTIALS = True
 
+# Throttling and activity counters need a cache shared by all processes
+# (api/checks.py); settings.py derives this from DJANGO_DEBUG, which
+# production does not set
+REQUIRE_SHARED_CACHE = os.environ.get("REQUIRE_SHARED_CACHE", "True") == "True"
+
 # Security settings
 SECURE_SSL_REDIRECT = True
 SECURE_PROXY_SSL_HEADER = ('HTTP_X_FORWARDED_PROTO', 'https')
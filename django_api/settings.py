@@ -96,14 +96,46 @@ REST_FRAMEWORK = {
     "DEFAULT_PERMISSION_CLASSES": (
         "rest_framework.permissions.IsAuthenticated",
     ),
+    "DEFAULT_RENDERER_CLASSES": (
+        "api.renderers.FastJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ),
 }
 
+# Encode JSON responses with orjson (pip install orjson) instead of the
+# stdlib encoder; falls back to the stdlib one when orjson is missing
+FAST_JSON_RENDERER = os.environ.get("FAST_JSON_RENDERER", "False") == "True"
+
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(minutes=60),
     "REFRESH_TOKEN_LIFETIME": timedelta(days=7),
     "AUTH_HEADER_TYPES": ("Bearer",),
 }
 
+# Google sign-in: userinfo endpoint (override to point tests at a stub),
+# request timeouts in seconds, and how long a verified token is cached
+GOOGLE_USERINFO_URL = os.environ.get("GOOGLE_USERINFO_URL", "https://www.googleapis.com/oauth2/v2/userinfo")
+GOOGLE_CONNECT_TIMEOUT = float(os.environ.get("GOOGLE_CONNECT_TIMEOUT", "3"))
+GOOGLE_READ_TIMEOUT = float(os.environ.get("GOOGLE_READ_TIMEOUT", "5"))
+GOOGLE_TOKEN_CACHE_SECONDS = int(os.environ.get("GOOGLE_TOKEN_CACHE_SECONDS", "300"))
+GOOGLE_HTTP_POOL_SIZE = int(os.environ.get("GOOGLE_HTTP_POOL_SIZE", "10"))
+
+# -------------------------
+# CACHE
+# -------------------------
+# Per-process memory by default. Set DJANGO_CACHE_BACKEND/LOCATION to a
+# shared cache (e.g. django.core.cache.backends.redis.RedisCache) so all
+# workers see the same cached state. Ingest throttling and room activity
+# counters need one, so outside DEBUG a per-process cache fails the system
+# checks (api/checks.py) unless REQUIRE_SHARED_CACHE is turned off.
+CACHES = {
+    "default": {
+        "BACKEND": os.environ.get("DJANGO_CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"),
+        "LOCATION": os.environ.get("DJANGO_CACHE_LOCATION", ""),
+    }
+}
+REQUIRE_SHARED_CACHE = os.environ.get("REQUIRE_SHARED_CACHE", str(not DEBUG)) == "True"
+
 # -------------------------
 # CORS
 # -------------------------
@@ -169,3 +201,114 @@ LANGUAGE_CODE = "en-us"
 TIME_ZONE = "UTC"
 USE_I18N = True
 USE_TZ = True
+
+# -------------------------
+# ANALYTICS
+# -------------------------
+# Where GPS fixes are stored: "float" (Movement) or "compact" (CompactMovement,
+# int32-scaled coordinates). Move existing rows with
+# `manage.py migrate_movement_storage` when switching, with ingestion stopped.
+MOVEMENT_STORAGE = os.environ.get("MOVEMENT_STORAGE", "float")
+
+# Cell size (degrees) of the hour-of-week traffic profiles; ~111 m at 0.001.
+# Changing it requires `build_traffic_profiles --rebuild`.
+TRAFFIC_PROFILE_CELL_DEG = float(os.environ.get("TRAFFIC_PROFILE_CELL_DEG", "0.001"))
+# Max number of profile cells kept in each worker's lazy-load cache
+TRAFFIC_PROFILE_CACHE_CELLS = int(os.environ.get("TRAFFIC_PROFILE_CACHE_CELLS", "50000"))
+# predict_traffic parallel scan: worker processes (0 = CPU count) and the
+# window size, in rows, from which scope=global fans out automatically
+TRAFFIC_PARALLEL_WORKERS = int(os.environ.get("TRAFFIC_PARALLEL_WORKERS", "0"))
+TRAFFIC_PARALLEL_MIN_ROWS = int(os.environ.get("TRAFFIC_PARALLEL_MIN_ROWS", "200000"))
+# Room snapshots at least this old are immutable and cached for SNAPSHOT_CACHE_SECONDS
+SNAPSHOT_CACHE_MIN_AGE_SECONDS = int(os.environ.get("SNAPSHOT_CACHE_MIN_AGE_SECONDS", "120"))
+SNAPSHOT_CACHE_SECONDS = int(os.environ.get("SNAPSHOT_CACHE_SECONDS", "86400"))
+# Trip/stop segmentation (`manage.py segment_movements`): a stop is a stay
+# within SEGMENT_STOP_RADIUS_M for SEGMENT_STOP_MIN_SECONDS; silence longer
+# than SEGMENT_GAP_SECONDS ends the open trip or stop
+SEGMENT_STOP_RADIUS_M = float(os.environ.get("SEGMENT_STOP_RADIUS_M", "50"))
+SEGMENT_STOP_MIN_SECONDS = int(os.environ.get("SEGMENT_STOP_MIN_SECONDS", "300"))
+SEGMENT_GAP_SECONDS = int(os.environ.get("SEGMENT_GAP_SECONDS", "900"))
+
+# `manage.py bench_cold_start` fails when process start to first
+# bootstrap_room response takes longer than this (median, milliseconds)
+COLD_START_BUDGET_MS = float(os.environ.get("COLD_START_BUDGET_MS", "1500"))
+
+# Ingest throttling for record_movement (token buckets in the shared cache):
+# sustained fixes per second and burst size, per user and per room. The room
+# bucket is off (rate 0) by default: a big event room legitimately sends
+# members x fixes per second, e.g. 200/s for 1,000 members every 5 s
+INGEST_THROTTLE = os.environ.get("INGEST_THROTTLE", "True") == "True"
+INGEST_USER_RATE = float(os.environ.get("INGEST_USER_RATE", "2"))
+INGEST_USER_BURST = int(os.environ.get("INGEST_USER_BURST", "10"))
+INGEST_ROOM_RATE = float(os.environ.get("INGEST_ROOM_RATE", "0"))
+INGEST_ROOM_BURST = int(os.environ.get("INGEST_ROOM_BURST", "200"))
+# Rejected fixes are counted per window of this many seconds (aligned to the
+# epoch); room_stats reports the current window's count
+INGEST_REJECTED_WINDOW_SECONDS = int(os.environ.get("INGEST_REJECTED_WINDOW_SECONDS", "3600"))
+
+# `manage.py archive_movements` moves fixes of UTC days older than this many
+# days (at least 1) out of the database into columnar files under
+# MOVEMENT_ARCHIVE_DIR (see api/archive.py). There is no default: the
+# directory must be persistent storage mounted by every service that reads
+# movement history, and archiving refuses to run until it is set
+MOVEMENT_ARCHIVE_AFTER_DAYS = int(os.environ.get("MOVEMENT_ARCHIVE_AFTER_DAYS", "30"))
+MOVEMENT_ARCHIVE_DIR = os.environ.get("MOVEMENT_ARCHIVE_DIR", "")
+
+# Admin changelists of big tables (api/admin.py): unfiltered lists show the
+# table's row estimate once it reaches ADMIN_ESTIMATE_MIN_ROWS, filtered
+# ones count at most ADMIN_COUNT_LIMIT rows; deletes run
+# ADMIN_DELETE_BATCH_SIZE rows per statement
+ADMIN_ESTIMATE_MIN_ROWS = int(os.environ.get("ADMIN_ESTIMATE_MIN_ROWS", "100000"))
+ADMIN_COUNT_LIMIT = int(os.environ.get("ADMIN_COUNT_LIMIT", "10000"))
+ADMIN_DELETE_BATCH_SIZE = int(os.environ.get("ADMIN_DELETE_BATCH_SIZE", "5000"))
+
+# "Near me" queries (api/nearby.py): per-worker grid of NEARBY_CELL_M cells
+# per room, caught up with new fixes at most every NEARBY_SYNC_SECONDS; fixes
+# older than NEARBY_MAX_AGE_SECONDS are not reported
+NEARBY_CELL_M = float(os.environ.get("NEARBY_CELL_M", "100"))
+NEARBY_SYNC_SECONDS = float(os.environ.get("NEARBY_SYNC_SECONDS", "1"))
+NEARBY_MAX_AGE_SECONDS = int(os.environ.get("NEARBY_MAX_AGE_SECONDS", "900"))
+NEARBY_MAX_ROOMS = int(os.environ.get("NEARBY_MAX_ROOMS", "200"))
+
+# Map clusters (api/clustering.py): grid cells are CLUSTER_CELL_PX wide at
+# every zoom up to CLUSTER_MAX_ZOOM; cells with at most
+# CLUSTER_POINT_THRESHOLD members are sent as individual members, and a
+# viewport never spans more than CLUSTER_MAX_CELLS cells
+CLUSTER_MAX_ZOOM = int(os.environ.get("CLUSTER_MAX_ZOOM", "18"))
+CLUSTER_CELL_PX = int(os.environ.get("CLUSTER_CELL_PX", "64"))
+CLUSTER_POINT_THRESHOLD = int(os.environ.get("CLUSTER_POINT_THRESHOLD", "3"))
+CLUSTER_MAX_CELLS = int(os.environ.get("CLUSTER_MAX_CELLS", "600"))
+
+# Place search proxy (api/geocoding.py). GEOCODER_URL is a Nominatim-style
+# upstream (override to point tests at a stub) and GEOCODER_USER_AGENT must
+# identify the app under its usage policy. Upstream is always asked for
+# GEOCODER_FETCH_LIMIT results; answers are kept GEOCODER_CACHE_SECONDS, in
+# memory per worker and in the SQLite file GEOCODER_CACHE_PATH shared by all
+# workers ("" keeps them in memory only). Callers waiting on another's
+# identical lookup give up after GEOCODER_COALESCE_TIMEOUT seconds
+GEOCODER_URL = os.environ.get("GEOCODER_URL", "https://nominatim.openstreetmap.org")
+GEOCODER_USER_AGENT = os.environ.get("GEOCODER_USER_AGENT", "location-tracker/1.0")
+GEOCODER_LANGUAGE = os.environ.get("GEOCODER_LANGUAGE", "en")
+GEOCODER_CONNECT_TIMEOUT = float(os.environ.get("GEOCODER_CONNECT_TIMEOUT", "3"))
+GEOCODER_READ_TIMEOUT = float(os.environ.get("GEOCODER_READ_TIMEOUT", "8"))
+GEOCODER_HTTP_POOL_SIZE = int(os.environ.get("GEOCODER_HTTP_POOL_SIZE", "4"))
+GEOCODER_FETCH_LIMIT = int(os.environ.get("GEOCODER_FETCH_LIMIT", "15"))
+GEOCODER_BIAS_GRID_DEG = float(os.environ.get("GEOCODER_BIAS_GRID_DEG", "0.1"))
+GEOCODER_CACHE_SECONDS = int(os.environ.get("GEOCODER_CACHE_SECONDS", "86400"))
+GEOCODER_MEMORY_ENTRIES = int(os.environ.get("GEOCODER_MEMORY_ENTRIES", "2000"))
+GEOCODER_CACHE_PATH = os.environ.get("GEOCODER_CACHE_PATH", str(BASE_DIR / "geocoder_cache.sqlite3"))
+GEOCODER_DISK_ENTRIES = int(os.environ.get("GEOCODER_DISK_ENTRIES", "100000"))
+GEOCODER_COALESCE_TIMEOUT = float(os.environ.get("GEOCODER_COALESCE_TIMEOUT", "15"))
+
+# Bulk provisioning batches larger than this run as a background job;
+# requests hash in-process, jobs and the command across a pool of
+# PROVISION_HASH_WORKERS processes (0 = CPU count)
+PROVISION_SYNC_MAX_USERS = int(os.environ.get("PROVISION_SYNC_MAX_USERS", "200"))
+PROVISION_HASH_WORKERS = int(os.environ.get("PROVISION_HASH_WORKERS", "0"))
+
+# Background jobs (see api/jobs.py and `manage.py run_jobs`)
+JOBS_MAX_RUNNING = int(os.environ.get("JOBS_MAX_RUNNING", "4"))  # across all workers; soft, see claim_next
+JOBS_WORKER_CONCURRENCY = int(os.environ.get("JOBS_WORKER_CONCURRENCY", "2"))  # threads per worker
+JOBS_RESULT_TTL_SECONDS = int(os.environ.get("JOBS_RESULT_TTL_SECONDS", "3600"))
+JOBS_LEASE_SECONDS = int(os.environ.get("JOBS_LEASE_SECONDS", "300"))  # requeue claimed jobs silent this long
+JOBS_MAX_ATTEMPTS = int(os.environ.get("JOBS_MAX_ATTEMPTS", "3"))
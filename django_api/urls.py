@@ -19,14 +19,27 @@ urlpatterns = [
     path("api/rooms/join", views.join_room, name="join_room"),
     path("api/rooms/list", views.list_rooms, name="list_rooms"),
     path("api/rooms/bootstrap", views.bootstrap_room, name="bootstrap_room"),
+    path("api/rooms/provision", views.provision_room, name="provision_room"),
+    path("api/rooms/snapshot", views.room_snapshot, name="room_snapshot"),
+    path("api/rooms/leaderboard", views.room_leaderboard, name="room_leaderboard"),
+    path("api/rooms/stats", views.room_stats, name="room_stats"),
+    path("api/rooms/nearby", views.room_nearby, name="room_nearby"),
+    path("api/rooms/clusters", views.room_clusters, name="room_clusters"),
     # geofence
     path("api/geofence/set", views.set_geofence, name="set_geofence"),
     path("api/geofence/get", views.get_geofence, name="get_geofence"),
     # meeting point
     path("api/meeting/set", views.set_meeting_point, name="set_meeting_point"),
     path("api/meeting/get", views.get_meeting_point, name="get_meeting_point"),
+    path("api/meeting/suggest", views.suggest_meeting_point, name="suggest_meeting_point"),
+    # place search
+    path("api/geocode/search", views.geocode_search, name="geocode_search"),
+    path("api/geocode/details", views.geocode_details, name="geocode_details"),
     # movements
     path("api/movement/record", views.record_movement, name="record_movement"),
     # analytics
     path("api/traffic/predict", views.predict_traffic, name="predict_traffic"),
+    # background jobs
+    path("api/jobs/status", views.job_status, name="job_status"),
+    path("api/jobs/result", views.job_result, name="job_result"),
 ]
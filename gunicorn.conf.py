@@ -0,0 +1,29 @@
+# gunicorn settings for the Django service (picked up from the working
+# directory, or pass -c gunicorn.conf.py).
+import os
+
+bind = "0.0.0.0:" + os.environ.get("PORT", "8000")
+workers = int(os.environ.get("WEB_CONCURRENCY", "2"))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", "60"))
+
+# Import Django once in the master so workers fork warm instead of each
+# paying the import cost on a cold start.
+preload_app = os.environ.get("GUNICORN_PRELOAD", "True") == "True"
+
+
+def when_ready(server):
+    # Runs in the master after the app is loaded and before workers fork:
+    # load the URLconf (and with it every view module) now rather than on
+    # the first request each worker serves.
+    if not preload_app:
+        return
+    from django.urls import get_resolver
+
+    get_resolver().url_patterns
+
+
+def post_fork(server, worker):
+    # Never share a database connection the master may have opened
+    from django.db import connections
+
+    connections.close_all()
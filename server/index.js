@@ -35,6 +35,7 @@ console.log('Django API Base:', DJANGO_API_BASE);
 // ----------------------
 let roomUsers = {}; // { roomId: { socketId: { username, lat, lng, isLive } } }
 let roomState = {}; // { roomId: { geofence: { center_lat, center_lng, radius_m }, meeting: {...}, userInside: { username: boolean } } }
+let ingestBackoff = {}; // { userId: { until: ms timestamp, minIntervalMs, lastSent } } from Django 429s
 
 // ----------------------
 // HELPER: Verify JWT via Django
@@ -155,13 +156,31 @@ io.on("connection", (socket) => {
       // Record movement asynchronously (no await blocking)
       try {
         const userId = socket.data?.userId;
-        if (userId) {
+        const now = Date.now();
+        // Forget a backoff a minute after it lapsed
+        if (ingestBackoff[userId] && now - ingestBackoff[userId].until > 60000) delete ingestBackoff[userId];
+        const backoff = ingestBackoff[userId];
+        // Django throttles ingestion: skip persisting (not broadcasting)
+        // fixes until it accepts more, then keep to its suggested pace
+        const throttled = backoff && (now < backoff.until || now - backoff.lastSent < backoff.minIntervalMs);
+        if (userId && !throttled) {
+          if (backoff) backoff.lastSent = now;
           axios.post(`${DJANGO_API_BASE}/movement/record`, {
             user_id: userId,
             room_id: roomId,
             latitude: lat,
             longitude: lng,
-          }).catch(() => {});
+          }).catch((err) => {
+            const res = err.response;
+            if (res && res.status === 429) {
+              const retryMs = res.data?.retry_after_ms ?? Number(res.headers["retry-after"] || 1) * 1000;
+              ingestBackoff[userId] = {
+                until: Date.now() + retryMs,
+                minIntervalMs: res.data?.suggested_interval_ms || 0,
+                lastSent: 0,
+              };
+            }
+          });
         }
       } catch (e) {
         // ignore